@@ -2,7 +2,7 @@
 Configurações da aplicação
 """
 import os
-from typing import Optional, List
+from typing import Any, Optional, List, Dict
 from pydantic import validator, Field
 from pydantic_settings import BaseSettings
 
@@ -45,9 +45,49 @@ class Settings(BaseSettings):
     DEEPGRAM_API_KEY: str = Field(default="", description="Deepgram API key for transcription")
     DEEPGRAM_MODEL: str = Field(default="nova-2", description="Deepgram model")
     DEEPGRAM_LANGUAGE: str = Field(default="pt-BR", description="Deepgram language")
+    DEEPGRAM_TIMEOUT_SECONDS: float = Field(default=60.0, description="Timeout in seconds for Deepgram API requests")
+    DEEPGRAM_MAX_CONNECTIONS: int = Field(default=10, description="Pooled HTTP connections of the Deepgram client")
+    DEEPGRAM_MAX_KEEPALIVE: int = Field(default=5, description="Idle keep-alive connections kept in the Deepgram HTTP pool")
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     OPENAI_MODEL: str = Field(default="gpt-4o-mini-transcribe", description="OpenAI model for transcription")
-    OPENAI_ANALYSIS_MODEL: str = Field(default="gpt-4-turbo-preview", description="OpenAI model for analysis")
+    OPENAI_ANALYSIS_MODEL: str = Field(default="gpt-4o-mini", description="OpenAI model for analysis")
+    OPENAI_TIMEOUT: float = Field(default=60.0, description="Timeout in seconds for OpenAI API requests")
+    OPENAI_MAX_CONNECTIONS: int = Field(default=20, description="Pooled HTTP connections shared by all OpenAI calls")
+    OPENAI_MAX_KEEPALIVE: int = Field(default=10, description="Idle keep-alive connections kept in the OpenAI HTTP pool")
+    OPENAI_RPM_LIMIT: int = Field(default=500, description="Client-side requests per minute allowed to OpenAI")
+    OPENAI_TPM_LIMIT: int = Field(default=200000, description="Client-side tokens per minute allowed to OpenAI")
+    OPENAI_TRANSCRIPTION_CONCURRENCY_INITIAL: int = Field(default=8, description="Initial concurrent OpenAI transcription requests of the adaptive limiter")
+    OPENAI_TRANSCRIPTION_CONCURRENCY_MAX: int = Field(default=32, description="Upper bound of the adaptive OpenAI transcription concurrency limit")
+    OPENAI_TRANSCRIPTION_LATENCY_TARGET: float = Field(default=30.0, description="OpenAI transcription latency in seconds above which its concurrency is reduced")
+    OPENAI_ANALYSIS_CONCURRENCY_INITIAL: int = Field(default=8, description="Initial concurrent OpenAI analysis (chat) requests of the adaptive limiter")
+    OPENAI_ANALYSIS_CONCURRENCY_MAX: int = Field(default=64, description="Upper bound of the adaptive OpenAI analysis concurrency limit")
+    OPENAI_ANALYSIS_LATENCY_TARGET: float = Field(default=10.0, description="OpenAI analysis latency in seconds above which its concurrency is reduced")
+    OPENAI_CIRCUIT_FAILURES: int = Field(default=5, description="Consecutive provider failures that open the OpenAI circuit breaker")
+    OPENAI_CIRCUIT_RESET_SECONDS: float = Field(default=30.0, description="Seconds the OpenAI circuit stays open before a probe request")
+    ANALYSIS_BATCH_ENABLED: bool = Field(default=True, description="Pack concurrent feedback analyses into a single LLM request")
+    ANALYSIS_BATCH_MAX_SIZE: int = Field(default=8, description="Maximum feedbacks per batched analysis request")
+    ANALYSIS_BATCH_MAX_WAIT_MS: int = Field(default=200, description="Milliseconds an analysis waits for its batch to fill")
+    ANALYSIS_BATCH_MAX_TOKENS: int = Field(default=4096, description="Output token cap of a batched analysis request")
+    OPENAI_TOKEN_PRICES: Dict[str, Dict[str, float]] = Field(
+        default={
+            "gpt-4o-mini": {"input": 0.15, "cached": 0.075, "output": 0.60},
+            "gpt-4o": {"input": 2.50, "cached": 1.25, "output": 10.00}
+        },
+        description="USD per 1M tokens (input, cached input, output) per model, for the ai_cost_usd_total metric"
+    )
+    ANALYSIS_ROUTES: List[Dict[str, Any]] = Field(
+        default=[
+            {"name": "overload", "model": "gpt-4o-mini", "overloaded": True},
+            {"name": "short", "model": "gpt-4o-mini", "max_words": 25},
+            {"name": "free", "model": "gpt-4o-mini", "plans": ["free"]},
+            {"name": "custom_ai", "model": "gpt-4o", "features": ["custom_ai"]},
+            {"name": "long", "model": "gpt-4o", "min_words": 150}
+        ],
+        description="Analysis model routing rules, first match wins (keys: name, model, plans, features, min_words, max_words, overloaded); unmatched feedback uses OPENAI_ANALYSIS_MODEL"
+    )
+    ANALYSIS_ROUTER_OVERLOAD_RATIO: float = Field(default=0.8, description="Share of the adaptive OpenAI concurrency limit in use above which the provider counts as overloaded")
+    AI_USAGE_FLUSH_SECONDS: int = Field(default=30, description="Interval for flushing per-tenant token usage to UsageTracking")
+    ANALYSIS_RESPONSE_FORMAT: str = Field(default="json_schema", description="Analysis output mode: json_schema (strict structured outputs) or json_object for models without it")
     
     # Stripe Payment Processing
     STRIPE_SECRET_KEY: str = os.getenv("STRIPE_SECRET_KEY", "")
@@ -96,6 +136,100 @@ class Settings(BaseSettings):
     PRO_PLAN_AUDIO_LIMIT: int = Field(default=100, description="Audio limit for pro plan")
     ENTERPRISE_PLAN_AUDIO_LIMIT: int = Field(default=1000, description="Audio limit for enterprise plan")
     
+    # Audio Ingestion
+    AUDIO_MAX_BYTES: int = Field(default=16 * 1024 * 1024, description="Maximum accepted audio payload size in bytes")
+    IDEMPOTENCY_CACHE_SIZE: int = Field(default=10000, description="WhatsApp message ids kept in the in-memory duplicate-delivery cache")
+    IDEMPOTENCY_PENDING_TTL_SECONDS: float = Field(default=30.0, description="Seconds a cached status of a response still in processing is trusted before re-reading it from the database")
+    
+    # Transcription Backends
+    TRANSCRIPTION_BACKEND: str = Field(default="openai", description="Default transcription backend: openai, deepgram or local")
+    TRANSCRIPTION_BACKEND_BY_PLAN: Dict[str, str] = Field(default={}, description="Backend per plan, e.g. {\"free\": \"local\"}")
+    TRANSCRIPTION_BACKEND_BY_TENANT: Dict[int, str] = Field(default={}, description="Backend per tenant (user id), overrides the plan")
+    LOCAL_WHISPER_MODEL: str = Field(default="small", description="faster-whisper model size or path for the local backend")
+    LOCAL_WHISPER_COMPUTE_TYPE: str = Field(default="int8", description="CTranslate2 compute type of the local backend")
+    LOCAL_WHISPER_CPU_THREADS: int = Field(default=0, description="CPU threads per local transcription (0 = all cores)")
+    LOCAL_WHISPER_WORKERS: int = Field(default=1, description="Local transcriptions running at once")
+    TRANSCRIPTION_HEDGE_BACKEND: str = Field(default="", description="Alternate backend raced against slow transcriptions (empty disables hedging)")
+    TRANSCRIPTION_HEDGE_PERCENTILE: float = Field(default=0.95, description="Primary latency percentile after which a hedge request is fired")
+    TRANSCRIPTION_HEDGE_DEFAULT_DELAY: float = Field(default=15.0, description="Hedge delay in seconds until enough latency samples are collected")
+    TRANSCRIPTION_HEDGE_BUDGET: float = Field(default=0.1, description="Maximum fraction of transcriptions that may be hedged")
+    
+    # Audio Pre-processing
+    AUDIO_PREPROCESSING_ENABLED: bool = Field(default=True, description="Trim silence and re-encode audio with ffmpeg before transcription")
+    FFMPEG_PATH: str = Field(default="ffmpeg", description="ffmpeg binary used for audio pre-processing")
+    AUDIO_VAD_THRESHOLD_DBFS: float = Field(default=-45.0, description="Minimum frame level in dBFS considered as speech")
+    AUDIO_VAD_PADDING_MS: int = Field(default=300, description="Audio kept before the first and after the last speech frame")
+    AUDIO_MIN_SPEECH_MS: int = Field(default=300, description="Audio with less detected speech than this is rejected without transcription")
+    AUDIO_OPUS_BITRATE: str = Field(default="16k", description="Opus bitrate of the audio uploaded for transcription")
+    TRANSCRIPTION_CHUNK_SECONDS: float = Field(default=45.0, description="Target length of the chunks long audio is split into for parallel transcription")
+    TRANSCRIPTION_CHUNK_MIN_SECONDS: float = Field(default=75.0, description="Audio shorter than this is transcribed in a single request")
+    TRANSCRIPTION_CHUNK_OVERLAP_SECONDS: float = Field(default=1.5, description="Audio repeated at the start of each chunk so no word is lost at a cut")
+    TRANSCRIPTION_MAX_PARALLEL_CHUNKS: int = Field(default=4, description="Chunk uploads in flight at once across the process")
+    
+    # WhatsApp Spool (Baileys listener -> API)
+    WHATSAPP_SPOOL_DIR: str = Field(default="/tmp/opina-spool", description="Directory of the durable audio spool written by the Baileys listener (must be writable by the service user)")
+    WHATSAPP_SPOOL_MAX_BYTES: int = Field(default=512 * 1024 * 1024, description="Maximum disk usage of the audio spool")
+    WHATSAPP_SPOOL_POLL_INTERVAL: float = Field(default=0.5, description="Seconds between spool polls when it is empty")
+    WHATSAPP_SPOOL_MAX_ATTEMPTS: int = Field(default=5, description="Delivery attempts before a spooled audio is moved to the dead-letter directory")
+    WHATSAPP_SPOOL_RETRY_BACKOFF: float = Field(default=5.0, description="Seconds before the first retry of a failed spooled audio, doubled on each further failure")
+    
+    # WhatsApp IPC (API -> Baileys listener)
+    WHATSAPP_IPC_SOCKET: str = Field(default="/tmp/opina-baileys.sock", description="Unix domain socket served by the Baileys listener")
+    WHATSAPP_IPC_TIMEOUT: float = Field(default=30.0, description="Seconds to wait for a delivery ack from the Baileys listener")
+    WHATSAPP_RESTART_BACKOFF_BASE: float = Field(default=1.0, description="Initial delay in seconds before restarting a crashed Baileys process")
+    WHATSAPP_RESTART_BACKOFF_MAX: float = Field(default=60.0, description="Maximum delay in seconds between Baileys restarts")
+    
+    # Outbound WhatsApp Queue
+    WHATSAPP_SEND_RATE_PER_SECOND: float = Field(default=1.0, description="Sustained outbound messages per second per sender number")
+    WHATSAPP_SEND_BURST: int = Field(default=5, description="Outbound messages a sender number may send in a burst")
+    WHATSAPP_SEND_BATCH_SIZE: int = Field(default=5, description="Messages sent per IPC batch by the outbound queue")
+    FEEDBACK_REQUEST_DEDUPE_HOURS: int = Field(default=24, description="Hours during which a recipient is not asked for feedback again by the same tenant")
+    BULK_REQUEST_MAX_RECIPIENTS: int = Field(default=5000, description="Maximum recipients per bulk feedback request")
+    
+    # Local Classifier
+    LOCAL_CLASSIFIER_ENABLED: bool = Field(default=True, description="Fill sentiment, rating and urgency locally right after transcription")
+    LOCAL_CLASSIFIER_MODEL_PATH: str = Field(default="", description="Directory with a quantized model.onnx and tokenizer.json; empty uses the lexicon only")
+    LOCAL_CLASSIFIER_LABELS: List[str] = Field(default=["NEGATIVO", "NEUTRO", "POSITIVO"], description="Class order of the ONNX model logits")
+    LOCAL_CLASSIFIER_THREADS: int = Field(default=1, description="ONNX Runtime intra-op threads")
+    
+    # Local LLM Analysis
+    LOCAL_LLM_ENABLED: bool = Field(default=False, description="Enable the local llama.cpp analysis backend")
+    LOCAL_LLM_MODEL_PATH: str = Field(default="", description="Path to a GGUF instruction-tuned model for local analysis")
+    LOCAL_LLM_WORKERS: int = Field(default=0, description="Model instances in the local LLM pool (0 = sized to CPU cores)")
+    LOCAL_LLM_THREADS: int = Field(default=4, description="CPU threads per local LLM instance (0 = cores / workers)")
+    LOCAL_LLM_CONTEXT_SIZE: int = Field(default=4096, description="Context window of the local LLM")
+    LOCAL_LLM_MAX_TOKENS: int = Field(default=800, description="Output token cap of a local analysis")
+    LOCAL_LLM_TENANTS: List[int] = Field(default=[], description="Tenants (user ids) whose analysis must stay local (data residency)")
+    LOCAL_LLM_PLANS: List[str] = Field(default=[], description="Plans whose analysis must stay local, e.g. [\"enterprise\"]")
+    LOCAL_LLM_FALLBACK: bool = Field(default=True, description="Use the local LLM when OpenAI is unavailable (429s, timeouts, open circuit)")
+    
+    # Job Queue
+    JOB_VISIBILITY_TIMEOUT: int = Field(default=300, description="Seconds a claimed job stays leased without a heartbeat before other workers may reclaim it")
+    JOB_MAX_ATTEMPTS: int = Field(default=5, description="Attempts before a job failing with retryable errors is dead-lettered")
+    JOB_RETRY_BASE_SECONDS: int = Field(default=10, description="Base of the exponential backoff between job attempts")
+    JOB_RETRY_MAX_SECONDS: int = Field(default=600, description="Cap of the backoff between job attempts (jitter spreads retries over its upper half)")
+    JOB_OUTAGE_RETRY_SECONDS: int = Field(default=86400, description="How long after enqueueing a job keeps retrying through provider outages regardless of JOB_MAX_ATTEMPTS")
+    JOB_POLL_INTERVAL: float = Field(default=1.0, description="Seconds an idle worker waits before polling the job table again")
+    JOB_WORKER_CONCURRENCY: int = Field(default=4, description="Jobs a worker runs at the same time")
+    JOB_WORKER_EMBEDDED: bool = Field(default=True, description="Run a job worker inside the web process (disable when dedicated workers are deployed)")
+    JOB_PLAN_WEIGHTS: Dict[str, float] = Field(default={"free": 1.0, "pro": 2.0, "enterprise": 4.0}, description="Share of workers each tenant gets under contention, by plan (weighted fair queuing)")
+    JOB_METRICS_INTERVAL: float = Field(default=15.0, description="Seconds between samples of the per-tenant queue depth")
+    ADMIN_API_TOKEN: str = Field(default="", description="Token expected in X-Admin-Token by the /admin API (empty disables it)")
+    
+    # Worker Pipeline
+    WORKER_DECODE_CONCURRENCY: int = Field(default=0, description="Audio decodes (ffmpeg) running at once per process; 0 uses the CPU core count")
+    WORKER_TRANSCRIBE_CONCURRENCY: int = Field(default=0, description="Transcription requests in flight per process; 0 uses 4 x CPU cores")
+    WORKER_ANALYZE_CONCURRENCY: int = Field(default=0, description="Feedback analyses in flight per process; 0 uses 4 x CPU cores")
+    WORKER_PERSIST_CONCURRENCY: int = Field(default=0, description="Database writes of pipeline results at once per process; 0 uses 2 x CPU cores")
+    WORKER_MAX_INFLIGHT: int = Field(default=0, description="Jobs a standalone worker holds at once across all stages; 0 uses twice the sum of the stage limits")
+    WORKER_METRICS_PORT: int = Field(default=9100, description="Port of the Prometheus endpoint of the standalone worker (0 disables it)")
+    
+    # AI Result Cache
+    RESULT_CACHE_ENABLED: bool = Field(default=True, description="Reuse transcriptions and analyses of byte-identical inputs")
+    RESULT_CACHE_HOT_SIZE: int = Field(default=2048, description="Entries kept in the in-process LRU tier of the result cache")
+    TRANSCRIPTION_PROMPT_VERSION: str = Field(default="1", description="Bump to invalidate cached transcriptions")
+    ANALYSIS_PROMPT_VERSION: str = Field(default="4", description="Bump when the analysis prompt changes to invalidate cached analyses")
+    
     # Logging
     LOG_FORMAT: str = Field(default="json", description="Logging format: json or text")
     
@@ -1,11 +1,13 @@
 """
 Dependências compartilhadas da aplicação
 """
-from fastapi import Depends, HTTPException, Request, status
-from sqlmodel import Session
+from fastapi import Depends, Header, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 import logging
+import secrets
 
+from .config import settings
 from .database import get_db
 from .services.auth import AuthService
 from .models import User
@@ -15,7 +17,7 @@ logger = logging.getLogger(__name__)
 # Initialize auth service
 auth_service = AuthService()
 
-async def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
+async def get_current_user(request: Request, db: AsyncSession = Depends(get_db)) -> User:
     """
     Dependency para obter usuário atual - OAuth real
     """
@@ -30,8 +32,18 @@ async def get_current_user(request: Request, db: Session = Depends(get_db)) -> U
     
     return user
 
-async def get_current_user_optional(request: Request, db: Session = Depends(get_db)) -> Optional[User]:
+async def get_current_user_optional(request: Request, db: AsyncSession = Depends(get_db)) -> Optional[User]:
     """
     Dependency para obter usuário atual (opcional) - OAuth real
     """
-    return await auth_service.get_current_user(request, db) 
\ No newline at end of file
+    return await auth_service.get_current_user(request, db) 
+
+async def require_admin_token(x_admin_token: Optional[str] = Header(None)) -> None:
+    """
+    Dependency das rotas de administração: exige ADMIN_API_TOKEN no header
+    X-Admin-Token (sem token configurado, as rotas ficam indisponíveis)
+    """
+    if not settings.ADMIN_API_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.ADMIN_API_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token de administração inválido")
@@ -6,7 +6,14 @@ import logging
 import uvicorn
 import os
 
-from .routes import feedback, auth, webhooks, payments, health, dashboard, web, company
+from .routes import feedback, auth, webhooks, payments, health, dashboard, web, company, monitoring, admin
+from .services.whatsapp import whatsapp_service
+from .services.outbound import outbound_queue
+from .services.openai import close_async_client
+from .services.usage import usage_service
+from .services.local_llm import local_llm
+from .services.jobs import JobWorker, job_queue
+from .services.transcription_backends import transcription_backends
 from .database import init_db
 from .config import settings
 
@@ -31,6 +38,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Worker de jobs no próprio processo web (desligar com workers dedicados)
+embedded_worker = JobWorker(
+    job_queue,
+    concurrency=settings.JOB_WORKER_CONCURRENCY,
+    poll_interval=settings.JOB_POLL_INTERVAL
+) if settings.JOB_WORKER_EMBEDDED else None
+
 # Montar arquivos estáticos (CSS, JS, imagens)
 if os.path.exists("app/static"):
     app.mount("/static", StaticFiles(directory="app/static"), name="static")
@@ -59,6 +73,8 @@ app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(webhooks.router, prefix="/webhooks", tags=["webhooks"])
 app.include_router(payments.router, prefix="/payments", tags=["payments"])
 app.include_router(company.router, prefix="/company", tags=["company"])
+app.include_router(monitoring.router, prefix="/monitoring", tags=["monitoring"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
 app.include_router(web.router, tags=["web"])
 app.include_router(dashboard.router, tags=["dashboard"])  # Deve ser o último para pegar rotas como "/"
 
@@ -69,8 +85,29 @@ async def startup_event():
     """
     logger.info("Initializing application...")
     await init_db()
+    webhooks.spool_consumer.start()
+    await whatsapp_service.start()
+    outbound_queue.start()
+    usage_service.start_token_flush()
+    if embedded_worker:
+        embedded_worker.start()
     logger.info("Application startup complete")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Libera recursos no shutdown
+    """
+    if embedded_worker:
+        await embedded_worker.stop()
+    await outbound_queue.stop()
+    await whatsapp_service.stop()
+    await webhooks.spool_consumer.stop()
+    await transcription_backends.close()
+    await close_async_client()
+    await local_llm.close()
+    await usage_service.stop_token_flush()
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
     uvicorn.run(app, host="0.0.0.0", port=port)
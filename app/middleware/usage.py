@@ -4,9 +4,10 @@ Middleware para enforçar guardrails de uso automaticamente
 from fastapi import Request, Response, HTTPException, status
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..services.usage import usage_service, UsageError
 from ..services.auth import AuthService
-from ..database import get_db
+from ..database import async_session_maker
 from ..models import FeatureType
 import logging
 import time
@@ -70,7 +71,7 @@ class UsageMiddleware(BaseHTTPMiddleware):
                 return await call_next(request)
             
             # Obtém usuário atual
-            with next(get_db()) as db:
+            async with async_session_maker() as db:
                 user = await self.auth_service.get_current_user(request, db)
                 
                 if not user:
@@ -153,7 +154,7 @@ def require_audio_limit(func):
         for arg in args:
             if hasattr(arg, 'plan_type'):  # É um User
                 user = arg
-            elif hasattr(arg, 'exec'):  # É uma Session
+            elif isinstance(arg, AsyncSession):
                 db = arg
         
         # Busca nos kwargs também
@@ -201,7 +202,7 @@ def track_audio_usage(func):
         for arg in args:
             if hasattr(arg, 'plan_type'):  # É um User
                 user = arg
-            elif hasattr(arg, 'exec'):  # É uma Session
+            elif isinstance(arg, AsyncSession):
                 db = arg
         
         # Busca nos kwargs também
@@ -2,7 +2,7 @@ from datetime import datetime, timedelta
 from typing import Optional, List
 from enum import Enum
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import JSON
+from sqlalchemy import JSON, Column, LargeBinary, UniqueConstraint
 
 
 # ==============================================
@@ -30,6 +30,19 @@ class FeatureType(str, Enum):
     API_ACCESS = "api_access"
     CUSTOM_INTEGRATIONS = "custom_integrations"
 
+class ProcessingStage(str, Enum):
+    """Último estágio concluído de um ``ClientResponse``, em ordem"""
+    RECEIVED = "received"
+    TRANSCRIBED = "transcribed"
+    ANALYZED = "analyzed"
+    DELIVERED = "delivered"
+
+class ResponseStatus(str, Enum):
+    PENDING = "pending"
+    COMPLETED = "completed"
+    NO_SPEECH = "no_speech"
+    FAILED = "failed"  # ``failed_stage`` falhou; o retry retoma dali
+
 # ==============================================
 # PLAN LIMITS CONFIGURATION
 # ==============================================
@@ -75,6 +88,7 @@ class UserBase(SQLModel):
     # Dados da empresa
     company_name: Optional[str] = None
     cnpj: Optional[str] = Field(index=True, default=None)
+    phone: Optional[str] = Field(default=None, index=True, unique=True)  # WhatsApp do tenant, só dígitos com DDI
     
     # Configurações de marca
     brand_color: str = Field(default="#4F46E5")
@@ -162,15 +176,46 @@ class ClientResponseBase(SQLModel):
     client_phone: Optional[str] = None
     client_company: Optional[str] = None
     audio_url: Optional[str] = None
+    whatsapp_message_id: Optional[str] = Field(default=None, unique=True, index=True)
     transcription: Optional[str] = None
     rating: Optional[int] = Field(default=None, ge=1, le=5)
     feedback_text: Optional[str] = None
     
     # Campos de análise
     sentiment: Optional[str] = None  # POSITIVO, NEGATIVO, NEUTRO
+    sentiment_score: Optional[float] = None  # -1.0 a 1.0
+    inferred_rating: Optional[int] = None  # 1 a 5, inferido da fala
+    emotions: Optional[List[str]] = Field(default=None, sa_column=Column(JSON))
+    key_phrases: Optional[List[str]] = Field(default=None, sa_column=Column(JSON))
+    is_compliment: Optional[bool] = None
+    is_complaint: Optional[bool] = None
+    action_items: Optional[List[str]] = Field(default=None, sa_column=Column(JSON))
+    topics: Optional[List[str]] = Field(default=None, sa_column=Column(JSON))
+    intent_primary: Optional[str] = None
+    intent_secondary: Optional[List[str]] = Field(default=None, sa_column=Column(JSON))
+    urgency: Optional[str] = None  # ALTA, MÉDIA, BAIXA
+    satisfaction_level: Optional[str] = None  # SATISFEITO, INSATISFEITO, NEUTRO
+    satisfaction_reasons: Optional[List[str]] = Field(default=None, sa_column=Column(JSON))
+    product_mentions: Optional[List[str]] = Field(default=None, sa_column=Column(JSON))
+    improvement_areas: Optional[List[str]] = Field(default=None, sa_column=Column(JSON))
     
     # Status do processamento
     processed: bool = Field(default=False)
+    processing_error: Optional[str] = None
+    
+    # Estado do pipeline: cada estágio termina num único commit com o seu
+    # resultado, e o reprocessamento retoma a partir de ``stage``
+    stage: str = Field(default=ProcessingStage.RECEIVED.value, index=True)  # ProcessingStage
+    status: str = Field(default=ResponseStatus.PENDING.value, index=True)  # ResponseStatus
+    error: Optional[str] = None
+    failed_stage: Optional[str] = None
+    analysis: Optional[dict] = Field(default=None, sa_column=Column(JSON))  # análise completa do estágio analyzed
+    transcribe_attempts: int = Field(default=0)
+    analyze_attempts: int = Field(default=0)
+    deliver_attempts: int = Field(default=0)
+    transcribed_at: Optional[datetime] = None
+    analyzed_at: Optional[datetime] = None
+    delivered_at: Optional[datetime] = None
     ip_address: Optional[str] = None
     user_agent: Optional[str] = None
     
@@ -197,6 +242,11 @@ class UsageTrackingBase(SQLModel):
     reports_generated: int = Field(default=0)
     client_links_created: int = Field(default=0)
     
+    # Tokens de IA (chamadas de chat)
+    ai_input_tokens: int = Field(default=0)
+    ai_cached_tokens: int = Field(default=0)
+    ai_output_tokens: int = Field(default=0)
+    
     # Dados de suporte
     support_tickets: int = Field(default=0)
     support_response_time_hours: Optional[float] = None
@@ -212,5 +262,115 @@ class UsageTracking(UsageTrackingBase, table=True):
     
     # Constraint para garantir uma entrada por usuário/mês
     __table_args__ = (
+        UniqueConstraint("user_id", "year", "month", name="uq_usagetracking_user_month"),
         {"schema": None},
-    ) 
\ No newline at end of file
+    )
+
+# ==============================================
+# CACHE DE RESULTADOS DE IA
+# ==============================================
+
+class ResultCacheEntry(SQLModel, table=True):
+    """Resultado de transcrição/análise endereçado pelo hash do conteúdo"""
+    key: str = Field(primary_key=True)  # sha256(kind, model, version, content_hash)
+    kind: str = Field(index=True)  # transcription, analysis
+    model: str
+    version: str
+    payload: dict = Field(default_factory=dict, sa_column=Column(JSON))
+    hits: int = Field(default=0)
+    
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    last_hit_at: Optional[datetime] = None
+
+# ==============================================
+# FILA DE JOBS
+# ==============================================
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+class Job(SQLModel, table=True):
+    """
+    Trabalho durável consumido pelos workers com ``FOR UPDATE SKIP LOCKED``.
+    Um job ``running`` cujo lease expirou volta a ser elegível. Dentro de
+    uma prioridade, sai primeiro a menor etiqueta virtual (fila justa
+    ponderada entre tenants).
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str = Field(index=True)  # process_audio
+    status: str = Field(default=JobStatus.QUEUED.value, index=True)  # JobStatus
+    priority: int = Field(default=0)  # faixa: maior sai primeiro (1 = urgente)
+    tenant_id: Optional[int] = Field(default=None, index=True)  # User.id
+    virtual_time: float = Field(default=0.0)  # etiqueta de início do WFQ
+    payload: dict = Field(default_factory=dict, sa_column=Column(JSON))
+    blob: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary))  # áudio, apagado ao concluir (mantido se falhar)
+    
+    attempts: int = Field(default=0)
+    max_attempts: int = Field(default=5)
+    run_at: datetime = Field(default_factory=datetime.utcnow)
+    locked_by: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+class TenantQueueState(SQLModel, table=True):
+    """Etiqueta virtual do último job enfileirado de cada tenant (WFQ)"""
+    tenant_id: int = Field(primary_key=True)
+    last_finish: float = Field(default=0.0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+# ==============================================
+# PEDIDOS DE FEEDBACK EM MASSA
+# ==============================================
+
+class OutboundCampaign(SQLModel, table=True):
+    """
+    Pedido de feedback em massa de um tenant. Os envios são jobs
+    ``send_feedback_request`` da fila; cada job soma o que entregou (ou
+    não) aos contadores daqui, que qualquer instância consulta.
+    """
+    id: str = Field(primary_key=True)  # uuid exposto como job_id na API
+    tenant_id: int = Field(foreign_key="user.id", index=True)
+    total: int = Field(default=0)  # destinatários enfileirados
+    skipped_duplicates: int = Field(default=0)
+    invalid: int = Field(default=0)
+    sent: int = Field(default=0)
+    failed: int = Field(default=0)
+    
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+class OutboundRecipient(SQLModel, table=True):
+    """
+    Destinatário que recebeu pedido do tenant: a reserva vale por
+    FEEDBACK_REQUEST_DEDUPE_HOURS a partir de ``reserved_at`` e é removida
+    se o envio falhar
+    """
+    tenant_id: int = Field(primary_key=True)
+    phone: str = Field(primary_key=True)  # só dígitos (repositories.normalize_phone)
+    campaign_id: str = Field(index=True)
+    reserved_at: datetime = Field(default_factory=datetime.utcnow)
+
+class DeadLetter(SQLModel, table=True):
+    """
+    Trabalho que falhou de vez (erro fatal ou tentativas esgotadas). Guarda
+    a referência ao job, cujo payload e blob continuam disponíveis para o
+    requeue pela API de administração.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job_id: Optional[int] = Field(default=None, foreign_key="job.id", index=True)
+    kind: str = Field(index=True)
+    payload: dict = Field(default_factory=dict, sa_column=Column(JSON))  # ex.: {"response_id": 42}
+    reason: str  # fatal, exhausted
+    error_type: str
+    last_error: str
+    attempts: int = Field(default=0)
+    
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    requeued_at: Optional[datetime] = Field(default=None, index=True)
@@ -0,0 +1,265 @@
+"""
+Repositórios assíncronos de acesso ao banco
+Rotas e serviços consultam User, ClientLink, ClientResponse, UsageTracking e
+Subscription por aqui, sempre com ``await`` sobre a ``AsyncSession`` de
+``get_db``. As consultas são montadas uma única vez no import, com
+``bindparam`` no lugar dos valores, de modo que cada chamada reaproveita o
+SQL compilado do cache do SQLAlchemy. Leituras de listagem e de agregação
+projetam só as colunas usadas em vez de carregar entidades inteiras.
+"""
+import re
+from datetime import datetime
+from typing import Any, Dict, Generic, NamedTuple, Optional, Sequence, Type, TypeVar
+
+from sqlalchemy import Row, bindparam, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlmodel import SQLModel
+
+from .models import ClientLink, ClientResponse, Subscription, SubscriptionStatus, UsageTracking, User
+
+ModelT = TypeVar("ModelT", bound=SQLModel)
+
+# ==============================================
+# CONSULTAS COMPILADAS
+# ==============================================
+
+_USER_BY_PHONE = select(User).where(User.phone == bindparam("phone"))
+_USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+_USER_BY_GOOGLE_ID = select(User).where(User.google_id == bindparam("google_id"))
+_USERS_BY_CNPJ = select(
+    User.email,
+    User.name,
+    User.company_name,
+    User.plan_type,
+    User.has_used_free_tier,
+    User.free_tier_started_at,
+    User.created_at,
+    User.is_active
+).where(User.cnpj.like(bindparam("pattern"))).order_by(User.id)
+
+_LINK_BY_PUBLIC_ID = select(ClientLink).where(ClientLink.link_id == bindparam("link_id"))
+_ACTIVE_LINK_BY_PUBLIC_ID = _LINK_BY_PUBLIC_ID.where(ClientLink.is_active.is_(True))
+# Link ativo mais recente: recebe os áudios que chegam pelo WhatsApp do tenant
+_LATEST_ACTIVE_LINK_ID = (
+    select(ClientLink.id)
+    .where(ClientLink.user_id == bindparam("user_id"), ClientLink.is_active.is_(True))
+    .order_by(ClientLink.created_at.desc(), ClientLink.id.desc())
+    .limit(1)
+)
+_LINK_COUNTS = select(
+    func.count(ClientLink.id).label("total"),
+    func.count(ClientLink.id).filter(ClientLink.is_active.is_(True)).label("active")
+).where(ClientLink.user_id == bindparam("user_id"))
+
+# Respostas de um tenant: sempre via join com o link, que guarda o dono
+_OWNED = ClientLink.user_id == bindparam("user_id")
+_RESPONSE_COUNTS = (
+    select(
+        func.count(ClientResponse.id).label("total"),
+        func.count(ClientResponse.id).filter(ClientResponse.created_at >= bindparam("since")).label("recent"),
+        func.count(ClientResponse.id).filter(ClientResponse.processed.is_(True)).label("processed"),
+        func.avg(ClientResponse.rating).label("average_rating")
+    )
+    .join(ClientLink, ClientLink.id == ClientResponse.link_id)
+    .where(_OWNED)
+)
+_SENTIMENT_COUNTS = (
+    select(ClientResponse.sentiment, func.count(ClientResponse.id))
+    .join(ClientLink, ClientLink.id == ClientResponse.link_id)
+    .where(_OWNED)
+    .group_by(ClientResponse.sentiment)
+)
+_RATING_COUNTS = (
+    select(ClientResponse.rating, func.count(ClientResponse.id))
+    .join(ClientLink, ClientLink.id == ClientResponse.link_id)
+    .where(_OWNED, ClientResponse.rating.is_not(None))
+    .group_by(ClientResponse.rating)
+)
+_FEEDBACK_LIST = (
+    select(
+        ClientResponse.id,
+        ClientResponse.client_name,
+        ClientResponse.client_phone,
+        ClientResponse.audio_url,
+        ClientResponse.transcription,
+        ClientResponse.sentiment,
+        ClientResponse.rating,
+        ClientResponse.processed,
+        ClientResponse.created_at
+    )
+    .join(ClientLink, ClientLink.id == ClientResponse.link_id)
+    .where(_OWNED)
+    .order_by(ClientResponse.created_at.desc())
+)
+_ANALYSIS_ROWS = (
+    select(
+        ClientResponse.sentiment,
+        ClientResponse.inferred_rating,
+        ClientResponse.urgency,
+        ClientResponse.satisfaction_level,
+        ClientResponse.is_compliment,
+        ClientResponse.is_complaint,
+        ClientResponse.topics,
+        ClientResponse.emotions,
+        ClientResponse.key_phrases,
+        ClientResponse.improvement_areas,
+        ClientResponse.product_mentions,
+        ClientResponse.action_items
+    )
+    .join(ClientLink, ClientLink.id == ClientResponse.link_id)
+    .where(
+        _OWNED,
+        ClientResponse.processed.is_(True),
+        ClientResponse.processing_error.is_(None)
+    )
+)
+_RESPONSE_STATUS_BY_MESSAGE = select(ClientResponse.id, ClientResponse.status, ClientResponse.stage).where(
+    ClientResponse.whatsapp_message_id == bindparam("message_id")
+)
+
+_USAGE_FOR_MONTH = select(UsageTracking).where(
+    UsageTracking.user_id == bindparam("user_id"),
+    UsageTracking.year == bindparam("year"),
+    UsageTracking.month == bindparam("month")
+)
+
+_ACTIVE_SUBSCRIPTION = select(Subscription).where(
+    Subscription.user_id == bindparam("user_id"),
+    Subscription.status == SubscriptionStatus.ACTIVE
+)
+# O webhook do Stripe altera o plano do dono: carrega o usuário junto,
+# já que lazy load não é permitido numa sessão assíncrona
+_SUBSCRIPTION_BY_STRIPE_ID = select(Subscription).options(selectinload(Subscription.user)).where(
+    Subscription.stripe_subscription_id == bindparam("subscription_id")
+)
+
+def normalize_phone(phone: str) -> str:
+    """Telefone como gravado em ``User.phone``: só os dígitos (``+55 11 9...`` -> ``55119...``)"""
+    return re.sub(r"\D", "", phone or "")
+
+# ==============================================
+# RESULTADOS PROJETADOS
+# ==============================================
+
+class LinkCounts(NamedTuple):
+    total: int
+    active: int
+
+class ResponseCounts(NamedTuple):
+    total: int
+    recent: int  # criadas a partir de ``since``
+    processed: int
+    average_rating: Optional[float]  # média das notas informadas
+
+# ==============================================
+# REPOSITÓRIOS
+# ==============================================
+
+class Repository(Generic[ModelT]):
+    """Base: busca por chave primária e gravação com commit explícito"""
+
+    model: Type[ModelT]
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get(self, id: int) -> Optional[ModelT]:
+        """Busca pela chave primária (usa o identity map da sessão antes do banco)"""
+        return await self.db.get(self.model, id)
+
+    async def save(self, *instances: ModelT, refresh: bool = False) -> None:
+        """Grava as instâncias num único commit; ``refresh`` recarrega os valores do banco"""
+        self.db.add_all(instances)
+        await self.db.commit()
+        if refresh:
+            for instance in instances:
+                await self.db.refresh(instance)
+
+    async def _first(self, statement, **params: Any) -> Optional[Any]:
+        return (await self.db.execute(statement, params)).scalars().first()
+
+    async def _rows(self, statement, **params: Any) -> Sequence[Row]:
+        return (await self.db.execute(statement, params)).all()
+
+class UserRepository(Repository[User]):
+    model = User
+
+    async def by_phone(self, phone: str) -> Optional[User]:
+        """Tenant dono do número de WhatsApp ``phone`` (aceita qualquer formatação)"""
+        digits = normalize_phone(phone)
+        if not digits:
+            return None
+        return await self._first(_USER_BY_PHONE, phone=digits)
+
+    async def by_email(self, email: str) -> Optional[User]:
+        return await self._first(_USER_BY_EMAIL, email=email)
+
+    async def by_google_id(self, google_id: str) -> Optional[User]:
+        return await self._first(_USER_BY_GOOGLE_ID, google_id=google_id)
+
+    async def by_cnpj(self, cnpj_digits: str) -> Sequence[Row]:
+        """
+        Usuários cujo CNPJ contém ``cnpj_digits``, só com as colunas do
+        controle de free tier (email, name, company_name, plan_type,
+        has_used_free_tier, free_tier_started_at, created_at, is_active)
+        """
+        return await self._rows(_USERS_BY_CNPJ, pattern=f"%{cnpj_digits}%")
+
+class ClientLinkRepository(Repository[ClientLink]):
+    model = ClientLink
+
+    async def by_public_id(self, link_id: str, active_only: bool = False) -> Optional[ClientLink]:
+        """Link pelo identificador público (o UUID da URL)"""
+        statement = _ACTIVE_LINK_BY_PUBLIC_ID if active_only else _LINK_BY_PUBLIC_ID
+        return await self._first(statement, link_id=link_id)
+
+    async def latest_active_id(self, user_id: int) -> Optional[int]:
+        return await self._first(_LATEST_ACTIVE_LINK_ID, user_id=user_id)
+
+    async def counts(self, user_id: int) -> LinkCounts:
+        row = (await self.db.execute(_LINK_COUNTS, {"user_id": user_id})).one()
+        return LinkCounts(row.total, row.active)
+
+class ClientResponseRepository(Repository[ClientResponse]):
+    model = ClientResponse
+
+    async def counts(self, user_id: int, since: datetime) -> ResponseCounts:
+        """Totais das respostas do tenant numa única consulta agregada"""
+        row = (await self.db.execute(_RESPONSE_COUNTS, {"user_id": user_id, "since": since})).one()
+        average = float(row.average_rating) if row.average_rating is not None else None
+        return ResponseCounts(row.total, row.recent, row.processed, average)
+
+    async def sentiment_counts(self, user_id: int) -> Dict[Optional[str], int]:
+        return dict(await self._rows(_SENTIMENT_COUNTS, user_id=user_id))
+
+    async def rating_counts(self, user_id: int) -> Dict[int, int]:
+        return dict(await self._rows(_RATING_COUNTS, user_id=user_id))
+
+    async def list_for_user(self, user_id: int) -> Sequence[Row]:
+        """Respostas do tenant, mais recentes primeiro, com as colunas da listagem"""
+        return await self._rows(_FEEDBACK_LIST, user_id=user_id)
+
+    async def analysis_rows(self, user_id: int) -> Sequence[Row]:
+        """Colunas de análise das respostas processadas sem erro (dashboard)"""
+        return await self._rows(_ANALYSIS_ROWS, user_id=user_id)
+
+    async def status_by_message_id(self, message_id: str) -> Optional[Row]:
+        """``(id, status, stage)`` da resposta criada para a mensagem do WhatsApp"""
+        return (await self.db.execute(_RESPONSE_STATUS_BY_MESSAGE, {"message_id": message_id})).first()
+
+class UsageTrackingRepository(Repository[UsageTracking]):
+    model = UsageTracking
+
+    async def for_month(self, user_id: int, year: int, month: int) -> Optional[UsageTracking]:
+        return await self._first(_USAGE_FOR_MONTH, user_id=user_id, year=year, month=month)
+
+class SubscriptionRepository(Repository[Subscription]):
+    model = Subscription
+
+    async def active_for_user(self, user_id: int) -> Optional[Subscription]:
+        return await self._first(_ACTIVE_SUBSCRIPTION, user_id=user_id)
+
+    async def by_stripe_id(self, subscription_id: str) -> Optional[Subscription]:
+        """Assinatura pelo id do Stripe, com ``user`` já carregado"""
+        return await self._first(_SUBSCRIPTION_BY_STRIPE_ID, subscription_id=subscription_id)
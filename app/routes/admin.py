@@ -0,0 +1,68 @@
+"""
+Rotas de administração (X-Admin-Token)
+Consulta e requeue da dead-letter da fila de jobs
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+
+from ..dependencies import require_admin_token
+from ..services.jobs import job_queue
+
+router = APIRouter(dependencies=[Depends(require_admin_token)])
+
+class DeadLetterOut(BaseModel):
+    id: int
+    job_id: Optional[int]
+    kind: str
+    payload: Dict[str, Any]
+    reason: str
+    error_type: str
+    last_error: str
+    attempts: int
+    created_at: datetime
+    requeued_at: Optional[datetime]
+
+class RequeueRequest(BaseModel):
+    ids: Optional[List[int]] = None  # sem ids: todas as pendentes que casarem com os filtros
+    kind: Optional[str] = None
+    reason: Optional[str] = None  # fatal, exhausted
+    limit: int = 500
+
+@router.get("/dead-letters", response_model=List[DeadLetterOut])
+async def list_dead_letters(
+    kind: Optional[str] = None,
+    reason: Optional[str] = None,
+    include_requeued: bool = False,
+    limit: int = 100
+):
+    """
+    Lista a dead-letter (por padrão só o que ainda não foi reenfileirado)
+    """
+    letters = await job_queue.list_dead_letters(kind, reason, include_requeued, min(limit, 1000))
+    return [DeadLetterOut(**letter.model_dump()) for letter in letters]
+
+@router.post("/dead-letters/{dead_letter_id}/requeue")
+async def requeue_dead_letter(dead_letter_id: int):
+    """
+    Devolve um job da dead-letter à fila, com as tentativas zeradas
+    """
+    requeued = await job_queue.requeue([dead_letter_id])
+    if dead_letter_id not in requeued:
+        raise HTTPException(status_code=404, detail="Dead-letter não encontrada ou já reenfileirada")
+    return {"dead_letter_id": dead_letter_id, "job_id": requeued[dead_letter_id]}
+
+@router.post("/dead-letters/requeue")
+async def requeue_dead_letters(request: RequeueRequest):
+    """
+    Reenfileira em lote, por ids ou pelos filtros (ex.: depois de um
+    incidente, todas as ``exhausted`` de ``process_audio``)
+    """
+    ids = request.ids
+    if ids is None:
+        letters = await job_queue.list_dead_letters(request.kind, request.reason, limit=min(request.limit, 1000))
+        ids = [letter.id for letter in letters]
+    requeued = await job_queue.requeue(ids) if ids else {}
+    return {"requeued": len(requeued), "jobs": requeued}
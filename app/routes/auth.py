@@ -4,7 +4,7 @@ Rotas de autenticação Google OAuth - SISTEMA REAL
 from fastapi import APIRouter, Request, Response, Depends, HTTPException, status
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
-from sqlmodel import Session, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..database import get_db
 from ..models import User, PlanType
 from ..config import settings
@@ -52,7 +52,7 @@ async def google_callback(
     code: str = None, 
     state: str = None, 
     error: str = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Callback do Google OAuth - OAUTH REAL"""
     try:
@@ -115,7 +115,7 @@ async def logout(request: Request):
     return response
 
 @router.get("/me")
-async def get_current_user_info(request: Request, db: Session = Depends(get_db)):
+async def get_current_user_info(request: Request, db: AsyncSession = Depends(get_db)):
     """Retorna informações do usuário atual - OAUTH REAL"""
     try:
         user = await auth_service.get_current_user(request, db)
@@ -137,7 +137,7 @@ async def get_current_user_info(request: Request, db: Session = Depends(get_db))
         raise HTTPException(status_code=500, detail="Erro interno")
 
 # Dependencies para autenticação - OAUTH REAL
-async def get_current_user(request: Request, db: Session = Depends(get_db)):
+async def get_current_user(request: Request, db: AsyncSession = Depends(get_db)):
     """Dependency para obter usuário atual - OAUTH REAL"""
     user = await auth_service.get_current_user(request, db)
     
@@ -150,7 +150,7 @@ async def get_current_user(request: Request, db: Session = Depends(get_db)):
     
     return user
 
-async def get_current_user_optional(request: Request, db: Session = Depends(get_db)):
+async def get_current_user_optional(request: Request, db: AsyncSession = Depends(get_db)):
     """Dependency para obter usuário atual (opcional) - OAUTH REAL"""
     return await auth_service.get_current_user(request, db)
 
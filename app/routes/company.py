@@ -4,12 +4,14 @@ Rotas para gerenciamento de dados da empresa e controle de CNPJ
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
-from sqlmodel import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
 from typing import Optional
 
 from ..database import get_db
 from ..models import User
+from ..repositories import UserRepository, normalize_phone
 from ..services.cnpj_control import cnpj_control_service, CNPJError
 from .auth import get_current_user
 import logging
@@ -25,6 +27,9 @@ class CNPJData(BaseModel):
 class CNPJCheckData(BaseModel):
     cnpj: str
 
+class PhoneData(BaseModel):
+    phone: str
+
 @router.get("/setup", response_class=HTMLResponse)
 async def company_setup_page(
     request: Request,
@@ -40,7 +45,7 @@ async def company_setup_page(
 @router.post("/check-cnpj")
 async def check_cnpj_eligibility(
     data: CNPJCheckData,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Verifica se CNPJ pode usar free tier"""
     try:
@@ -62,7 +67,7 @@ async def check_cnpj_eligibility(
 async def setup_company_data(
     data: CNPJData,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Configura dados da empresa para o usuário"""
     try:
@@ -94,10 +99,36 @@ async def setup_company_data(
             detail="Erro interno ao configurar empresa"
         )
 
+@router.post("/phone")
+async def set_company_phone(
+    data: PhoneData,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Cadastra o WhatsApp da empresa: os áudios enviados deste número vão para o link ativo mais recente"""
+    phone = normalize_phone(data.phone)
+    if not 10 <= len(phone) <= 15:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Telefone deve ter DDI, DDD e número (10 a 15 dígitos)"
+        )
+    
+    current_user.phone = phone
+    try:
+        await UserRepository(db).save(current_user)
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Telefone já cadastrado por outra empresa"
+        )
+    
+    return {"success": True, "phone": phone}
+
 @router.get("/info")
 async def get_company_info(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Retorna informações da empresa do usuário"""
     try:
@@ -131,7 +162,7 @@ async def get_company_info(
 @router.get("/cnpj/{cnpj}")
 async def get_cnpj_details(
     cnpj: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)  # Admin check pode ser adicionado aqui
 ):
     """Retorna detalhes de um CNPJ específico"""
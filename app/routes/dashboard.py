@@ -3,14 +3,15 @@ Rotas do dashboard - páginas web e APIs
 """
 from fastapi import APIRouter, Depends, HTTPException, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
-from sqlmodel import Session, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
 import secrets
 import logging
 
 from ..database import get_db
-from ..models import User, ClientLink, ClientResponse
+from ..models import User
+from ..repositories import ClientLinkRepository, ClientResponseRepository
 from ..routes.auth import get_current_user
 
 router = APIRouter(tags=["dashboard"])
@@ -80,49 +81,25 @@ async def privacy_page(request: Request):
 @router.get("/api/dashboard/stats")
 async def get_dashboard_stats(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Dict[str, Any]:
     """Dashboard principal - estatísticas reais"""
     
-    # Get all responses for user
-    responses = db.exec(
-        select(ClientResponse)
-        .join(ClientLink)
-        .where(ClientLink.user_id == current_user.id)
-    ).all()
+    # Totais agregados no banco, sem carregar as respostas
+    responses = ClientResponseRepository(db)
+    counts = await responses.counts(current_user.id, since=datetime.utcnow() - timedelta(days=31))
+    sentiments = await responses.sentiment_counts(current_user.id)
+    sentiment_count = {sentiment: sentiments.get(sentiment, 0) for sentiment in ["positivo", "negativo", "neutro"]}
     
-    total_count = len(responses)
-    last_30_days = len([r for r in responses if (datetime.utcnow() - r.created_at).days <= 30])
-    
-    # Sentiment breakdown
-    sentiment_count = {"positivo": 0, "negativo": 0, "neutro": 0}
-    total_rating = 0
-    rating_count = 0
-    
-    for response in responses:
-        if response.sentiment in sentiment_count:
-            sentiment_count[response.sentiment] += 1
-        if response.rating:
-            total_rating += response.rating
-            rating_count += 1
-    
-    avg_rating = (total_rating / rating_count) if rating_count > 0 else 0.0
-    
-    # Get links count
-    links = db.exec(
-        select(ClientLink)
-        .where(ClientLink.user_id == current_user.id)
-    ).all()
-    
-    active_links = [l for l in links if l.is_active]
+    links = await ClientLinkRepository(db).counts(current_user.id)
     
     return {
-        "total_responses": total_count,
-        "responses_last_30_days": last_30_days,
-        "avg_rating": avg_rating,
+        "total_responses": counts.total,
+        "responses_last_30_days": counts.recent,
+        "avg_rating": counts.average_rating or 0.0,
         "sentiment_distribution": sentiment_count,
-        "total_links": len(links),
-        "active_links": len(active_links),
+        "total_links": links.total,
+        "active_links": links.active,
         "total_views": 0,  # TODO: Implement
         "conversion_rate": 0.0,  # TODO: Calculate
         "plan_type": current_user.plan_type.value,
@@ -1,22 +1,28 @@
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Form, UploadFile, File, Request
-from sqlmodel import Session, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Any, Optional
+import csv
+import io
 import uuid
 import logging
 from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
-from ..database import get_db  # CORRIGIDO: era get_session, agora é get_db
+from pydantic import BaseModel
+from ..database import async_session_maker, get_db  # CORRIGIDO: era get_session, agora é get_db
 from ..config import settings
 import urllib.parse
 from datetime import datetime
 
 from ..models import User, ClientLink, ClientResponse, FeatureType
+from ..repositories import ClientLinkRepository, ClientResponseRepository, UserRepository
 from ..services.storage import StorageService
 from ..services.transcription import DeepgramService, TranscriptionService
 from ..services.openai import OpenAIService
-from ..services.whatsapp import WhatsAppService
+from ..services.whatsapp import whatsapp_service as whatsapp
 from ..services.business import BusinessService
 from ..services.usage import usage_service
+from ..services.outbound import outbound_queue
+from ..services.jobs import plan_weight
 from .auth import get_current_user  # CORRIGIDO: era get_current_tenant, agora é get_current_user
 
 router = APIRouter()
@@ -26,14 +32,13 @@ logger = logging.getLogger(__name__)
 storage = StorageService()
 deepgram = DeepgramService()
 openai = OpenAIService()
-whatsapp = WhatsAppService()
 transcription_service = TranscriptionService()
 
 @router.post("/request")
 async def request_feedback(
     customer_phone: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)  # CORRIGIDO: era get_session
+    db: AsyncSession = Depends(get_db)  # CORRIGIDO: era get_session
 ):
     """
     Send WhatsApp template requesting feedback
@@ -52,21 +57,94 @@ async def request_feedback(
     
     return {"status": "sent"}
 
+class BulkFeedbackRequest(BaseModel):
+    phones: List[str]
+
+_CSV_PHONE_COLUMNS = {"phone", "telefone", "celular", "whatsapp", "numero", "número"}
+
+def _phones_from_csv(content: bytes) -> List[str]:
+    """
+    Extrai telefones de um CSV: usa a coluna phone/telefone/celular/whatsapp
+    se houver cabeçalho, senão a primeira coluna
+    """
+    text = content.decode("utf-8-sig", errors="replace")
+    rows = [row for row in csv.reader(io.StringIO(text)) if row]
+    if not rows:
+        return []
+    
+    header = [cell.strip().lower() for cell in rows[0]]
+    column = next((i for i, name in enumerate(header) if name in _CSV_PHONE_COLUMNS), None)
+    if column is None:
+        column = 0
+    else:
+        rows = rows[1:]
+    
+    return [row[column] for row in rows if len(row) > column and row[column].strip()]
+
+@router.post("/request/bulk")
+async def request_feedback_bulk(
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Enfileira pedidos de feedback para vários clientes de uma vez.
+
+    Aceita JSON ``{"phones": [...]}`` ou um upload multipart com um CSV no
+    campo ``file``. Os envios são feitos em segundo plano pela fila de saída;
+    acompanhe o progresso em ``GET /feedback/request/bulk/{job_id}``.
+    """
+    content_type = request.headers.get("content-type", "")
+    
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form(max_files=1)
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Missing CSV 'file' part")
+        phones = _phones_from_csv(await upload.read())
+    else:
+        try:
+            phones = BulkFeedbackRequest.model_validate_json(await request.body()).phones
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    
+    if not phones:
+        raise HTTPException(status_code=400, detail="No phone numbers provided")
+    if len(phones) > settings.BULK_REQUEST_MAX_RECIPIENTS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Maximum of {settings.BULK_REQUEST_MAX_RECIPIENTS} recipients per request"
+        )
+    
+    return await outbound_queue.submit(
+        current_user.id,
+        phones,
+        whatsapp.feedback_request_message(current_user.name),
+        weight=plan_weight(current_user.plan_type)
+    )
+
+@router.get("/request/bulk/{job_id}")
+async def get_bulk_feedback_request(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Progresso de um pedido de feedback em massa
+    """
+    job = await outbound_queue.get_job(job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @router.get("/list")
 async def list_feedback(
     current_user: User = Depends(get_current_user),  # CORRIGIDO: era tenant
-    db: Session = Depends(get_db)  # CORRIGIDO: era get_session
+    db: AsyncSession = Depends(get_db)  # CORRIGIDO: era get_session
 ) -> List[dict]:
     """
     List all feedback for user
     """
     # Buscar todas as respostas dos links do usuário
-    feedbacks = db.exec(
-        select(ClientResponse)
-        .join(ClientLink)
-        .where(ClientLink.user_id == current_user.id)
-        .order_by(ClientResponse.created_at.desc())
-    ).all()
+    feedbacks = await ClientResponseRepository(db).list_for_user(current_user.id)
     
     return [
         {
@@ -86,19 +164,19 @@ async def list_feedback(
 @router.get("/stats")
 async def get_feedback_stats(
     current_user: User = Depends(get_current_user),  # CORRIGIDO: era tenant
-    db: Session = Depends(get_db)  # CORRIGIDO: era get_session
+    db: AsyncSession = Depends(get_db)  # CORRIGIDO: era get_session
 ) -> dict:
     """
     Get comprehensive feedback statistics for user
     """
-    business_service = BusinessService(db)
-    stats = business_service.get_user_feedback_stats(current_user.id)  # CORRIGIDO: era tenant.id
+    business_service = BusinessService(db, openai)
+    stats = await business_service.get_user_feedback_stats(current_user.id)  # CORRIGIDO: era tenant.id
     return stats
 
 @router.get("/usage")
 async def get_usage_summary(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> dict:
     """
     GUARDRAIL: Retorna resumo de uso atual e limites do plano
@@ -116,15 +194,16 @@ async def get_usage_summary(
         logger.error(f"Erro ao obter resumo de uso: {e}")
         return {"status": "error", "detail": str(e)}
 
-async def process_feedback(
-    response_id: int,
-    db: Session
-):
+async def process_feedback(response_id: int):
     """
     Background task to process feedback
+
+    A sessão da requisição já foi fechada quando a tarefa roda; leitura e
+    gravação abrem a sua, sem segurar conexão durante a transcrição
     """
     # Get feedback response
-    response = db.get(ClientResponse, response_id)
+    async with async_session_maker() as db:
+        response = await ClientResponseRepository(db).get(response_id)
     if not response or not response.audio_url:
         return
     
@@ -141,14 +220,14 @@ async def process_feedback(
     response.sentiment = analysis["sentiment"]
     response.processed = True
     
-    db.add(response)
-    db.commit()
+    async with async_session_maker() as db:
+        await ClientResponseRepository(db).save(response)
 
 @router.post("/process-webhook")
 async def process_webhook(
     data: dict,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)  # CORRIGIDO: era get_session
+    db: AsyncSession = Depends(get_db)  # CORRIGIDO: era get_session
 ):
     """
     Process WhatsApp webhook with audio
@@ -187,12 +266,10 @@ async def process_webhook(
             client_phone=from_number,
             audio_url=audio_url
         )
-        db.add(response)
-        db.commit()
-        db.refresh(response)
+        await ClientResponseRepository(db).save(response, refresh=True)
         
         # Process in background
-        background_tasks.add_task(process_feedback, response.id, db)
+        background_tasks.add_task(process_feedback, response.id)
         
         return {"status": "processing"}
         
@@ -207,7 +284,7 @@ async def create_feedback_link(
     max_responses: int = None,
     expires_in_days: int = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Dict[str, Any]:
     """
     Create a new feedback collection link
@@ -236,9 +313,7 @@ async def create_feedback_link(
             is_active=True
         )
         
-        db.add(link)
-        db.commit()
-        db.refresh(link)
+        await ClientLinkRepository(db).save(link, refresh=True)
         
         # Generate shareable URL
         share_url = f"{settings.BASE_URL}/f/{link_id}"
@@ -266,20 +341,15 @@ async def create_feedback_link(
 async def handle_feedback_link(
     link_id: str,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Handle feedback link access - redirects to WhatsApp
     """
     try:
         # Find link
-        link = db.exec(
-            select(ClientLink)
-            .where(
-                ClientLink.link_id == link_id,
-                ClientLink.is_active == True
-            )
-        ).first()
+        links = ClientLinkRepository(db)
+        link = await links.by_public_id(link_id, active_only=True)
         
         if not link:
             raise HTTPException(
@@ -290,8 +360,7 @@ async def handle_feedback_link(
         # Check if link expired
         if link.expires_at and datetime.utcnow() > link.expires_at:
             link.is_active = False
-            db.add(link)
-            db.commit()
+            await links.save(link)
             raise HTTPException(
                 status_code=status.HTTP_410_GONE,
                 detail="Link expired"
@@ -305,9 +374,7 @@ async def handle_feedback_link(
             )
             
         # Get user (owner of the link)
-        user = db.exec(
-            select(User).where(User.id == link.user_id)
-        ).first()
+        user = await UserRepository(db).get(link.user_id)
         
         if not user or not user.is_active:
             raise HTTPException(
@@ -324,8 +391,7 @@ async def handle_feedback_link(
         
         # Track view
         link.views_count = (link.views_count or 0) + 1
-        db.add(link)
-        db.commit()
+        await links.save(link)
         
         # Redirect to WhatsApp
         return RedirectResponse(whatsapp_url)
@@ -342,7 +408,7 @@ async def handle_feedback_link(
 @router.post("/test-transcribe")
 async def test_transcribe(
     audio: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Test endpoint for audio transcription
@@ -371,14 +437,14 @@ async def test_transcribe(
 async def process_audio(
     link_id: str,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Dict[str, Any]:
     """
     Processa um áudio recebido via WhatsApp
     """
     try:
         # Busca o link e valida
-        link = db.exec(select(ClientLink).where(ClientLink.link_id == link_id)).first()
+        link = await ClientLinkRepository(db).by_public_id(link_id)
         if not link:
             raise HTTPException(status_code=404, detail="Link não encontrado")
             
@@ -405,9 +471,7 @@ async def process_audio(
             audio_url=audio_url,
             processed=False
         )
-        db.add(response)
-        await db.commit()
-        await db.refresh(response)
+        await business_service.responses.save(response, refresh=True)
         
         # Transcreve o áudio
         transcription = await transcription_service.transcribe_audio(audio_url)
@@ -436,14 +500,14 @@ async def process_audio(
 @router.get("/dashboard/{user_id}")
 async def get_dashboard(
     user_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Dict[str, Any]:
     """
     Retorna dados do dashboard para um usuário específico
     """
     try:
         # Valida usuário
-        user = db.get(User, user_id)
+        user = await UserRepository(db).get(user_id)
         if not user:
             raise HTTPException(status_code=404, detail="Usuário não encontrado")
             
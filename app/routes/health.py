@@ -11,6 +11,7 @@ from pathlib import Path
 
 from ..database import get_db, engine
 from ..config import settings
+from ..services.whatsapp import whatsapp_service
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -73,6 +74,14 @@ async def detailed_health_check(db: Session = Depends(get_db)):
             "message": f"WhatsApp check failed: {str(e)}"
         }
     
+    # Baileys process liveness
+    process_status = whatsapp_service.get_status()
+    health_status["checks"]["whatsapp_process"] = {
+        "status": "healthy" if process_status["alive"] else "unhealthy",
+        "message": "Baileys listener running" if process_status["alive"] else "Baileys listener not running",
+        "restart_count": process_status["restart_count"]
+    }
+    
     # OpenAI check
     health_status["checks"]["openai"] = {
         "status": "healthy" if settings.OPENAI_API_KEY and settings.OPENAI_API_KEY.startswith("sk-") else "unhealthy",
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel
 from typing import Optional
 from ..services.monitoring import MonitoringService
+from ..services.whatsapp import whatsapp_service
 
 router = APIRouter()
 monitoring = MonitoringService()
@@ -39,4 +41,18 @@ async def record_audio_processing(processing: AudioProcessing):
         duration=processing.duration,
         error=processing.error
     )
-    return {"status": "recorded"} 
\ No newline at end of file
+    return {"status": "recorded"}
+
+@router.get("/metrics")
+async def metrics():
+    """
+    Métricas no formato do Prometheus
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@router.get("/whatsapp/process")
+async def whatsapp_process_status():
+    """
+    Liveness e contagem de reinícios do processo Baileys
+    """
+    return whatsapp_service.get_status()
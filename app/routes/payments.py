@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Header
-from sqlmodel import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, Dict, Any
 from pydantic import BaseModel
 import logging
@@ -21,7 +21,7 @@ class SubscriptionRequest(BaseModel):
 async def create_subscription(
     request: SubscriptionRequest,
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Dict[str, Any]:
     """
     Cria uma nova assinatura para o usuário
@@ -36,7 +36,7 @@ async def create_subscription(
 async def stripe_webhook(
     request: Request,
     stripe_signature: str = Header(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Dict[str, str]:
     """
     Handle Stripe webhook events
@@ -57,7 +57,7 @@ async def stripe_webhook(
 @router.post("/cancel-subscription")
 async def cancel_subscription(
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Dict[str, str]:
     """
     Cancela assinatura do usuário
@@ -71,7 +71,7 @@ async def cancel_subscription(
 @router.get("/subscription-status")
 async def get_subscription_status(
     user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Dict[str, Any]:
     """
     Retorna status da assinatura do usuário
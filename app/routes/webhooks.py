@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Request, BackgroundTasks, Depends, HTTPException
-from sqlmodel import Session
-from ..database import get_db
-from ..services.whatsapp import WhatsAppService
+from fastapi import APIRouter, Request, Depends, HTTPException, Header
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..config import settings
+from ..database import get_db, async_session_maker
+from ..services.whatsapp import whatsapp_service as whatsapp, SpoolConsumer
 from ..services.business import BusinessService
+from ..services.idempotency import ingest_dedupe, DuplicateMessageError
 from ..services.usage import usage_service, UsageError, FeatureType
 from ..services.transcription import TranscriptionService
 from ..services.openai import OpenAIService
+from ..services.jobs import job_queue, plan_weight
 import logging
 import base64
 from pydantic import BaseModel, Field
@@ -14,10 +18,9 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 
 # Initialize services
-whatsapp = WhatsAppService()
 transcription = TranscriptionService()
 
-def get_business_service(db: Session = Depends(get_db)) -> BusinessService:
+def get_business_service(db: AsyncSession = Depends(get_db)) -> BusinessService:
     openai = OpenAIService()
     return BusinessService(db=db, openai=openai)
 
@@ -45,30 +48,247 @@ async def test_message(message: TestMessage):
         logger.error(f"Error sending test message: {e}")
         return {"status": "error", "detail": str(e)}
 
+async def _admit_audio(
+    from_: str,
+    business_service: BusinessService,
+    db: AsyncSession
+):
+    """
+    Resolve the tenant for a sender and apply usage guardrails.
+
+    Returns ``(user, link_id, None)`` when the audio may be processed, or
+    ``(None, None, status)`` with the response body to return otherwise.
+    The audio is filed under the tenant's most recent active link.
+    """
+    # Find user by phone number
+    user = await business_service.find_user_by_phone(from_)
+    if not user:
+        logger.warning(f"No user found for phone {from_}")
+        return None, None, {"status": "user not found"}
+    
+    link_id = await business_service.links.latest_active_id(user.id)
+    if link_id is None:
+        logger.warning(f"User {user.id} has no active link for incoming audio")
+        return None, None, {"status": "no active link"}
+        
+    # Check usage limits
+    try:
+        await usage_service.check_audio_limit(user, db)
+        await usage_service.check_feature_access(user, FeatureType.BASIC_AI)
+    except UsageError as e:
+        logger.warning(f"Guardrail blocked processing: {e.detail}")
+        return None, None, {"status": "limit exceeded", "reason": e.detail}
+    
+    return user, link_id, None
+
+async def _enqueue_audio(
+    user,
+    link_id: int,
+    from_: str,
+    message_id: str,
+    audio_bytes: bytes,
+    business_service: BusinessService,
+    db: AsyncSession
+) -> dict:
+    """
+    Create the response entry and its durable ``process_audio`` job in one
+    transaction, then account usage
+
+    A failure before the commit leaves neither row behind, so a redelivery
+    of the message is processed again instead of being acked as a
+    duplicate of a response that never got a job.
+    """
+    # Create response entry (committed together with its job below)
+    try:
+        response = await business_service.create_response_entry(
+            link_id=link_id,
+            client_phone=from_,
+            audio_url=message_id,  # Store message ID as reference
+            whatsapp_message_id=message_id,
+            commit=False
+        )
+    except DuplicateMessageError:
+        # Outra entrega da mesma mensagem venceu a corrida pela constraint única
+        original = await ingest_dedupe.lookup(message_id, db)
+        return ingest_dedupe.duplicate_of(message_id, original or {"status": "processing"})
+    
+    if not response:
+        logger.error("Failed to create response entry")
+        await db.rollback()
+        return {"status": "failed to create response"}
+    
+    # Process audio in a worker (embedded or standalone), fair across tenants
+    try:
+        await job_queue.enqueue(
+            "process_audio",
+            {"response_id": response.id},
+            blob=audio_bytes,
+            tenant_id=user.id,
+            weight=plan_weight(user.plan_type),
+            db=db
+        )
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        raise
+    
+    # Increment usage counters
+    try:
+        await usage_service.increment_audio_usage(user, db)
+        await usage_service.increment_ai_usage(user, db, FeatureType.BASIC_AI)
+    except Exception as e:
+        logger.error(f"Error incrementing usage: {e}")
+    
+    logger.info(f"Created response {response.id} for user {user.id}")
+    status = {"status": "processing", "response_id": response.id}
+    ingest_dedupe.put(message_id, status)
+    return status
+
+async def _read_audio_body(request: Request) -> bytes:
+    """
+    Read the request body in chunks, up to ``AUDIO_MAX_BYTES``.
+
+    Accepts a raw ``application/octet-stream``/``audio/*`` body or a
+    multipart upload with an ``audio`` part. The audio is returned in
+    memory because the job stores it as a bytea blob, so each request holds
+    at most ``AUDIO_MAX_BYTES``: larger payloads are rejected with 413 as
+    soon as the declared or received size passes the limit, before the rest
+    of the body is read.
+    """
+    max_bytes = settings.AUDIO_MAX_BYTES
+    content_type = request.headers.get("content-type", "")
+    
+    declared_length = request.headers.get("content-length")
+    if declared_length and declared_length.isdigit() and int(declared_length) > max_bytes:
+        raise HTTPException(status_code=413, detail="Audio payload too large")
+    
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form(max_files=1)
+        upload = form.get("audio")
+        if not isinstance(upload, StarletteUploadFile):
+            raise HTTPException(status_code=400, detail="Missing 'audio' file part")
+        # Starlette already spooled the part to a temporary file
+        if upload.size is not None and upload.size > max_bytes:
+            raise HTTPException(status_code=413, detail="Audio payload too large")
+        chunks = _iter_upload(upload)
+    elif content_type.startswith(("application/octet-stream", "audio/")):
+        chunks = request.stream()
+    else:
+        raise HTTPException(status_code=415, detail=f"Unsupported content type: {content_type or 'none'}")
+    
+    audio = bytearray()
+    async for chunk in chunks:
+        if len(audio) + len(chunk) > max_bytes:
+            raise HTTPException(status_code=413, detail="Audio payload too large")
+        audio += chunk
+    
+    if not audio:
+        raise HTTPException(status_code=400, detail="Empty audio payload")
+    
+    return bytes(audio)
+
+async def _iter_upload(upload: StarletteUploadFile, chunk_size: int = 64 * 1024):
+    while chunk := await upload.read(chunk_size):
+        yield chunk
+
+@router.post("/audio")
+async def ingest_audio(
+    request: Request,
+    from_: str = Header(..., alias="X-WhatsApp-From"),
+    message_id: str = Header(..., alias="X-WhatsApp-Message-Id"),
+    business_service: BusinessService = Depends(get_business_service),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Process a binary audio message received from WhatsApp.
+
+    The Opus/Ogg payload is sent as the raw request body (or as the
+    ``audio`` part of a multipart form) with the sender and message id in
+    the ``X-WhatsApp-From`` / ``X-WhatsApp-Message-Id`` headers.
+    """
+    try:
+        # Entregas repetidas não leem o corpo nem chegam à IA
+        original = await ingest_dedupe.lookup(message_id, db)
+        if original:
+            return ingest_dedupe.duplicate_of(message_id, original)
+        
+        user, link_id, rejected = await _admit_audio(from_, business_service, db)
+        if rejected:
+            return rejected
+        
+        audio_bytes = await _read_audio_body(request)
+        
+        return await _enqueue_audio(
+            user, link_id, from_, message_id, audio_bytes,
+            business_service, db
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing audio: {e}")
+        return {"status": "error", "detail": str(e)}
+
+async def ingest_spooled_audio(header: dict, audio_bytes: bytes) -> None:
+    """
+    Handler do SpoolConsumer: admite e enfileira um áudio lido do spool.
+
+    Rejeições de negócio (usuário desconhecido, limite atingido) confirmam o
+    registro; falhas de infraestrutura levantam exceção para nova tentativa.
+    """
+    from_ = header["from"]
+    message_id = header["message_id"]
+    
+    async with async_session_maker() as db:
+        business_service = BusinessService(db=db, openai=OpenAIService())
+        
+        original = await ingest_dedupe.lookup(message_id, db)
+        if original:
+            ingest_dedupe.duplicate_of(message_id, original)
+            return
+        
+        user, link_id, rejected = await _admit_audio(from_, business_service, db)
+        if rejected:
+            logger.info(f"Spooled audio {message_id} not processed: {rejected}")
+            return
+        
+        result = await _enqueue_audio(
+            user, link_id, from_, message_id, audio_bytes,
+            business_service, db
+        )
+        if result.get("duplicate"):
+            return
+        if result["status"] != "processing":
+            raise RuntimeError(f"Failed to enqueue spooled audio {message_id}: {result}")
+
+spool_consumer = SpoolConsumer(
+    settings.WHATSAPP_SPOOL_DIR,
+    handler=ingest_spooled_audio,
+    poll_interval=settings.WHATSAPP_SPOOL_POLL_INTERVAL,
+    max_attempts=settings.WHATSAPP_SPOOL_MAX_ATTEMPTS,
+    retry_backoff=settings.WHATSAPP_SPOOL_RETRY_BACKOFF
+)
+
 @router.post("/process-audio")
 async def process_audio(
     message: AudioMessage,
-    background_tasks: BackgroundTasks,
     business_service: BusinessService = Depends(get_business_service),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Process audio message received from WhatsApp
+
+    Legacy base64 JSON ingestion, kept for older listeners. New clients
+    should use ``POST /webhooks/audio``.
     """
     try:
-        # Find user by phone number
-        user = await business_service.find_user_by_phone(message.from_, db)
-        if not user:
-            logger.warning(f"No user found for phone {message.from_}")
-            return {"status": "user not found"}
-            
-        # Check usage limits
-        try:
-            await usage_service.check_audio_limit(user, db)
-            await usage_service.check_feature_access(user, FeatureType.BASIC_AI)
-        except UsageError as e:
-            logger.warning(f"Guardrail blocked processing: {e.detail}")
-            return {"status": "limit exceeded", "reason": e.detail}
+        original = await ingest_dedupe.lookup(message.message_id, db)
+        if original:
+            return ingest_dedupe.duplicate_of(message.message_id, original)
+        
+        user, link_id, rejected = await _admit_audio(message.from_, business_service, db)
+        if rejected:
+            return rejected
         
         # Decode audio from base64
         try:
@@ -77,35 +297,11 @@ async def process_audio(
             logger.error(f"Failed to decode audio: {e}")
             return {"status": "invalid audio"}
         
-        # Create response entry
-        response = business_service.create_response_entry(
-            link_id=user.active_link_id,  # Assuming user has an active link
-            client_phone=message.from_,
-            audio_url=message.message_id  # Store message ID as reference
+        return await _enqueue_audio(
+            user, link_id, message.from_, message.message_id, audio_bytes,
+            business_service, db
         )
         
-        if not response:
-            logger.error("Failed to create response entry")
-            return {"status": "failed to create response"}
-        
-        # Increment usage counters
-        try:
-            await usage_service.increment_audio_usage(user, db)
-            await usage_service.increment_ai_usage(user, db, FeatureType.BASIC_AI)
-        except Exception as e:
-            logger.error(f"Error incrementing usage: {e}")
-        
-        # Process audio in background
-        background_tasks.add_task(
-            business_service.process_response,
-            response.id,
-            db,
-            audio_bytes
-        )
-        
-        logger.info(f"Created response {response.id} for user {user.id}")
-        return {"status": "processing"}
-        
     except Exception as e:
         logger.error(f"Error processing audio: {e}")
         return {"status": "error", "detail": str(e)}
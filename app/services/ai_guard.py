@@ -0,0 +1,264 @@
+"""
+Guarda compartilhada das chamadas à OpenAI
+Concorrência adaptativa (AIMD) guiada por latência e 429s, token buckets de
+RPM/TPM e circuit breaker que falha rápido quando o provedor está degradado.
+Transcrição e análise têm cada uma o seu limitador AIMD e alvo de latência:
+uma transcrição de áudio longo leva dezenas de segundos, uma análise curta
+poucos, e um alvo único reduziria a concorrência de uma pela lentidão da outra
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+import openai
+
+from ..config import settings
+from .monitoring import ai_circuit_state, ai_concurrency_limit, ai_inflight, ai_throttled
+from .rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Erros que indicam sobrecarga/degradação do provedor (contam para o breaker)
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    httpx.TimeoutException,
+    httpx.TransportError,
+    asyncio.TimeoutError,
+)
+
+class ProviderUnavailableError(Exception):
+    """O provedor está degradado; o trabalho deve ser adiado, não descartado"""
+
+class CircuitOpenError(ProviderUnavailableError):
+    """Circuit breaker aberto: chamada recusada sem tocar o provedor"""
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa barata de tokens (~4 caracteres por token em pt-BR)"""
+    return len(text) // 4 + 1
+
+class AIMDLimiter:
+    """
+    Limite de concorrência com aumento aditivo e redução multiplicativa.
+
+    Cada sucesso abaixo de ``latency_target`` soma ``1/limite`` (≈ +1 por
+    janela completa); um 429, timeout ou resposta lenta multiplica o limite
+    por ``backoff``, no máximo uma vez por ``cooldown`` segundos.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        latency_target: float,
+        backoff: float = 0.5,
+        cooldown: float = 1.0,
+        name: str = "openai"
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self.name = name
+        self.inflight = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+        ai_concurrency_limit.labels(provider=name).set(self.limit)
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.inflight < int(self.limit))
+            self.inflight += 1
+            ai_inflight.labels(provider=self.name).set(self.inflight)
+
+    async def release(self, latency: Optional[float], overloaded: bool = False):
+        async with self._condition:
+            self.inflight -= 1
+            ai_inflight.labels(provider=self.name).set(self.inflight)
+
+            if overloaded or (latency is not None and latency > self.latency_target):
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self._last_decrease = now
+            elif latency is not None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+            ai_concurrency_limit.labels(provider=self.name).set(self.limit)
+            self._condition.notify_all()
+
+class CircuitBreaker:
+    """
+    Abre após ``failure_threshold`` falhas de provedor consecutivas; depois de
+    ``reset_timeout`` segundos deixa passar uma chamada de teste (half-open)
+    """
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, name: str = "openai"):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_inflight = False
+
+    def before_call(self):
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"{self.name} circuit open")
+            self._set_state(self.HALF_OPEN)
+
+        if self.state == self.HALF_OPEN:
+            if self._probe_inflight:
+                raise CircuitOpenError(f"{self.name} circuit half-open, probe in flight")
+            self._probe_inflight = True
+
+    def on_success(self):
+        self._probe_inflight = False
+        self.failures = 0
+        if self.state != self.CLOSED:
+            logger.info(f"{self.name} circuit closed")
+            self._set_state(self.CLOSED)
+
+    def on_failure(self):
+        self._probe_inflight = False
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"{self.name} circuit opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+    def on_neutral(self):
+        """Erro do cliente (4xx): não diz nada sobre a saúde do provedor"""
+        self._probe_inflight = False
+
+    def _set_state(self, state: str):
+        self.state = state
+        ai_circuit_state.labels(provider=self.name).set(
+            {self.CLOSED: 0, self.HALF_OPEN: 1, self.OPEN: 2}[state]
+        )
+
+class AIGuard:
+    """
+    Ponto único por onde passam todas as chamadas a um provedor de IA.
+
+    RPM/TPM e circuit breaker são do provedor e valem para todas as chamadas;
+    a concorrência é limitada por operação, com um ``AIMDLimiter`` para cada
+    chave de ``limiters``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        limiters: Dict[str, AIMDLimiter],
+        breaker: CircuitBreaker
+    ):
+        self.name = name
+        self.rpm = TokenBucket(requests_per_minute / 60, requests_per_minute)
+        self.tpm = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+        self.limiters = limiters
+        self.breaker = breaker
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        operation: str,
+        estimated_tokens: int = 0,
+        used_tokens: Optional[Callable[[T], Optional[int]]] = None
+    ) -> T:
+        """
+        Executa ``fn`` respeitando breaker, RPM/TPM e a concorrência de
+        ``operation`` (uma chave de ``limiters``).
+
+        ``used_tokens`` extrai o consumo real da resposta para corrigir a
+        reserva feita com ``estimated_tokens``. Falhas de provedor viram
+        ``ProviderUnavailableError``; erros do cliente são propagados.
+        """
+        limiter = self.limiters[operation]
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            ai_throttled.labels(provider=self.name, reason="circuit_open").inc()
+            raise
+
+        try:
+            await self.rpm.acquire(1)
+            if estimated_tokens:
+                await self.tpm.acquire(estimated_tokens)
+            await limiter.acquire()
+        except BaseException:
+            # Cancelado na fila: libera a vaga de teste do breaker
+            self.breaker.on_neutral()
+            raise
+
+        started = time.perf_counter()
+        try:
+            result = await fn()
+        except RETRYABLE_ERRORS as e:
+            await limiter.release(None, overloaded=True)
+            self.breaker.on_failure()
+            reason = "rate_limited" if isinstance(e, openai.RateLimitError) else "provider_error"
+            ai_throttled.labels(provider=self.name, reason=reason).inc()
+            raise ProviderUnavailableError(f"{self.name}: {e}") from e
+        except BaseException:
+            await limiter.release(None)
+            self.breaker.on_neutral()
+            raise
+
+        await limiter.release(time.perf_counter() - started)
+        self.breaker.on_success()
+
+        if estimated_tokens and used_tokens:
+            actual = used_tokens(result)
+            if actual is not None:
+                self.tpm.refund(estimated_tokens - actual)
+        return result
+
+def usage_total_tokens(response) -> Optional[int]:
+    """Consumo real informado pela API (``used_tokens`` de ``AIGuard.call``)"""
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
+# Instância global do serviço
+openai_guard = AIGuard(
+    name="openai",
+    requests_per_minute=settings.OPENAI_RPM_LIMIT,
+    tokens_per_minute=settings.OPENAI_TPM_LIMIT,
+    limiters={
+        "transcription": AIMDLimiter(
+            initial=settings.OPENAI_TRANSCRIPTION_CONCURRENCY_INITIAL,
+            min_limit=1,
+            max_limit=settings.OPENAI_TRANSCRIPTION_CONCURRENCY_MAX,
+            latency_target=settings.OPENAI_TRANSCRIPTION_LATENCY_TARGET,
+            name="openai_transcription"
+        ),
+        "analysis": AIMDLimiter(
+            initial=settings.OPENAI_ANALYSIS_CONCURRENCY_INITIAL,
+            min_limit=1,
+            max_limit=settings.OPENAI_ANALYSIS_CONCURRENCY_MAX,
+            latency_target=settings.OPENAI_ANALYSIS_LATENCY_TARGET,
+            name="openai_analysis"
+        )
+    },
+    breaker=CircuitBreaker(
+        failure_threshold=settings.OPENAI_CIRCUIT_FAILURES,
+        reset_timeout=settings.OPENAI_CIRCUIT_RESET_SECONDS
+    )
+)
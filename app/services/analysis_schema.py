@@ -0,0 +1,244 @@
+"""
+Esquema tipado da análise de feedback
+Modelo pydantic dos 14 campos, JSON schema para structured output e reparo
+de respostas truncadas ou cercadas por markdown
+"""
+import json
+import re
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+class AnalysisIntent(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    primary: Optional[str] = None
+    secondary: List[str] = []
+
+class CustomerSatisfaction(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    level: Literal["SATISFEITO", "INSATISFEITO", "NEUTRO"]
+    reasons: List[str] = []
+
+class FeedbackAnalysis(BaseModel):
+    """Resultado validado de ``OpenAIService.analyze_feedback``"""
+    model_config = ConfigDict(extra="ignore")
+
+    sentiment: Literal["POSITIVO", "NEGATIVO", "NEUTRO"]
+    sentiment_score: float = Field(ge=-1.0, le=1.0)
+    inferred_rating: Optional[int] = Field(default=None, ge=1, le=5)
+    emotions: List[str]
+    key_phrases: List[str]
+    is_compliment: bool
+    is_complaint: bool
+    action_items: List[str]
+    topics: List[str]
+    intent: AnalysisIntent
+    urgency: Literal["ALTA", "MÉDIA", "BAIXA"]
+    customer_satisfaction: CustomerSatisfaction
+    product_mentions: List[str]
+    improvement_areas: List[str]
+
+ANALYSIS_FIELDS = tuple(FeedbackAnalysis.model_fields)
+
+# Valores válidos usados só para validar campos isoladamente
+_BASELINE: Dict[str, Any] = {
+    "sentiment": "NEUTRO",
+    "sentiment_score": 0.0,
+    "inferred_rating": None,
+    "emotions": [],
+    "key_phrases": [],
+    "is_compliment": False,
+    "is_complaint": False,
+    "action_items": [],
+    "topics": [],
+    "intent": {"primary": None, "secondary": []},
+    "urgency": "BAIXA",
+    "customer_satisfaction": {"level": "NEUTRO", "reasons": []},
+    "product_mentions": [],
+    "improvement_areas": []
+}
+
+def _string_list() -> Dict[str, Any]:
+    return {"type": "array", "items": {"type": "string"}}
+
+# Structured outputs (strict) exige todos os campos em ``required`` e
+# ``additionalProperties: false``; limites numéricos ficam no prompt
+ANALYSIS_PROPERTIES: Dict[str, Dict[str, Any]] = {
+    "sentiment": {"type": "string", "enum": ["POSITIVO", "NEGATIVO", "NEUTRO"]},
+    "sentiment_score": {"type": "number"},
+    "inferred_rating": {"type": ["integer", "null"]},
+    "emotions": _string_list(),
+    "key_phrases": _string_list(),
+    "is_compliment": {"type": "boolean"},
+    "is_complaint": {"type": "boolean"},
+    "action_items": _string_list(),
+    "topics": _string_list(),
+    "intent": {
+        "type": "object",
+        "properties": {"primary": {"type": ["string", "null"]}, "secondary": _string_list()},
+        "required": ["primary", "secondary"],
+        "additionalProperties": False
+    },
+    "urgency": {"type": "string", "enum": ["ALTA", "MÉDIA", "BAIXA"]},
+    "customer_satisfaction": {
+        "type": "object",
+        "properties": {
+            "level": {"type": "string", "enum": ["SATISFEITO", "INSATISFEITO", "NEUTRO"]},
+            "reasons": _string_list()
+        },
+        "required": ["level", "reasons"],
+        "additionalProperties": False
+    },
+    "product_mentions": _string_list(),
+    "improvement_areas": _string_list()
+}
+
+def analysis_json_schema(fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """JSON schema do objeto de análise (ou só de ``fields``)"""
+    names = list(fields or ANALYSIS_FIELDS)
+    return {
+        "type": "object",
+        "properties": {name: ANALYSIS_PROPERTIES[name] for name in names},
+        "required": names,
+        "additionalProperties": False
+    }
+
+def response_format(name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+def batch_json_schema() -> Dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": {
+            "results": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"id": {"type": "string"}, "analysis": analysis_json_schema()},
+                    "required": ["id", "analysis"],
+                    "additionalProperties": False
+                }
+            }
+        },
+        "required": ["results"],
+        "additionalProperties": False
+    }
+
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+def repair_json(content: str, max_open: int = 1) -> Optional[Dict[str, Any]]:
+    """
+    Recupera o maior prefixo válido de um objeto JSON: remove cercas de
+    markdown e, se a saída foi truncada, corta no último valor completo e
+    fecha as chaves/colchetes abertos
+
+    Só os ``max_open`` containers mais externos podem ser fechados pelo
+    reparo; um valor mais interno que ficou aberto é descartado inteiro em
+    vez de virar uma lista ou objeto parcial (``["alegria", "grat`` não vira
+    ``["alegria"]``), para que o campo conte como ausente e seja pedido de
+    novo. Com o padrão, sobram só os campos do objeto raiz fechados no texto
+    original; o lote usa 2 para aproveitar os itens completos de ``results``.
+    """
+    text = _FENCE_RE.sub("", content or "")
+    start = text.find("{")
+    if start < 0:
+        return None
+    text = text[start:]
+
+    try:
+        value = json.loads(text)
+        return value if isinstance(value, dict) else None
+    except ValueError:
+        pass
+
+    closers: List[str] = []
+    cuts: List[Tuple[int, str]] = []
+    in_string = escaped = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            closers.append("}" if char == "{" else "]")
+            if len(closers) <= max_open:
+                cuts.append((index + 1, "".join(reversed(closers))))
+        elif char in "}]" and closers:
+            closers.pop()
+            if len(closers) <= max_open:
+                cuts.append((index + 1, "".join(reversed(closers))))
+        elif char == "," and len(closers) <= max_open:
+            cuts.append((index, "".join(reversed(closers))))
+
+    for index, closing in reversed(cuts):
+        try:
+            value = json.loads(text[:index].rstrip().rstrip(",") + closing)
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            return value
+    return None
+
+def validate_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Campos de ``data`` que passam na validação, cada um isoladamente"""
+    valid: Dict[str, Any] = {}
+    for name in ANALYSIS_FIELDS:
+        if name not in data:
+            continue
+        try:
+            checked = FeedbackAnalysis.model_validate({**_BASELINE, name: data[name]})
+        except ValidationError:
+            continue
+        valid[name] = getattr(checked, name)
+    return valid
+
+def decode_analysis(content: str) -> Tuple[Optional[FeedbackAnalysis], Dict[str, Any]]:
+    """
+    Decodifica a resposta do modelo.
+
+    Caminho rápido: validação direta do JSON pelo pydantic-core. Se falhar,
+    repara a saída e valida campo a campo; retorna ``(None, campos_válidos)``
+    para que só os campos faltantes sejam pedidos de novo.
+    """
+    try:
+        return FeedbackAnalysis.model_validate_json(content), {}
+    except ValidationError:
+        pass
+
+    valid = validate_fields(repair_json(content) or {})
+    if len(valid) == len(ANALYSIS_FIELDS):
+        return FeedbackAnalysis(**valid), valid
+    return None, valid
+
+def apply_analysis(response, analysis: Dict[str, Any]) -> None:
+    """Copia o dicionário de análise para as colunas de um ``ClientResponse``"""
+    intent = analysis.get("intent") or {}
+    satisfaction = analysis.get("customer_satisfaction") or {}
+    response.sentiment = analysis.get("sentiment")
+    response.sentiment_score = analysis.get("sentiment_score")
+    response.inferred_rating = analysis.get("inferred_rating")
+    response.emotions = analysis.get("emotions") or []
+    response.key_phrases = analysis.get("key_phrases") or []
+    response.is_compliment = bool(analysis.get("is_compliment"))
+    response.is_complaint = bool(analysis.get("is_complaint"))
+    response.action_items = analysis.get("action_items") or []
+    response.topics = analysis.get("topics") or []
+    response.intent_primary = intent.get("primary")
+    response.intent_secondary = intent.get("secondary") or []
+    response.urgency = analysis.get("urgency")
+    response.satisfaction_level = satisfaction.get("level")
+    response.satisfaction_reasons = satisfaction.get("reasons") or []
+    response.product_mentions = analysis.get("product_mentions") or []
+    response.improvement_areas = analysis.get("improvement_areas") or []
+
+def complete_analysis(valid: Dict[str, Any]) -> FeedbackAnalysis:
+    """Completa campos ainda ausentes com valores neutros"""
+    return FeedbackAnalysis(**{**_BASELINE, **valid})
@@ -0,0 +1,302 @@
+"""
+Pré-processamento de áudio antes da transcrição
+Decodifica para PCM mono 16 kHz, detecta voz por energia, corta o silêncio
+das pontas e reencoda em Opus de baixa taxa. A transcrição é cobrada por
+segundo de áudio, então todo silêncio removido é custo e latência a menos
+"""
+import asyncio
+import logging
+import math
+import operator
+import shutil
+import sys
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+from ..config import settings
+from .monitoring import (
+    audio_preprocess_duration,
+    audio_preprocess_input_seconds,
+    audio_preprocess_seconds_saved,
+    audio_preprocess_total
+)
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_WIDTH = 2  # s16le
+
+class NoSpeechError(Exception):
+    """O áudio não contém voz detectável; não vale a pena transcrever"""
+
+class AudioPreprocessingError(Exception):
+    """Falha ao decodificar ou reencodar o áudio com o ffmpeg"""
+
+@dataclass
+class PreprocessedAudio:
+    audio: bytes
+    original_seconds: float
+    output_seconds: float
+    speech_seconds: float
+    preprocessed: bool = True
+    # Trechos Opus sobrepostos quando o áudio é longo o bastante para ser
+    # dividido; nesse caso ``audio`` fica vazio
+    chunks: List[bytes] = field(default_factory=list)
+
+    @property
+    def seconds_saved(self) -> float:
+        return max(0.0, self.original_seconds - self.output_seconds)
+
+def _pcm_samples(pcm: bytes) -> array:
+    """Amostras s16le como ``array('h')`` (o ffmpeg entrega little-endian)"""
+    samples = array("h")
+    samples.frombytes(pcm[:len(pcm) - len(pcm) % SAMPLE_WIDTH])
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return samples
+
+def _sum_of_squares(samples: Sequence[int]) -> int:
+    if hasattr(math, "sumprod"):  # Python 3.12+, em C
+        return int(math.sumprod(samples, samples))
+    return sum(map(operator.mul, samples, samples))
+
+def _rms(samples: Sequence[int]) -> int:
+    if not samples:
+        return 0
+    return int(math.sqrt(_sum_of_squares(samples) / len(samples)))
+
+def frame_rms(frame: bytes) -> int:
+    """RMS de um frame PCM s16le (o mesmo valor do antigo ``audioop.rms``)"""
+    return _rms(_pcm_samples(frame))
+
+def frame_levels(pcm: bytes, sample_rate: int, frame_ms: int) -> List[int]:
+    """RMS de cada frame completo de ``frame_ms``"""
+    samples = _pcm_samples(pcm)
+    frame_samples = sample_rate * frame_ms // 1000
+    return [
+        _rms(samples[offset:offset + frame_samples])
+        for offset in range(0, len(samples) - frame_samples + 1, frame_samples)
+    ]
+
+def detect_speech(
+    levels: List[int],
+    threshold_dbfs: float,
+    noise_margin_db: float,
+    dynamic_range_db: float = 20.0
+) -> List[bool]:
+    """
+    VAD por energia: um frame é voz se estiver acima do limiar absoluto e
+    ``noise_margin_db`` acima do ruído de fundo estimado (percentil 10).
+
+    Em áudio quase todo falado o percentil 10 já é voz, então o limiar
+    relativo nunca passa de ``dynamic_range_db`` abaixo do nível alto
+    (percentil 95).
+    """
+    if not levels:
+        return []
+
+    ordered = sorted(levels)
+    noise_floor = ordered[len(ordered) // 10]
+    loud = ordered[len(ordered) * 95 // 100]
+    absolute = 32768 * 10 ** (threshold_dbfs / 20)
+    relative = min(
+        max(noise_floor, 1) * 10 ** (noise_margin_db / 20),
+        loud * 10 ** (-dynamic_range_db / 20)
+    )
+    threshold = max(absolute, relative)
+
+    return [level >= threshold for level in levels]
+
+def split_points(levels: List[int], chunk_frames: int, search_frames: int) -> List[int]:
+    """
+    Frames de corte para trechos de até ``chunk_frames``: cada corte cai no
+    frame mais silencioso dos últimos ``search_frames`` do trecho, para não
+    partir uma palavra ao meio
+    """
+    points: List[int] = []
+    start = 0
+    while len(levels) - start > chunk_frames:
+        window_start = start + max(1, chunk_frames - search_frames)
+        window = levels[window_start:start + chunk_frames]
+        cut = window_start + min(range(len(window)), key=window.__getitem__)
+        points.append(cut)
+        start = cut
+    return points
+
+class AudioPreprocessor:
+    """
+    Estágio executado antes do upload para o provedor de transcrição.
+
+    Se o ffmpeg não estiver disponível ou falhar, o áudio original segue
+    adiante sem alteração; só a ausência comprovada de voz interrompe o
+    pipeline (``NoSpeechError``).
+    """
+
+    def __init__(
+        self,
+        ffmpeg_path: str = "ffmpeg",
+        sample_rate: int = 16000,
+        frame_ms: int = 30,
+        threshold_dbfs: float = -45.0,
+        noise_margin_db: float = 10.0,
+        padding_ms: int = 300,
+        min_speech_ms: int = 300,
+        opus_bitrate: str = "16k",
+        enabled: bool = True
+    ):
+        self.ffmpeg_path = ffmpeg_path
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.threshold_dbfs = threshold_dbfs
+        self.noise_margin_db = noise_margin_db
+        self.padding_ms = padding_ms
+        self.min_speech_ms = min_speech_ms
+        self.opus_bitrate = opus_bitrate
+        self.enabled = enabled
+
+    @property
+    def available(self) -> bool:
+        return self.enabled and shutil.which(self.ffmpeg_path) is not None
+
+    async def process(
+        self,
+        audio_bytes: bytes,
+        chunk_seconds: Optional[float] = None,
+        min_chunked_seconds: float = 0.0,
+        overlap_seconds: float = 0.0
+    ) -> PreprocessedAudio:
+        """
+        Pré-processa o áudio; se ``chunk_seconds`` for informado e a fala
+        aparada passar de ``min_chunked_seconds``, também devolve o áudio
+        dividido em trechos nos silêncios, cada um começando
+        ``overlap_seconds`` antes do corte
+        """
+        if not self.available:
+            return PreprocessedAudio(audio_bytes, 0.0, 0.0, 0.0, preprocessed=False)
+
+        started = time.perf_counter()
+        try:
+            pcm = await self.decode(audio_bytes)
+            result = await self._trim_and_encode(pcm, chunk_seconds, min_chunked_seconds, overlap_seconds)
+        except NoSpeechError:
+            audio_preprocess_total.labels(result="no_speech").inc()
+            raise
+        except Exception as e:
+            logger.warning(f"Audio preprocessing failed, uploading original audio: {e}")
+            audio_preprocess_total.labels(result="error").inc()
+            return PreprocessedAudio(audio_bytes, 0.0, 0.0, 0.0, preprocessed=False)
+        finally:
+            audio_preprocess_duration.observe(time.perf_counter() - started)
+
+        audio_preprocess_total.labels(result="success").inc()
+        audio_preprocess_input_seconds.inc(result.original_seconds)
+        audio_preprocess_seconds_saved.inc(result.seconds_saved)
+        logger.info(
+            f"Preprocessed audio: {result.original_seconds:.1f}s -> {result.output_seconds:.1f}s "
+            f"({result.speech_seconds:.1f}s speech, {len(audio_bytes)} -> {len(result.audio) or sum(map(len, result.chunks))} bytes, "
+            f"{len(result.chunks) or 1} chunk(s))"
+        )
+        return result
+
+    async def _trim_and_encode(
+        self,
+        pcm: bytes,
+        chunk_seconds: Optional[float],
+        min_chunked_seconds: float,
+        overlap_seconds: float
+    ) -> PreprocessedAudio:
+        bytes_per_second = self.sample_rate * SAMPLE_WIDTH
+        original_seconds = len(pcm) / bytes_per_second
+
+        # Varredura de todas as amostras em Python: roda fora do event loop,
+        # que no worker embutido também atende webhooks e o spool
+        levels, speech = await asyncio.to_thread(self._speech_frames, pcm)
+        speech_seconds = sum(speech) * self.frame_ms / 1000
+        if speech_seconds * 1000 < self.min_speech_ms:
+            raise NoSpeechError(f"No speech detected in {original_seconds:.1f}s of audio")
+
+        first = speech.index(True)
+        last = len(speech) - 1 - speech[::-1].index(True)
+        padding = self.padding_ms // self.frame_ms
+        frame_bytes = bytes_per_second * self.frame_ms // 1000
+
+        start_frame = max(0, first - padding)
+        end_frame = last + 1 + padding
+        trimmed = pcm[start_frame * frame_bytes:min(len(pcm), end_frame * frame_bytes)]
+        output_seconds = len(trimmed) / bytes_per_second
+
+        if chunk_seconds and output_seconds > max(chunk_seconds, min_chunked_seconds):
+            frames_per_second = 1000 / self.frame_ms
+            cuts = split_points(
+                levels[start_frame:end_frame],
+                chunk_frames=int(chunk_seconds * frames_per_second),
+                search_frames=int(chunk_seconds * frames_per_second / 4)
+            )
+            overlap_bytes = int(overlap_seconds * frames_per_second) * frame_bytes
+            bounds = [0] + [cut * frame_bytes for cut in cuts] + [len(trimmed)]
+            pieces = [
+                trimmed[max(0, begin - overlap_bytes):end]
+                for begin, end in zip(bounds, bounds[1:])
+            ]
+            chunks = list(await asyncio.gather(*(self.encode_opus(piece) for piece in pieces)))
+            return PreprocessedAudio(
+                audio=b"",
+                original_seconds=original_seconds,
+                output_seconds=output_seconds,
+                speech_seconds=speech_seconds,
+                chunks=chunks
+            )
+
+        return PreprocessedAudio(
+            audio=await self.encode_opus(trimmed),
+            original_seconds=original_seconds,
+            output_seconds=output_seconds,
+            speech_seconds=speech_seconds
+        )
+
+    def _speech_frames(self, pcm: bytes) -> Tuple[List[int], List[bool]]:
+        """RMS de cada frame e a máscara de voz correspondente"""
+        levels = frame_levels(pcm, self.sample_rate, self.frame_ms)
+        return levels, detect_speech(levels, self.threshold_dbfs, self.noise_margin_db)
+
+    async def decode(self, audio_bytes: bytes) -> bytes:
+        """Qualquer container/codec -> PCM s16le mono no ``sample_rate``"""
+        return await self._ffmpeg(
+            ["-i", "pipe:0", "-ac", "1", "-ar", str(self.sample_rate), "-f", "s16le", "pipe:1"],
+            audio_bytes
+        )
+
+    async def encode_opus(self, pcm: bytes) -> bytes:
+        """PCM s16le mono -> Ogg/Opus otimizado para voz"""
+        return await self._ffmpeg(
+            [
+                "-f", "s16le", "-ar", str(self.sample_rate), "-ac", "1", "-i", "pipe:0",
+                "-c:a", "libopus", "-b:a", self.opus_bitrate, "-application", "voip",
+                "-f", "ogg", "pipe:1"
+            ],
+            pcm
+        )
+
+    async def _ffmpeg(self, args: List[str], data: bytes) -> bytes:
+        process = await asyncio.create_subprocess_exec(
+            self.ffmpeg_path, "-hide_banner", "-loglevel", "error", "-nostdin", *args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await process.communicate(data)
+        if process.returncode != 0:
+            raise AudioPreprocessingError(stderr.decode(errors="replace").strip() or f"ffmpeg exited {process.returncode}")
+        return stdout
+
+
+# Instância global do serviço
+audio_preprocessor = AudioPreprocessor(
+    ffmpeg_path=settings.FFMPEG_PATH,
+    threshold_dbfs=settings.AUDIO_VAD_THRESHOLD_DBFS,
+    padding_ms=settings.AUDIO_VAD_PADDING_MS,
+    min_speech_ms=settings.AUDIO_MIN_SPEECH_MS,
+    opus_bitrate=settings.AUDIO_OPUS_BITRATE,
+    enabled=settings.AUDIO_PREPROCESSING_ENABLED
+)
@@ -5,7 +5,6 @@ from typing import Optional, Dict, Any
 import secrets
 import httpx
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 from datetime import datetime, timedelta
 from fastapi import HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -13,6 +12,7 @@ import jwt
 
 from ..config import settings
 from ..models import User, PlanType
+from ..repositories import UserRepository
 from ..database import get_db
 from .cnpj_control import cnpj_control_service
 import logging
@@ -103,10 +103,8 @@ class GoogleOAuthService:
         avatar_url = google_user_info.get("picture")
         
         # Busca usuário existente
-        result = await db.execute(
-            select(User).where(User.google_id == google_id)
-        )
-        user = result.scalar_one_or_none()
+        users = UserRepository(db)
+        user = await users.by_google_id(google_id)
         
         if user:
             # Atualiza dados existentes
@@ -116,10 +114,7 @@ class GoogleOAuthService:
             user.updated_at = datetime.utcnow()
         else:
             # Verifica se email já existe (conta duplicada)
-            result = await db.execute(
-                select(User).where(User.email == email)
-            )
-            existing_user = result.scalar_one_or_none()
+            existing_user = await users.by_email(email)
             
             if existing_user:
                 raise AuthError(
@@ -211,10 +206,7 @@ class AuthService:
             user_id = payload.get("user_id")
             
             # Busca usuário no banco
-            result = await db.execute(
-                select(User).where(User.id == user_id)
-            )
-            user = result.scalar_one_or_none()
+            user = await UserRepository(db).get(user_id)
             
             if not user or not user.is_active:
                 return None
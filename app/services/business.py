@@ -1,24 +1,52 @@
-from sqlmodel import Session, select, func
 from typing import Optional, Dict, Any, List
 from datetime import datetime, timedelta
 import logging
 from collections import Counter
 import json
 
-from ..models import User, ClientLink, ClientResponse, PlanType
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import User, ClientLink, ClientResponse, PlanType, ProcessingStage, ResponseStatus
+from ..repositories import ClientLinkRepository, ClientResponseRepository, UserRepository
 from ..config import settings
 from ..services.transcription import TranscriptionService
+from ..services.transcription_backends import transcription_backends
 from ..services.openai import OpenAIService
+from ..services.analysis_schema import apply_analysis
+from ..services.local_classifier import LocalClassification, local_classifier, needs_llm_analysis
+from ..services.jobs import URGENT_PRIORITY, escalate_current_job, job_queue, plan_weight
+from ..services.monitoring import time_to_dashboard
+from ..services.retry import backoff_delay, is_retryable
+from ..services.pipeline import pipeline_stages
+from ..database import async_session_maker
+from ..services.idempotency import DuplicateMessageError
+from ..services.audio_preprocessing import NoSpeechError
 
 logger = logging.getLogger(__name__)
 
+# Estágio que segue cada estágio concluído, e o contador de tentativas de cada um
+_NEXT_STAGE = {
+    ProcessingStage.RECEIVED: ProcessingStage.TRANSCRIBED,
+    ProcessingStage.TRANSCRIBED: ProcessingStage.ANALYZED,
+    ProcessingStage.ANALYZED: ProcessingStage.DELIVERED
+}
+_STAGE_ATTEMPTS = {
+    ProcessingStage.TRANSCRIBED: "transcribe_attempts",
+    ProcessingStage.ANALYZED: "analyze_attempts",
+    ProcessingStage.DELIVERED: "deliver_attempts"
+}
+
 class BusinessService:
     """
     Service for business logic operations
     """
     
-    def __init__(self, db: Session, openai: OpenAIService):
+    def __init__(self, db: AsyncSession, openai: OpenAIService):
         self.db = db
+        self.users = UserRepository(db)
+        self.links = ClientLinkRepository(db)
+        self.responses = ClientResponseRepository(db)
         self.transcription = TranscriptionService()
         self.openai = openai
     
@@ -36,63 +64,28 @@ class BusinessService:
             "plan": plan.value
         }
     
-    def get_user_usage(self, user_id: int) -> Dict[str, Any]:
+    async def get_user_usage(self, user_id: int) -> Dict[str, Any]:
         """
         Get current usage statistics for a user
         """
-        # Get total response count
-        total_responses = self.db.exec(
-            select(func.count(ClientResponse.id))
-            .join(ClientLink)
-            .where(ClientLink.user_id == user_id)
-        ).first()
-        
-        # Get this month's response count
         start_of_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        monthly_responses = self.db.exec(
-            select(func.count(ClientResponse.id))
-            .join(ClientLink)
-            .where(
-                ClientLink.user_id == user_id,
-                ClientResponse.created_at >= start_of_month
-            )
-        ).first()
-        
-        # Get processed response count
-        processed_responses = self.db.exec(
-            select(func.count(ClientResponse.id))
-            .join(ClientLink)
-            .where(
-                ClientLink.user_id == user_id,
-                ClientResponse.processed == True
-            )
-        ).first()
-        
-        # Get active links count
-        active_links = self.db.exec(
-            select(func.count(ClientLink.id))
-            .where(
-                ClientLink.user_id == user_id,
-                ClientLink.is_active == True
-            )
-        ).first()
+        responses = await self.responses.counts(user_id, since=start_of_month)
+        links = await self.links.counts(user_id)
         
         return {
-            "total_responses": total_responses or 0,
-            "monthly_responses": monthly_responses or 0,
-            "processed_responses": processed_responses or 0,
-            "pending_responses": (total_responses or 0) - (processed_responses or 0),
-            "active_links": active_links or 0
+            "total_responses": responses.total,
+            "monthly_responses": responses.recent,
+            "processed_responses": responses.processed,
+            "pending_responses": responses.total - responses.processed,
+            "active_links": links.active
         }
     
-    def can_process_more_audio(self, user_id: int) -> Dict[str, Any]:
+    async def can_process_more_audio(self, user_id: int) -> Dict[str, Any]:
         """
         Check if user can process more audio based on their plan limits
         """
         # Get user
-        user = self.db.exec(
-            select(User).where(User.id == user_id)
-        ).first()
+        user = await self.users.get(user_id)
         
         if not user:
             return {
@@ -118,7 +111,7 @@ class BusinessService:
         audio_limit = plan_info["audio_limit"]
         
         # Get current usage
-        usage = self.get_user_usage(user_id)
+        usage = await self.get_user_usage(user_id)
         current_usage = usage["monthly_responses"]
         
         can_process = current_usage < audio_limit
@@ -133,105 +126,260 @@ class BusinessService:
             "trial_expired": False
         }
     
-    def find_user_by_link(self, link_id: str) -> Optional[User]:
+    async def find_user_by_link(self, link_id: str) -> Optional[User]:
         """
         Find user by link ID - critical for webhook processing
         """
-        # Get link
-        link = self.db.exec(
-            select(ClientLink).where(ClientLink.link_id == link_id)
-        ).first()
-        
+        link = await self.links.by_public_id(link_id)
         if not link:
             return None
-        
-        # Get user
-        user = self.db.exec(
-            select(User).where(User.id == link.user_id)
-        ).first()
-        
-        return user
+        return await self.users.get(link.user_id)
     
-    async def find_user_by_phone(self, phone: str, db: Session) -> Optional[User]:
-        """Find a user by their phone number"""
-        stmt = select(User).where(User.phone == phone)
-        result = db.exec(stmt).first()
-        return result
+    async def find_user_by_phone(self, phone: str) -> Optional[User]:
+        """Find the tenant that owns a WhatsApp number"""
+        return await self.users.by_phone(phone)
+
+    async def create_response_entry(
+        self,
+        link_id: int,
+        client_phone: str,
+        audio_url: str,
+        whatsapp_message_id: Optional[str] = None,
+        commit: bool = True
+    ) -> Optional[ClientResponse]:
+        """
+        Create a new response entry
+
+        With ``commit=False`` the row is only flushed (it gets its id and
+        the unique checks run), leaving the commit to the caller so that
+        related writes, such as its processing job, land in the same
+        transaction.
 
-    def create_response_entry(self, link_id: int, client_phone: str, audio_url: str) -> Optional[ClientResponse]:
-        """Create a new response entry"""
+        Raises DuplicateMessageError when another response already holds
+        the same WhatsApp message id (concurrent duplicate delivery).
+        """
         try:
             response = ClientResponse(
                 link_id=link_id,
                 client_phone=client_phone,
-                audio_url=audio_url
+                audio_url=audio_url,
+                whatsapp_message_id=whatsapp_message_id
             )
-            self.db.add(response)
-            self.db.commit()
-            self.db.refresh(response)
+            if commit:
+                await self.responses.save(response, refresh=True)
+            else:
+                self.db.add(response)
+                await self.db.flush()
             return response
+        except IntegrityError as e:
+            await self.db.rollback()
+            if whatsapp_message_id and "whatsapp_message_id" in str(e.orig):
+                raise DuplicateMessageError(whatsapp_message_id) from e
+            logger.error(f"Error creating response: {e}")
+            return None
         except Exception as e:
             logger.error(f"Error creating response: {e}")
             return None
 
-    async def process_response(self, response_id: int, db: Session, audio_bytes: bytes):
-        """Process an audio response"""
+    async def process_response(self, response_id: int, db: AsyncSession, audio_bytes: bytes):
+        """
+        Process an audio response through its stages
+        (received -> transcribed -> analyzed -> delivered)
+
+        Processing resumes after the last completed stage, so a retry after
+        an analysis failure reuses the stored transcription instead of
+        paying for it again. Each stage ends in a single commit holding its
+        result and attempt counter; a failing stage records the error in
+        one commit and re-raises, leaving the retry to the job queue.
+
+        Each step holds a slot of its pipeline stage (decode and transcribe
+        inside the transcription service, analyze and persist here), so a
+        slow analysis provider only queues work at the analyze stage.
+        """
+        users = UserRepository(db)
+        links = ClientLinkRepository(db)
+        response = await ClientResponseRepository(db).get(response_id)
+        if not response:
+            logger.error(f"Response {response_id} not found")
+            return
+        if response.status in (ResponseStatus.COMPLETED.value, ResponseStatus.NO_SPEECH.value):
+            logger.info(f"Response {response_id} already processed ({response.status})")
+            return
+        
+        # Get link to get context
+        link = await links.get(response.link_id)
+        if not link:
+            logger.error(f"Link {response.link_id} not found")
+            return
+        user = await users.get(link.user_id)
+        plan = user.plan_type if user else None
+        
+        stage = ProcessingStage(response.stage)
+        local: Optional[LocalClassification] = None
         try:
-            # Get response from DB
-            response = db.get(ClientResponse, response_id)
-            if not response:
-                logger.error(f"Response {response_id} not found")
-                return
-            
-            # Get link to get context
-            link = db.get(ClientLink, response.link_id)
-            if not link:
-                logger.error(f"Link {response.link_id} not found")
-                return
-            
-            # Transcribe audio
-            try:
-                transcription = await self.transcription.transcribe_audio(audio_bytes)
-                response.transcription = transcription
-                response.status = "transcribed"
-                db.commit()
-            except Exception as e:
-                logger.error(f"Error transcribing audio: {e}")
-                response.status = "failed"
-                response.error = str(e)
-                db.commit()
-                return
-            
-            # Analyze with OpenAI
-            try:
-                analysis = await self.openai.analyze_feedback(
-                    transcription,
-                    link.context or "Feedback geral sobre o serviço/produto"
+            if stage == ProcessingStage.RECEIVED:
+                response.transcribe_attempts += 1
+                local = await self._transcribe_stage(response, link, plan, audio_bytes)
+                await self._persist(db)
+                time_to_dashboard.labels(plan=PlanType(plan).value if plan else "none").observe(
+                    (datetime.utcnow() - response.created_at).total_seconds()
                 )
-                response.analysis = analysis
-                response.status = "completed"
-                db.commit()
-            except Exception as e:
-                logger.error(f"Error analyzing transcription: {e}")
-                response.status = "failed"
-                response.error = str(e)
-                db.commit()
-                return
+                if response.status == ResponseStatus.NO_SPEECH.value:
+                    logger.info(f"Response {response_id} has no speech")
+                    return
+                stage = ProcessingStage.TRANSCRIBED
             
-            logger.info(f"Successfully processed response {response_id}")
+            if stage == ProcessingStage.TRANSCRIBED:
+                response.analyze_attempts += 1
+                await self._analyze_stage(response, link, plan, local)
+                await self._persist(db)
+                stage = ProcessingStage.ANALYZED
             
+            if stage == ProcessingStage.ANALYZED:
+                response.deliver_attempts += 1
+                self._advance(response, ProcessingStage.DELIVERED)
+                await self._persist(db)
         except Exception as e:
-            logger.error(f"Error processing response {response_id}: {e}")
-            try:
-                response = db.get(ClientResponse, response_id)
-                if response:
-                    response.status = "failed"
-                    response.error = str(e)
-                    db.commit()
-            except:
-                pass
+            await self._record_failure(db, response, stage, e)
+            if response.urgency == "ALTA":
+                # A retentativa de um feedback urgente usa a faixa prioritária
+                escalate_current_job(URGENT_PRIORITY)
+            raise
+        
+        logger.info(f"Successfully processed response {response_id}")
+    
+    async def _transcribe_stage(
+        self,
+        response: ClientResponse,
+        link: ClientLink,
+        plan: Optional[PlanType],
+        audio_bytes: bytes
+    ) -> Optional[LocalClassification]:
+        """Transcrição com o backend do tenant, seguida do caminho rápido local"""
+        backend = transcription_backends.select(tenant_id=link.user_id, plan=plan)
+        try:
+            transcription = await self.transcription.transcribe_audio(audio_bytes, backend)
+        except NoSpeechError:
+            # Áudio sem voz: nada a transcrever nem analisar
+            response.transcription = ""
+            self._advance(response, ProcessingStage.TRANSCRIBED)
+            response.status = ResponseStatus.NO_SPEECH.value
+            response.processed = True
+            return None
+        
+        response.transcription = transcription
+        # Fast path: local sentiment, rating and urgency for the dashboard
+        async with pipeline_stages.slot("analyze"):
+            local = await self._classify_locally(response, transcription, plan)
+        self._advance(response, ProcessingStage.TRANSCRIBED)
+        return local
     
-    def update_response_analysis(
+    async def _analyze_stage(
+        self,
+        response: ClientResponse,
+        link: ClientLink,
+        plan: Optional[PlanType],
+        local: Optional[LocalClassification]
+    ) -> None:
+        """
+        Análise completa: local para planos só com BASIC_AI, do LLM para os
+        demais; urgência alta (do caminho rápido) usa a faixa prioritária
+        """
+        async with pipeline_stages.slot("analyze", urgent=response.urgency == "ALTA"):
+            if local is None:
+                # Retomada: o resultado local não é guardado, só recalculado
+                local = await self._classify_locally(response, response.transcription, plan)
+            if local is not None and not needs_llm_analysis(plan):
+                analysis = local.to_analysis()
+            else:
+                analysis = self._prefer_local(
+                    await self.openai.analyze_feedback(
+                        response.transcription,
+                        tenant_id=link.user_id,
+                        plan=plan
+                    ),
+                    local
+                )
+        apply_analysis(response, analysis)
+        response.analysis = analysis
+        self._advance(response, ProcessingStage.ANALYZED)
+    
+    @staticmethod
+    def _advance(response: ClientResponse, stage: ProcessingStage) -> None:
+        """Marca ``stage`` como concluído (gravado no commit do estágio)"""
+        now = datetime.utcnow()
+        response.stage = stage.value
+        setattr(response, f"{stage.value}_at", now)
+        response.error = None
+        response.failed_stage = None
+        if stage == ProcessingStage.DELIVERED:
+            response.status = ResponseStatus.COMPLETED.value
+            response.processed = True
+        else:
+            response.status = ResponseStatus.PENDING.value
+        response.updated_at = now
+    
+    async def _record_failure(
+        self,
+        db: AsyncSession,
+        response: ClientResponse,
+        completed: ProcessingStage,
+        error: Exception
+    ) -> None:
+        """Descarta o estágio em andamento e grava a falha num único commit"""
+        failed = _NEXT_STAGE[completed]
+        logger.error(f"Response {response.id} failed at {failed.value}: {error}")
+        try:
+            await db.rollback()
+            await db.refresh(response)
+            counter = _STAGE_ATTEMPTS[failed]
+            setattr(response, counter, getattr(response, counter) + 1)
+            response.status = ResponseStatus.FAILED.value
+            response.failed_stage = failed.value
+            response.error = f"{type(error).__name__}: {error}"[:2000]
+            response.updated_at = datetime.utcnow()
+            await self._persist(db)
+        except Exception as e:
+            logger.error(f"Error recording failure of response {response.id}: {e}")
+    
+    @staticmethod
+    async def _persist(db: AsyncSession):
+        async with pipeline_stages.slot("persist"):
+            await db.commit()
+    
+    async def _classify_locally(
+        self,
+        response: ClientResponse,
+        transcription: str,
+        plan: Optional[PlanType]
+    ) -> Optional[LocalClassification]:
+        """
+        Classificação local logo após a transcrição: planos só com BASIC_AI
+        recebem a análise local completa (sem chamada à API); os demais
+        recebem sentimento, nota e urgência enquanto o LLM não responde
+        """
+        if not settings.LOCAL_CLASSIFIER_ENABLED or not transcription:
+            return None
+        try:
+            local = await local_classifier.classify(transcription)
+        except Exception as e:
+            logger.error(f"Local classification failed: {e}")
+            return None
+        
+        if needs_llm_analysis(plan):
+            local.apply_to(response)
+        else:
+            apply_analysis(response, local.to_analysis())
+        return local
+    
+    @staticmethod
+    def _prefer_local(analysis: Dict[str, Any], local: Optional[LocalClassification]) -> Dict[str, Any]:
+        """Não troca a classificação local pelo fallback neutro de uma análise que falhou"""
+        if local is not None and analysis.get("sentiment") == "unknown":
+            return local.to_analysis()
+        return analysis
+    
+    async def update_response_analysis(
         self,
         response_id: int,
         transcription: str,
@@ -241,10 +389,7 @@ class BusinessService:
         """
         Update response with analysis results
         """
-        response = self.db.exec(
-            select(ClientResponse).where(ClientResponse.id == response_id)
-        ).first()
-        
+        response = await self.responses.get(response_id)
         if not response:
             logger.error(f"Response {response_id} not found")
             return False
@@ -256,55 +401,30 @@ class BusinessService:
         response.processed = True
         response.updated_at = datetime.utcnow()
         
-        self.db.add(response)
-        self.db.commit()
+        await self.responses.save(response)
         
         logger.info(f"Updated response {response_id} with analysis")
         return True
     
-    def get_user_feedback_stats(self, user_id: int) -> Dict[str, Any]:
+    async def get_user_feedback_stats(self, user_id: int) -> Dict[str, Any]:
         """
         Get comprehensive feedback statistics for a user
         """
-        # Get usage data
-        usage = self.get_user_usage(user_id)
-        
-        # Get user info
-        user = self.db.exec(
-            select(User).where(User.id == user_id)
-        ).first()
-        
+        user = await self.users.get(user_id)
         if not user:
             return {}
         
-        # Get plan info
+        usage = await self.get_user_usage(user_id)
         plan_info = self.get_plan_limits(user.plan_type)
         
-        # Get sentiment breakdown
-        sentiment_stats = {}
-        for sentiment in ["positive", "negative", "neutral"]:
-            count = self.db.exec(
-                select(func.count(ClientResponse.id))
-                .join(ClientLink)
-                .where(
-                    ClientLink.user_id == user_id,
-                    ClientResponse.sentiment == sentiment
-                )
-            ).first()
-            sentiment_stats[sentiment] = count or 0
-        
-        # Get rating breakdown
-        rating_stats = {}
-        for rating in [1, 2, 3, 4, 5]:
-            count = self.db.exec(
-                select(func.count(ClientResponse.id))
-                .join(ClientLink)
-                .where(
-                    ClientLink.user_id == user_id,
-                    ClientResponse.rating == rating
-                )
-            ).first()
-            rating_stats[f"rating_{rating}"] = count or 0
+        # Sentiment and rating breakdowns, one grouped query each
+        sentiments = await self.responses.sentiment_counts(user_id)
+        sentiment_stats = {
+            sentiment: sentiments.get(sentiment, 0)
+            for sentiment in ["positive", "negative", "neutral"]
+        }
+        ratings = await self.responses.rating_counts(user_id)
+        rating_stats = {f"rating_{rating}": ratings.get(rating, 0) for rating in [1, 2, 3, 4, 5]}
         
         return {
             "user": {
@@ -319,16 +439,14 @@ class BusinessService:
             "limits": plan_info,
             "sentiment_breakdown": sentiment_stats,
             "rating_breakdown": rating_stats,
-            "limit_check": self.can_process_more_audio(user_id)
+            "limit_check": await self.can_process_more_audio(user_id)
         }
     
-    def is_user_active(self, user_id: int) -> bool:
+    async def is_user_active(self, user_id: int) -> bool:
         """
         Check if user is active and can receive services
         """
-        user = self.db.exec(
-            select(User).where(User.id == user_id)
-        ).first()
+        user = await self.users.get(user_id)
         
         if not user or not user.is_active:
             return False
@@ -342,59 +460,83 @@ class BusinessService:
 
     async def process_new_feedback(self, response: ClientResponse) -> None:
         """
-        Processa um novo feedback recebido
+        Processa um novo feedback recebido (já transcrito)
+        
+        Se a análise falhar, o feedback fica no estágio ``transcribed`` e o
+        reprocessamento é agendado na fila (erro transitório, com backoff)
+        ou registrado na dead-letter (erro fatal), em vez de ser descartado.
         """
+        transcription = response.transcription
+        link: Optional[ClientLink] = None
+        plan: Optional[PlanType] = None
         try:
+            link = await self.links.get(response.link_id)
+            user = await self.users.get(link.user_id) if link else None
+            plan = user.plan_type if user else None
+            self._advance(response, ProcessingStage.TRANSCRIBED)
+            
+            # Caminho rápido local: o dashboard já mostra sentimento e urgência
+            local = await self._classify_locally(response, transcription, plan)
+            if local is not None:
+                if not needs_llm_analysis(plan):
+                    self._deliver(response, local.to_analysis())
+                await self.responses.save(response, refresh=response.processed)
+                if response.processed:
+                    return
+            
             # Análise do feedback via OpenAI
-            analysis = await self.openai.analyze_feedback(response.transcription)
+            analysis = await self.openai.analyze_feedback(
+                transcription,
+                tenant_id=link.user_id if link else None,
+                plan=plan
+            )
             
             # Atualiza o registro com a análise
-            response.sentiment = analysis["sentiment"]
-            response.sentiment_score = analysis["sentiment_score"]
-            response.inferred_rating = analysis["inferred_rating"]
-            response.emotions = analysis["emotions"]
-            response.key_phrases = analysis["key_phrases"]
-            response.is_compliment = analysis["is_compliment"]
-            response.is_complaint = analysis["is_complaint"]
-            response.action_items = analysis["action_items"]
-            response.topics = analysis["topics"]
-            response.intent_primary = analysis["intent"]["primary"]
-            response.intent_secondary = analysis["intent"]["secondary"]
-            response.urgency = analysis["urgency"]
-            response.satisfaction_level = analysis["customer_satisfaction"]["level"]
-            response.satisfaction_reasons = analysis["customer_satisfaction"]["reasons"]
-            response.product_mentions = analysis["product_mentions"]
-            response.improvement_areas = analysis["improvement_areas"]
-            response.processed = True
+            analysis = self._prefer_local(analysis, local)
+            apply_analysis(response, analysis)
+            self._deliver(response, analysis)
             
-            self.db.add(response)
-            await self.db.commit()
-            await self.db.refresh(response)
+            await self.responses.save(response, refresh=True)
             
         except Exception as e:
-            response.processing_error = str(e)
-            response.processed = True
-            self.db.add(response)
-            await self.db.commit()
+            logger.error(f"Error processing feedback {response.id}: {e}")
+            await self.db.rollback()
+            await self.db.refresh(response)
+            response.transcription = transcription
+            self._advance(response, ProcessingStage.TRANSCRIBED)
+            response.analyze_attempts += 1
+            response.status = ResponseStatus.FAILED.value
+            response.failed_stage = ProcessingStage.ANALYZED.value
+            response.error = response.processing_error = f"{type(e).__name__}: {e}"[:2000]
+            await self.responses.save(response)
+            
+            # O job retoma do estágio transcribed, sem áudio
+            payload = {"response_id": response.id}
+            priority = URGENT_PRIORITY if response.urgency == "ALTA" else 0
+            tenant_id = link.user_id if link else None
+            if is_retryable(e):
+                await job_queue.enqueue(
+                    "process_audio",
+                    payload,
+                    priority=priority,
+                    delay=backoff_delay(1),
+                    tenant_id=tenant_id,
+                    weight=plan_weight(plan)
+                )
+            else:
+                await job_queue.dead_letter("process_audio", payload, e, tenant_id=tenant_id, priority=priority)
+    
+    def _deliver(self, response: ClientResponse, analysis: Dict[str, Any]) -> None:
+        response.analysis = analysis
+        self._advance(response, ProcessingStage.ANALYZED)
+        self._advance(response, ProcessingStage.DELIVERED)
             
     async def get_dashboard_data(self, user_id: int) -> Dict[str, Any]:
         """
         Retorna dados agregados para o dashboard
         """
-        # Busca todos os links do usuário
-        links = select(ClientLink.id).where(ClientLink.user_id == user_id)
-        link_ids = [link.id for link in self.db.execute(links).scalars().all()]
-        
-        if not link_ids:
-            return self._empty_dashboard_data()
-        
-        # Busca todos os feedbacks processados
-        feedbacks = select(ClientResponse).where(
-            ClientResponse.link_id.in_(link_ids),
-            ClientResponse.processed == True,
-            ClientResponse.processing_error.is_(None)
-        )
-        responses = self.db.execute(feedbacks).scalars().all()
+        # Feedbacks processados dos links do usuário, só as colunas de análise
+        responses = await self.responses.analysis_rows(user_id)
         
         if not responses:
             return self._empty_dashboard_data()
@@ -410,19 +552,19 @@ class BusinessService:
         # Extrai tópicos para nuvem de palavras
         all_topics = []
         for r in responses:
-            all_topics.extend(r.topics)
+            all_topics.extend(r.topics or [])
         topic_counts = Counter(all_topics)
         
         # Coleta todas as emoções
         all_emotions = []
         for r in responses:
-            all_emotions.extend(r.emotions)
+            all_emotions.extend(r.emotions or [])
         emotion_counts = Counter(all_emotions)
         
         # Organiza frases impactantes
         key_phrases = []
         for r in responses:
-            for phrase in r.key_phrases:
+            for phrase in r.key_phrases or []:
                 key_phrases.append({
                     "text": phrase,
                     "sentiment": r.sentiment,
@@ -433,13 +575,13 @@ class BusinessService:
         # Agrupa áreas de melhoria
         all_improvements = []
         for r in responses:
-            all_improvements.extend(r.improvement_areas)
+            all_improvements.extend(r.improvement_areas or [])
         improvement_counts = Counter(all_improvements)
         
         # Coleta produtos/serviços mencionados
         all_products = []
         for r in responses:
-            all_products.extend(r.product_mentions)
+            all_products.extend(r.product_mentions or [])
         product_counts = Counter(all_products)
         
         return {
@@ -487,7 +629,7 @@ class BusinessService:
             ],
             "action_items": list(set([
                 item for r in responses 
-                for item in r.action_items
+                for item in r.action_items or []
             ]))[:5]  # Top 5 ações sugeridas
         }
     
@@ -523,4 +665,14 @@ class BusinessService:
             "improvement_areas": [],
             "product_mentions": [],
             "action_items": []
-        } 
\ No newline at end of file
+        } 
+
+
+async def process_audio_job(payload: Dict[str, Any], audio_bytes: Optional[bytes]) -> None:
+    """Handler dos jobs ``process_audio`` enfileirados pelos webhooks"""
+    async with async_session_maker() as db:
+        service = BusinessService(db=db, openai=OpenAIService())
+        await service.process_response(payload["response_id"], db, audio_bytes or b"")
+
+job_queue.register("process_audio", process_audio_job)
+
@@ -4,9 +4,10 @@ Garante que apenas 1 empresa pode usar o free tier por CNPJ
 """
 from datetime import datetime
 from typing import Optional
-from sqlmodel import Session, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 from ..models import User, PlanType
+from ..repositories import UserRepository
 import re
 import logging
 
@@ -138,7 +139,7 @@ class CNPJControlService:
                 "api_source": "error"
             }
     
-    async def check_free_tier_eligibility(self, cnpj: str, db: Session) -> dict:
+    async def check_free_tier_eligibility(self, cnpj: str, db: AsyncSession) -> dict:
         """Verifica se o CNPJ pode usar free tier - RESTRIÇÃO VITALÍCIA"""
         
         # Normaliza CNPJ
@@ -146,10 +147,7 @@ class CNPJControlService:
         cnpj_clean = re.sub(r'[^\d]', '', cnpj_formatted)
         
         # Busca usuários com este CNPJ
-        stmt = select(User).where(
-            User.cnpj.like(f"%{cnpj_clean}%")
-        )
-        existing_users = db.exec(stmt).all()
+        existing_users = await UserRepository(db).by_cnpj(cnpj_clean)
         
         # Verifica se já tem alguém que USOU free tier (VITALÍCIO)
         free_tier_users = [
@@ -181,7 +179,7 @@ class CNPJControlService:
             "message": f"CNPJ {cnpj_formatted} elegível para plano gratuito (primeira e única vez)"
         }
     
-    async def register_free_tier_usage(self, user: User, cnpj: str, company_name: str, db: Session) -> None:
+    async def register_free_tier_usage(self, user: User, cnpj: str, company_name: str, db: AsyncSession) -> None:
         """Registra o uso do free tier para o CNPJ - MARCA VITALÍCIA"""
         
         # Valida CNPJ
@@ -204,14 +202,12 @@ class CNPJControlService:
         user.plan_type = PlanType.FREE
         user.updated_at = datetime.utcnow()
         
-        db.add(user)
-        db.commit()
-        db.refresh(user)
+        await UserRepository(db).save(user, refresh=True)
         
         logger.info(f"FREE TIER VITALÍCIO registrado para CNPJ {cnpj_formatted} - usuário {user.email}")
         logger.warning(f"CNPJ {cnpj_formatted} PERMANENTEMENTE BLOQUEADO para novos free tiers")
     
-    async def get_cnpj_info(self, cnpj: str, db: Session) -> dict:
+    async def get_cnpj_info(self, cnpj: str, db: AsyncSession) -> dict:
         """Retorna informações sobre o CNPJ"""
         
         # Normaliza CNPJ
@@ -219,10 +215,7 @@ class CNPJControlService:
         cnpj_clean = re.sub(r'[^\d]', '', cnpj_formatted)
         
         # Busca usuários com este CNPJ
-        stmt = select(User).where(
-            User.cnpj.like(f"%{cnpj_clean}%")
-        )
-        users = db.exec(stmt).all()
+        users = await UserRepository(db).by_cnpj(cnpj_clean)
         
         if not users:
             return {
@@ -258,7 +251,7 @@ class CNPJControlService:
             "company_name": users[0].company_name if users else None
         }
     
-    async def allow_additional_users(self, cnpj: str, db: Session) -> dict:
+    async def allow_additional_users(self, cnpj: str, db: AsyncSession) -> dict:
         """
         Verifica se pode adicionar mais usuários no mesmo CNPJ
         REGRA: Se CNPJ já usou free tier, só aceita novos usuários com plano PAGO
@@ -269,10 +262,7 @@ class CNPJControlService:
         cnpj_clean = re.sub(r'[^\d]', '', cnpj_formatted)
         
         # Busca usuários com este CNPJ
-        stmt = select(User).where(
-            User.cnpj.like(f"%{cnpj_clean}%")
-        )
-        users = db.exec(stmt).all()
+        users = await UserRepository(db).by_cnpj(cnpj_clean)
         
         # Se não tem usuários, pode adicionar (será o primeiro)
         if not users:
@@ -0,0 +1,159 @@
+"""
+Requisições hedged
+Se o backend primário não responde dentro do percentil aprendido da sua
+latência, dispara a mesma requisição num backend alternativo e fica com a
+primeira resposta bem-sucedida, cancelando a outra
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from .monitoring import backend_latency, hedge_requests
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class LatencyTracker:
+    """
+    Janela deslizante de latências de um backend: as chamadas bem-sucedidas
+    e, como amostra censurada, o tempo decorrido das chamadas canceladas
+    """
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class HedgeBudget:
+    """
+    Limita hedges a uma fração das requisições: cada requisição credita
+    ``ratio`` e cada hedge consome 1, com no máximo ``burst`` acumulado
+    """
+
+    def __init__(self, ratio: float, burst: float = 5.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+
+    def credit(self):
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def take(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+class Hedger:
+    """
+    Executa chamadas com hedge entre dois backends.
+
+    O atraso do hedge é o percentil ``percentile`` das latências recentes do
+    primário (``default_delay`` até haver ``min_samples``), nunca abaixo de
+    ``min_delay``. Uma falha rápida do primário também aciona o alternativo
+    imediatamente, se houver orçamento.
+    """
+
+    def __init__(
+        self,
+        percentile: float,
+        budget_ratio: float,
+        default_delay: float,
+        min_delay: float = 0.5,
+        min_samples: int = 20
+    ):
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.budget = HedgeBudget(budget_ratio)
+        self._trackers: Dict[str, LatencyTracker] = {}
+
+    def tracker(self, name: str) -> LatencyTracker:
+        tracker = self._trackers.get(name)
+        if tracker is None:
+            tracker = LatencyTracker()
+            self._trackers[name] = tracker
+        return tracker
+
+    def hedge_delay(self, name: str) -> float:
+        tracker = self.tracker(name)
+        if len(tracker) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, tracker.percentile(self.percentile))
+
+    async def _timed(self, name: str, call: Callable[[], Awaitable[T]]) -> T:
+        started = time.perf_counter()
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            # Cancelada porque a outra perna venceu: a latência real é pelo
+            # menos o tempo decorrido. Sem essa amostra o percentil só veria
+            # as chamadas rápidas e o atraso do hedge encolheria a cada hedge
+            self.tracker(name).record(time.perf_counter() - started)
+            raise
+        elapsed = time.perf_counter() - started
+        self.tracker(name).record(elapsed)
+        backend_latency.labels(backend=name).observe(elapsed)
+        return result
+
+    async def run(
+        self,
+        primary_name: str,
+        primary: Callable[[], Awaitable[T]],
+        alternate_name: Optional[str] = None,
+        alternate: Optional[Callable[[], Awaitable[T]]] = None
+    ) -> T:
+        if alternate is None or alternate_name == primary_name:
+            return await self._timed(primary_name, primary)
+
+        self.budget.credit()
+        primary_task = asyncio.create_task(self._timed(primary_name, primary))
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=self.hedge_delay(primary_name))
+            if done and not primary_task.exception():
+                return primary_task.result()
+
+            if not self.budget.take():
+                hedge_requests.labels(outcome="skipped_budget").inc()
+                return await primary_task
+
+            logger.info(
+                f"Hedging {primary_name} with {alternate_name} "
+                f"({'primary failed' if done else 'primary slow'})"
+            )
+            alternate_task = asyncio.create_task(self._timed(alternate_name, alternate))
+            return await self._race(primary_task, alternate_task)
+        finally:
+            if not primary_task.done():
+                primary_task.cancel()
+
+    async def _race(self, primary_task: asyncio.Task, alternate_task: asyncio.Task):
+        pending = {primary_task, alternate_task}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.exception():
+                        outcome = "primary_won" if task is primary_task else "hedge_won"
+                        hedge_requests.labels(outcome=outcome).inc()
+                        return task.result()
+            hedge_requests.labels(outcome="both_failed").inc()
+            # Propaga o erro do primário, que é o backend escolhido para o tenant
+            raise primary_task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,91 @@
+"""
+Idempotência da ingestão de áudios
+O WhatsApp (e o spool at-least-once) pode entregar a mesma mensagem mais de
+uma vez; a chave é o message_id, garantido único também no banco
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..models import ResponseStatus
+from ..repositories import ClientResponseRepository
+
+logger = logging.getLogger(__name__)
+
+# Status que não mudam mais: ficam no cache sem expirar
+_FINAL_STATUSES = {ResponseStatus.COMPLETED.value, ResponseStatus.NO_SPEECH.value}
+
+class DuplicateMessageError(Exception):
+    """Já existe uma resposta para o message_id informado"""
+
+    def __init__(self, message_id: str):
+        super().__init__(f"Duplicate WhatsApp message {message_id}")
+        self.message_id = message_id
+
+class IdempotencyCache:
+    """
+    LRU em memória ``message_id -> status`` da resposta criada na ingestão.
+
+    É apenas o caminho rápido: quando a chave saiu do cache (ou o processo
+    reiniciou), a consulta cai na coluna única ``whatsapp_message_id``.
+    Status finais (completed, no_speech) ficam no cache; os demais valem
+    por ``pending_ttl`` segundos e depois são relidos do banco.
+    """
+
+    def __init__(self, max_size: int, pending_ttl: float):
+        self.max_size = max_size
+        self.pending_ttl = pending_ttl
+        # message_id -> (status, expira em; None para status final)
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], Optional[float]]]" = OrderedDict()
+
+    def get(self, message_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(message_id)
+        if entry is None:
+            return None
+        status, expires_at = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self._entries[message_id]
+            return None
+        self._entries.move_to_end(message_id)
+        return status
+
+    def put(self, message_id: str, status: Dict[str, Any]):
+        final = status.get("status") in _FINAL_STATUSES
+        self._entries[message_id] = (status, None if final else time.monotonic() + self.pending_ttl)
+        self._entries.move_to_end(message_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def lookup(self, message_id: str, db: AsyncSession) -> Optional[Dict[str, Any]]:
+        """
+        Retorna o status da resposta original se a mensagem já foi
+        ingerida, senão None
+        """
+        status = self.get(message_id)
+        if status is not None:
+            return status
+
+        original = await ClientResponseRepository(db).status_by_message_id(message_id)
+        if original is None:
+            return None
+
+        status = {"status": original.status, "stage": original.stage, "response_id": original.id}
+        self.put(message_id, status)
+        return status
+
+    @staticmethod
+    def duplicate_of(message_id: str, status: Dict[str, Any]) -> Dict[str, Any]:
+        """Corpo de resposta para uma entrega repetida"""
+        logger.info(f"Duplicate delivery of WhatsApp message {message_id} ignored")
+        return {**status, "duplicate": True}
+
+
+# Instância global do serviço
+ingest_dedupe = IdempotencyCache(
+    max_size=settings.IDEMPOTENCY_CACHE_SIZE,
+    pending_ttl=settings.IDEMPOTENCY_PENDING_TTL_SECONDS
+)
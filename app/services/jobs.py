@@ -0,0 +1,621 @@
+"""
+Fila de jobs durável no Postgres
+Os processos web só enfileiram; workers retiram jobs com
+``SELECT ... FOR UPDATE SKIP LOCKED``, mantêm um lease renovado por
+heartbeat e devolvem o job à fila (com backoff) quando falham por erro
+transitório; erros fatais e tentativas esgotadas vão para a dead-letter.
+Um worker que morre perde o lease e o job volta a ser elegível após o
+visibility timeout.
+
+Entre tenants a fila é justa e ponderada (start-time fair queuing): cada
+job recebe a etiqueta virtual ``max(V, fim do último job do tenant)`` e
+avança o fim do tenant em ``1 / peso`` (peso pelo plano). Os workers
+retiram por faixa de prioridade (urgente primeiro) e depois pela menor
+etiqueta, então uma rajada de um tenant só disputa a sua parte.
+"""
+import asyncio
+import logging
+import os
+import socket
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import and_, func, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from ..config import settings
+from ..database import async_session_maker
+from ..models import DeadLetter, Job, JobStatus, PlanType, TenantQueueState, User
+from .monitoring import dead_letters, job_duration, job_queue_depth, job_retries, job_wait, jobs_processed
+from .retry import backoff_delay, is_outage, is_retryable
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Dict[str, Any], Optional[bytes]], Awaitable[None]]
+
+# Faixa de prioridade dos feedbacks de urgência alta
+URGENT_PRIORITY = 1
+
+# Job em execução na task atual (definido pelo JobWorker em volta do handler)
+_current_job: ContextVar[Optional[Job]] = ContextVar("current_job", default=None)
+
+def escalate_current_job(priority: int) -> None:
+    """
+    Eleva a faixa de prioridade do job em execução; vale para a
+    retentativa, caso o handler falhe
+    """
+    job = _current_job.get()
+    if job is not None and priority > job.priority:
+        job.priority = priority
+
+class LeaseExpiredError(Exception):
+    """O worker sumiu (crash, OOM) com o job em execução, sem reportar o desfecho"""
+
+def plan_weight(plan: Optional[PlanType]) -> float:
+    """Peso do tenant no WFQ (JOB_PLAN_WEIGHTS)"""
+    if plan is None:
+        return 1.0
+    return settings.JOB_PLAN_WEIGHTS.get(PlanType(plan).value, 1.0)
+
+def _tenant_label(tenant_id: Optional[int]) -> str:
+    return str(tenant_id) if tenant_id is not None else "none"
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class JobQueue:
+    """Operações da fila; todas abrem a própria sessão e fazem commit"""
+
+    def __init__(self, visibility_timeout: int, session_maker=async_session_maker):
+        self.visibility_timeout = visibility_timeout
+        self.session_maker = session_maker
+        self.handlers: Dict[str, JobHandler] = {}
+
+    def register(self, kind: str, handler: JobHandler):
+        """Associa o handler que executa os jobs de ``kind``"""
+        self.handlers[kind] = handler
+
+    async def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        blob: Optional[bytes] = None,
+        priority: int = 0,
+        max_attempts: Optional[int] = None,
+        delay: float = 0,
+        tenant_id: Optional[int] = None,
+        weight: float = 1.0,
+        db: Optional[AsyncSession] = None
+    ) -> int:
+        """
+        Enfileira um job e retorna seu id
+
+        Com ``db``, o job entra na transação de quem chama e só é gravado
+        no commit dela (junto com a linha que o originou); sem ``db``, usa
+        uma sessão própria e faz commit.
+        """
+        if db is not None:
+            return await self._add_job(
+                db, kind, payload, blob, priority, max_attempts, delay, tenant_id, weight
+            )
+        async with self.session_maker() as own_db:
+            job_id = await self._add_job(
+                own_db, kind, payload, blob, priority, max_attempts, delay, tenant_id, weight
+            )
+            await own_db.commit()
+            return job_id
+
+    async def enqueue_many(
+        self,
+        kind: str,
+        payloads: List[Dict[str, Any]],
+        tenant_id: Optional[int] = None,
+        weight: float = 1.0,
+        db: Optional[AsyncSession] = None
+    ) -> int:
+        """
+        Enfileira vários jobs do mesmo tenant de uma vez e retorna quantos
+
+        As etiquetas virtuais são as mesmas de ``len(payloads)`` chamadas a
+        ``enqueue`` seguidas (espaçadas de ``1/weight``), mas o estado do
+        tenant é lido e gravado uma única vez. ``db`` tem o mesmo papel que
+        em ``enqueue``.
+        """
+        if not payloads:
+            return 0
+        if db is None:
+            async with self.session_maker() as own_db:
+                count = await self.enqueue_many(kind, payloads, tenant_id, weight, own_db)
+                await own_db.commit()
+                return count
+
+        start = await self._virtual_start(db, tenant_id, weight, count=len(payloads))
+        step = 0.0 if tenant_id is None else 1.0 / max(weight, 0.01)
+        now = datetime.utcnow()
+        db.add_all([
+            Job(
+                kind=kind,
+                payload=payload,
+                tenant_id=tenant_id,
+                virtual_time=start + index * step,
+                max_attempts=settings.JOB_MAX_ATTEMPTS,
+                run_at=now
+            )
+            for index, payload in enumerate(payloads)
+        ])
+        await db.flush()
+        logger.info(f"Enqueued {len(payloads)} {kind} jobs (tenant {tenant_id}, vt {start:.2f})")
+        return len(payloads)
+
+    async def _add_job(
+        self,
+        db: AsyncSession,
+        kind: str,
+        payload: Dict[str, Any],
+        blob: Optional[bytes],
+        priority: int,
+        max_attempts: Optional[int],
+        delay: float,
+        tenant_id: Optional[int],
+        weight: float
+    ) -> int:
+        virtual_time = await self._virtual_start(db, tenant_id, weight)
+        job = Job(
+            kind=kind,
+            payload=payload,
+            blob=blob,
+            priority=priority,
+            tenant_id=tenant_id,
+            virtual_time=virtual_time,
+            max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+            run_at=datetime.utcnow() + timedelta(seconds=delay)
+        )
+        db.add(job)
+        await db.flush()
+        logger.info(f"Enqueued {kind} job {job.id} (tenant {tenant_id}, priority {priority}, vt {virtual_time:.2f})")
+        return job.id
+
+    async def _virtual_start(self, db, tenant_id: Optional[int], weight: float, count: int = 1) -> float:
+        """
+        Etiqueta de início do próximo job do tenant (na transação do
+        enqueue), reservando ``count`` jobs seguidos. V é a menor etiqueta
+        ainda elegível na fila; com a fila vazia, o maior fim já atribuído,
+        para que um tenant ocioso não acumule crédito nem fique atrás dos
+        demais. Jobs sem tenant entram em V, sem furar a fila nem avançar o
+        fim de ninguém
+        """
+        now = datetime.utcnow()
+        if tenant_id is None:
+            return await self._system_time(db, now)
+        await db.execute(
+            insert(TenantQueueState)
+            .values(tenant_id=tenant_id, last_finish=0.0, updated_at=now)
+            .on_conflict_do_nothing(index_elements=["tenant_id"])
+        )
+        state = (await db.execute(
+            select(TenantQueueState).where(TenantQueueState.tenant_id == tenant_id).with_for_update()
+        )).scalar_one()
+
+        start = max(await self._system_time(db, now), state.last_finish)
+        state.last_finish = start + count / max(weight, 0.01)
+        state.updated_at = now
+        return start
+
+    @staticmethod
+    async def _system_time(db, now: datetime) -> float:
+        """V: menor etiqueta elegível na fila, ou o maior fim atribuído com a fila vazia"""
+        system_time = (await db.execute(
+            select(func.min(Job.virtual_time)).where(Job.status == JobStatus.QUEUED.value, Job.run_at <= now)
+        )).scalar()
+        if system_time is None:
+            system_time = (await db.execute(select(func.max(TenantQueueState.last_finish)))).scalar() or 0.0
+        return system_time
+
+    async def claim(self, owner: str, kinds: List[str], limit: int = 1) -> List[Job]:
+        """
+        Reserva até ``limit`` jobs elegíveis (na fila e vencidos, ou em
+        execução com lease expirado), por prioridade e depois etiqueta
+        virtual do WFQ. Um job de lease expirado que já gastou todas as
+        tentativas derrubou o worker em cada uma delas (nunca chegou ao
+        ``fail``): vai para a dead-letter em vez de rodar de novo.
+        """
+        now = datetime.utcnow()
+        async with self.session_maker() as db:
+            result = await db.execute(
+                select(Job)
+                .where(
+                    Job.kind.in_(kinds),
+                    or_(
+                        and_(Job.status == JobStatus.QUEUED.value, Job.run_at <= now),
+                        and_(Job.status == JobStatus.RUNNING.value, Job.lease_expires_at < now)
+                    )
+                )
+                .order_by(Job.priority.desc(), Job.virtual_time, Job.run_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            jobs: List[Job] = []
+            exhausted: List[Job] = []
+            for job in result.scalars().all():
+                if job.status == JobStatus.RUNNING.value:
+                    if job.attempts >= job.max_attempts:
+                        error = LeaseExpiredError(f"lease held by {job.locked_by} expired on attempt {job.attempts}")
+                        job.status = JobStatus.FAILED.value
+                        job.last_error = f"{type(error).__name__}: {error}"
+                        job.locked_by = None
+                        job.lease_expires_at = None
+                        job.finished_at = now
+                        job.updated_at = now
+                        db.add(self._dead_letter(job.kind, job.payload, error, "exhausted", job.id, job.attempts))
+                        exhausted.append(job)
+                        continue
+                    logger.warning(f"Job {job.id} lease held by {job.locked_by} expired, reclaiming")
+                else:
+                    job_wait.labels(tenant=_tenant_label(job.tenant_id)).observe(
+                        max(0.0, (now - job.run_at).total_seconds())
+                    )
+                job.status = JobStatus.RUNNING.value
+                job.locked_by = owner
+                job.lease_expires_at = now + timedelta(seconds=self.visibility_timeout)
+                job.attempts += 1
+                job.updated_at = now
+                jobs.append(job)
+            await db.commit()
+
+        for job in exhausted:
+            dead_letters.labels(kind=job.kind, reason="exhausted").inc()
+            logger.error(f"Job {job.id} ({job.kind}) dead-lettered: worker lost on all {job.attempts} attempts")
+        return jobs
+
+    async def extend_lease(self, job_id: int, owner: str) -> bool:
+        """Renova o lease; False se outro worker já o tomou"""
+        now = datetime.utcnow()
+        async with self.session_maker() as db:
+            result = await db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.locked_by == owner, Job.status == JobStatus.RUNNING.value)
+                .values(lease_expires_at=now + timedelta(seconds=self.visibility_timeout), updated_at=now)
+            )
+            await db.commit()
+            return result.rowcount > 0
+
+    async def complete(self, job_id: int, owner: str):
+        now = datetime.utcnow()
+        async with self.session_maker() as db:
+            await db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.locked_by == owner)
+                .values(
+                    status=JobStatus.DONE.value,
+                    blob=None,
+                    lease_expires_at=None,
+                    finished_at=now,
+                    updated_at=now
+                )
+            )
+            await db.commit()
+
+    async def fail(self, job: Job, owner: str, error: BaseException):
+        """
+        Erro transitório: devolve o job à fila com backoff exponencial e
+        jitter. Erro fatal ou tentativas esgotadas: encerra o job como falho
+        e registra a dead-letter. Quedas do provedor não esgotam as
+        tentativas até JOB_OUTAGE_RETRY_SECONDS após o enfileiramento, para
+        que a fila se recupere sozinha quando ele voltar.
+        """
+        now = datetime.utcnow()
+        message = f"{type(error).__name__}: {error}"[:2000]
+        retryable = is_retryable(error)
+        outage = is_outage(error) and now - job.created_at < timedelta(seconds=settings.JOB_OUTAGE_RETRY_SECONDS)
+        retry = retryable and (job.attempts < job.max_attempts or outage)
+
+        if retry:
+            delay = backoff_delay(job.attempts)
+            values = dict(
+                status=JobStatus.QUEUED.value,
+                run_at=now + timedelta(seconds=delay),
+                priority=job.priority  # eventualmente elevada pelo handler
+            )
+        else:
+            values = dict(status=JobStatus.FAILED.value, finished_at=now)
+
+        async with self.session_maker() as db:
+            result = await db.execute(
+                update(Job)
+                .where(Job.id == job.id, Job.locked_by == owner)
+                .values(last_error=message, lease_expires_at=None, updated_at=now, **values)
+            )
+            if result.rowcount == 0:
+                # Outro worker retomou o job; o desfecho é dele
+                await db.rollback()
+                return
+            if not retry:
+                reason = "exhausted" if retryable else "fatal"
+                db.add(self._dead_letter(job.kind, job.payload, error, reason, job.id, job.attempts))
+            await db.commit()
+
+        if retry:
+            job_retries.labels(kind=job.kind, cause="outage" if is_outage(error) else "error").inc()
+            logger.warning(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed, retrying in {delay:.0f}s: {message}")
+        else:
+            dead_letters.labels(kind=job.kind, reason=reason).inc()
+            logger.error(f"Job {job.id} ({job.kind}) dead-lettered ({reason}) after {job.attempts} attempts: {message}")
+
+    @staticmethod
+    def _dead_letter(
+        kind: str,
+        payload: Dict[str, Any],
+        error: BaseException,
+        reason: str,
+        job_id: Optional[int] = None,
+        attempts: int = 0
+    ) -> DeadLetter:
+        return DeadLetter(
+            job_id=job_id,
+            kind=kind,
+            payload=payload,
+            reason=reason,
+            error_type=type(error).__name__,
+            last_error=f"{type(error).__name__}: {error}"[:2000],
+            attempts=attempts
+        )
+
+    async def dead_letter(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        error: BaseException,
+        attempts: int = 1,
+        tenant_id: Optional[int] = None,
+        priority: int = 0
+    ):
+        """
+        Registra direto na dead-letter um trabalho que falhou fora da fila.
+        Tenant e prioridade vão no payload (chaves ``_tenant_id`` e
+        ``_priority``) para o requeue montar o job com a etiqueta do WFQ
+        """
+        payload = {**payload, "_tenant_id": tenant_id, "_priority": priority}
+        async with self.session_maker() as db:
+            db.add(self._dead_letter(kind, payload, error, "fatal", attempts=attempts))
+            await db.commit()
+        dead_letters.labels(kind=kind, reason="fatal").inc()
+        logger.error(f"Dead-lettered {kind} {payload}: {type(error).__name__}: {error}")
+
+    async def list_dead_letters(
+        self,
+        kind: Optional[str] = None,
+        reason: Optional[str] = None,
+        include_requeued: bool = False,
+        limit: int = 100
+    ) -> List[DeadLetter]:
+        async with self.session_maker() as db:
+            query = select(DeadLetter)
+            if kind:
+                query = query.where(DeadLetter.kind == kind)
+            if reason:
+                query = query.where(DeadLetter.reason == reason)
+            if not include_requeued:
+                query = query.where(DeadLetter.requeued_at.is_(None))
+            result = await db.execute(query.order_by(DeadLetter.created_at.desc()).limit(limit))
+            return list(result.scalars().all())
+
+    async def requeue(self, dead_letter_ids: List[int]) -> Dict[int, int]:
+        """
+        Devolve à fila os jobs das dead-letters ainda não reenfileiradas,
+        com as tentativas zeradas (o payload e o blob do job são reaproveitados;
+        dead-letters sem job viram um job novo). A etiqueta virtual é
+        recalculada, pelo peso atual do plano do tenant, para o job voltar
+        ao fim da parte do tenant em vez de furar a fila. Retorna
+        dead-letter -> job.
+        """
+        now = datetime.utcnow()
+        requeued: Dict[int, int] = {}
+        async with self.session_maker() as db:
+            result = await db.execute(
+                select(DeadLetter)
+                .where(DeadLetter.id.in_(dead_letter_ids), DeadLetter.requeued_at.is_(None))
+                .with_for_update(skip_locked=True)
+            )
+            for letter in result.scalars().all():
+                job = await db.get(Job, letter.job_id) if letter.job_id else None
+                if job is None:
+                    payload = dict(letter.payload)
+                    tenant_id = payload.pop("_tenant_id", None)
+                    job = Job(
+                        kind=letter.kind,
+                        payload=payload,
+                        priority=payload.pop("_priority", 0),
+                        tenant_id=tenant_id,
+                        virtual_time=await self._requeue_start(db, tenant_id),
+                        max_attempts=settings.JOB_MAX_ATTEMPTS
+                    )
+                    db.add(job)
+                    await db.flush()
+                else:
+                    job.virtual_time = await self._requeue_start(db, job.tenant_id)
+                    job.status = JobStatus.QUEUED.value
+                    job.attempts = 0
+                    job.run_at = now
+                    job.locked_by = None
+                    job.lease_expires_at = None
+                    job.finished_at = None
+                    job.updated_at = now
+                letter.requeued_at = now
+                letter.job_id = job.id
+                requeued[letter.id] = job.id
+            await db.commit()
+        if requeued:
+            logger.info(f"Requeued {len(requeued)} dead-lettered jobs")
+        return requeued
+
+    async def _requeue_start(self, db, tenant_id: Optional[int]) -> float:
+        plan = None
+        if tenant_id is not None:
+            plan = (await db.execute(select(User.plan_type).where(User.id == tenant_id))).scalar()
+        return await self._virtual_start(db, tenant_id, plan_weight(plan))
+
+    async def depth_by_tenant(self) -> Dict[Optional[int], int]:
+        """Jobs elegíveis na fila, por tenant"""
+        async with self.session_maker() as db:
+            result = await db.execute(
+                select(Job.tenant_id, func.count())
+                .where(Job.status == JobStatus.QUEUED.value, Job.run_at <= datetime.utcnow())
+                .group_by(Job.tenant_id)
+            )
+            return {tenant_id: count for tenant_id, count in result.all()}
+
+    async def release(self, job_id: int, owner: str):
+        """Devolve à fila, sem contar a tentativa, um job interrompido pelo shutdown"""
+        now = datetime.utcnow()
+        async with self.session_maker() as db:
+            await db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.locked_by == owner, Job.status == JobStatus.RUNNING.value)
+                .values(
+                    status=JobStatus.QUEUED.value,
+                    attempts=Job.attempts - 1,
+                    run_at=now,
+                    lease_expires_at=None,
+                    updated_at=now
+                )
+            )
+            await db.commit()
+
+class JobWorker:
+    """
+    Loop de consumo: mantém até ``concurrency`` jobs de ``kinds`` em
+    execução, renovando o lease de cada um a cada terço do visibility
+    timeout. ``admit``, se informado, limita ainda mais quantos jobs novos
+    podem ser retirados a cada volta (contrapressão do pipeline). A
+    profundidade da fila por tenant é amostrada a cada JOB_METRICS_INTERVAL.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        kinds: Optional[List[str]] = None,
+        concurrency: int = 4,
+        poll_interval: float = 1.0,
+        owner: Optional[str] = None,
+        admit: Optional[Callable[[], int]] = None
+    ):
+        self.queue = queue
+        self.kinds = kinds
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.owner = owner or worker_id()
+        self.admit = admit
+        self._task: Optional[asyncio.Task] = None
+        self._metrics_task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self._reported_tenants: Set[str] = set()
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def start(self):
+        """Inicia o worker no event loop atual"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            self._metrics_task = asyncio.create_task(self._report_depth())
+            logger.info(f"Started job worker {self.owner} (concurrency {self.concurrency})")
+
+    async def stop(self):
+        """Para de retirar jobs; os em execução são cancelados e devolvidos à fila"""
+        if self._metrics_task:
+            self._metrics_task.cancel()
+            self._metrics_task = None
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            free = self.concurrency - len(self._running)
+            if self.admit is not None:
+                free = min(free, self.admit())
+            claimed: List[Job] = []
+            if free > 0:
+                try:
+                    claimed = await self.queue.claim(
+                        self.owner, self.kinds or list(self.queue.handlers), free
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error claiming jobs: {e}")
+
+            for job in claimed:
+                task = asyncio.create_task(self._execute(job))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+            if not claimed:
+                await asyncio.sleep(self.poll_interval)
+
+    async def _report_depth(self):
+        while True:
+            try:
+                depth = {_tenant_label(tenant): count for tenant, count in (await self.queue.depth_by_tenant()).items()}
+                # Tenants que esvaziaram a fila voltam a zero
+                for tenant in self._reported_tenants - depth.keys():
+                    job_queue_depth.labels(tenant=tenant).set(0)
+                for tenant, count in depth.items():
+                    job_queue_depth.labels(tenant=tenant).set(count)
+                self._reported_tenants = set(depth)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error sampling queue depth: {e}")
+            await asyncio.sleep(settings.JOB_METRICS_INTERVAL)
+
+    async def _heartbeat(self, job_id: int):
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 3)
+            if not await self.queue.extend_lease(job_id, self.owner):
+                logger.warning(f"Lost lease on job {job_id}")
+                return
+
+    async def _execute(self, job: Job):
+        handler = self.queue.handlers.get(job.kind)
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        started = asyncio.get_running_loop().time()
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler registered for job kind {job.kind}")
+            _current_job.set(job)
+            await handler(job.payload, job.blob)
+        except asyncio.CancelledError:
+            await self._settle(self.queue.release(job.id, self.owner), job)
+            raise
+        except Exception as e:
+            jobs_processed.labels(kind=job.kind, outcome="failed").inc()
+            await self._settle(self.queue.fail(job, self.owner, e), job)
+        else:
+            jobs_processed.labels(kind=job.kind, outcome="done").inc()
+            await self._settle(self.queue.complete(job.id, self.owner), job)
+        finally:
+            heartbeat.cancel()
+            job_duration.labels(kind=job.kind).observe(asyncio.get_running_loop().time() - started)
+
+    async def _settle(self, update_job: Awaitable[None], job: Job):
+        # Sem conseguir gravar o desfecho, o job volta pela expiração do lease
+        try:
+            await update_job
+        except Exception as e:
+            logger.error(f"Error recording outcome of job {job.id}: {e}")
+
+
+# Instância global do serviço
+job_queue = JobQueue(visibility_timeout=settings.JOB_VISIBILITY_TIMEOUT)
@@ -0,0 +1,258 @@
+"""
+Classificador local de sentimento e urgência (pt-BR)
+Preenche sentimento, nota inferida e urgência em milissegundos, logo após
+a transcrição, sem chamada à API. Usa um modelo ONNX quantizado quando
+configurado e um léxico compilado como fallback.
+"""
+import asyncio
+import logging
+import math
+import os
+import re
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from ..config import settings
+from ..models import PLAN_LIMITS, FeatureType, PlanType
+from .analysis_schema import complete_analysis
+from .monitoring import local_classifier_duration
+
+logger = logging.getLogger(__name__)
+
+def _fold(text: str) -> str:
+    """Minúsculas e sem acentos, para casar o léxico com qualquer grafia"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+# Pesos de polaridade (-3 a 3); chaves já sem acento
+_POLARITY: Dict[str, float] = {
+    # positivos
+    "adorei": 3, "amei": 3, "excelente": 3, "perfeito": 3, "maravilhoso": 3, "sensacional": 3,
+    "otimo": 2.5, "incrivel": 2.5, "fantastico": 2.5, "recomendo": 2, "parabens": 2,
+    "bom": 1.5, "boa": 1.5, "gostei": 2, "satisfeito": 2, "satisfeita": 2, "rapido": 1,
+    "rapida": 1, "atencioso": 1.5, "atenciosa": 1.5, "educado": 1, "educada": 1,
+    "obrigado": 1, "obrigada": 1, "agradeco": 1.5, "legal": 1, "show": 1.5, "top": 1.5,
+    "eficiente": 1.5, "resolveu": 1.5, "resolvido": 1.5, "feliz": 2, "confiavel": 1.5,
+    # negativos
+    "pessimo": -3, "pessima": -3, "horrivel": -3, "terrivel": -3, "odiei": -3, "absurdo": -2.5,
+    "lixo": -3, "vergonha": -2.5, "ruim": -2, "decepcionado": -2, "decepcionada": -2,
+    "decepcao": -2, "insatisfeito": -2, "insatisfeita": -2, "demora": -1.5, "demorou": -1.5,
+    "demorado": -1.5, "atraso": -1.5, "atrasou": -1.5, "atrasado": -1.5, "problema": -1,
+    "problemas": -1, "defeito": -1.5, "quebrado": -1.5, "quebrou": -1.5, "erro": -1,
+    "errado": -1.5, "caro": -1, "grosso": -2, "grossa": -2, "mal": -1.5, "descaso": -2.5,
+    "reclamacao": -1.5, "reclamar": -1, "frustrado": -2, "frustrada": -2,
+    "cancelar": -1.5, "golpe": -3, "enganado": -2.5, "enganada": -2.5,
+}
+
+_NEGATIONS = {"nao", "nem", "nunca", "jamais", "sem"}
+_INTENSIFIERS = {"muito": 1.5, "super": 1.5, "demais": 1.5, "extremamente": 2.0, "bem": 1.2, "totalmente": 1.5}
+# Palavras afetadas por uma negação
+_NEGATION_SCOPE = 3
+
+_HIGH_URGENCY = re.compile(
+    r"\b(urgente|urgencia|imediat\w*|agora mesmo|cancel\w*|procon|reembolso|estorno|"
+    r"processar|advogado|justica|golpe|fraude|nunca mais|vou denunciar|perigo\w*|"
+    r"intoxica\w*|machuc\w*)\b"
+)
+_MEDIUM_URGENCY = re.compile(
+    r"\b(demor\w*|atras\w*|(?<!sem )problema\w*|defeito\w*|erro\w*|quebr\w*|reclama\w*|"
+    r"nao funciona\w*|ninguem (me )?respond\w*|sem resposta|troca\w*)\b"
+)
+_TOKEN_RE = re.compile(r"[a-z]+")
+
+@dataclass
+class LocalClassification:
+    sentiment: str  # POSITIVO, NEGATIVO, NEUTRO
+    sentiment_score: float
+    inferred_rating: int
+    urgency: str  # ALTA, MÉDIA, BAIXA
+    source: str  # onnx, lexicon
+
+    def apply_to(self, response) -> None:
+        """Preenche só os campos do caminho rápido num ``ClientResponse``"""
+        response.sentiment = self.sentiment
+        response.sentiment_score = self.sentiment_score
+        response.inferred_rating = self.inferred_rating
+        response.urgency = self.urgency
+
+    def to_analysis(self) -> Dict[str, Any]:
+        """Análise completa (campos não classificados ficam neutros)"""
+        satisfaction = {"POSITIVO": "SATISFEITO", "NEGATIVO": "INSATISFEITO"}.get(self.sentiment, "NEUTRO")
+        return complete_analysis({
+            "sentiment": self.sentiment,
+            "sentiment_score": self.sentiment_score,
+            "inferred_rating": self.inferred_rating,
+            "is_compliment": self.sentiment == "POSITIVO",
+            "is_complaint": self.sentiment == "NEGATIVO",
+            "urgency": self.urgency,
+            "customer_satisfaction": {"level": satisfaction, "reasons": []}
+        }).model_dump()
+
+def _label(score: float, threshold: float = 0.2) -> str:
+    if score >= threshold:
+        return "POSITIVO"
+    if score <= -threshold:
+        return "NEGATIVO"
+    return "NEUTRO"
+
+def _rating(score: float) -> int:
+    return max(1, min(5, round(3 + 2 * score)))
+
+def _urgency(folded: str, score: float) -> str:
+    if _HIGH_URGENCY.search(folded):
+        return "ALTA"
+    if _MEDIUM_URGENCY.search(folded) or score <= -0.5:
+        return "MÉDIA"
+    return "BAIXA"
+
+def lexicon_score(folded: str) -> float:
+    """Polaridade em [-1, 1] com negação e intensificadores"""
+    total = 0.0
+    negate_left = 0
+    boost = 1.0
+    # Contribuição da palavra anterior, para intensificador posposto ("bom demais")
+    last = 0.0
+    for token in _TOKEN_RE.findall(folded):
+        if token in _NEGATIONS:
+            negate_left = _NEGATION_SCOPE
+            last = 0.0
+            continue
+        if token in _INTENSIFIERS:
+            if last:
+                total += last * (_INTENSIFIERS[token] - 1)
+                last = 0.0
+            else:
+                boost = _INTENSIFIERS[token]
+            continue
+
+        weight = _POLARITY.get(token)
+        if weight is not None:
+            last = -weight if negate_left else weight * boost
+            total += last
+            boost = 1.0
+            negate_left = 0
+        else:
+            last = 0.0
+            if negate_left:
+                negate_left -= 1
+    # Saturação suave: poucas palavras fortes já aproximam de ±1
+    return total / (abs(total) + 2.0)
+
+class LocalClassifier:
+    """
+    Classifica lotes de transcrições em CPU.
+
+    O modelo ONNX (``model.onnx`` + ``tokenizer.json`` em
+    LOCAL_CLASSIFIER_MODEL_PATH, saída ``logits`` nas classes de
+    LOCAL_CLASSIFIER_LABELS) depende de ``onnxruntime`` e ``tokenizers``,
+    opcionais; sem eles ou sem modelo, usa o léxico. A urgência sempre vem
+    das regras léxicas.
+    """
+
+    def __init__(self, model_path: str, labels: List[str], threads: int, max_length: int = 256):
+        self.model_path = model_path
+        self.labels = labels
+        self.threads = threads
+        self.max_length = max_length
+        self._session = None
+        self._tokenizer = None
+        self._onnx_failed = False
+
+    def _load_onnx(self) -> bool:
+        if self._session is not None:
+            return True
+        if self._onnx_failed or not self.model_path:
+            return False
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = self.threads
+            self._session = onnxruntime.InferenceSession(
+                os.path.join(self.model_path, "model.onnx"), options, providers=["CPUExecutionProvider"]
+            )
+            self._tokenizer = Tokenizer.from_file(os.path.join(self.model_path, "tokenizer.json"))
+            self._tokenizer.enable_truncation(self.max_length)
+            self._tokenizer.enable_padding()
+            logger.info(f"Local classifier loaded ONNX model from {self.model_path}")
+            return True
+        except Exception as e:
+            logger.warning(f"Local classifier ONNX model unavailable, using lexicon: {e}")
+            self._onnx_failed = True
+            return False
+
+    def _onnx_scores(self, texts: List[str]) -> List[float]:
+        import numpy as np
+
+        encodings = self._tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        }
+        input_names = {i.name for i in self._session.get_inputs()}
+        logits = self._session.run(["logits"], {k: v for k, v in feeds.items() if k in input_names})[0]
+
+        positive = self.labels.index("POSITIVO")
+        negative = self.labels.index("NEGATIVO")
+        scores = []
+        for row in logits:
+            peak = max(row)
+            exps = [math.exp(value - peak) for value in row]
+            total = sum(exps)
+            scores.append((exps[positive] - exps[negative]) / total)
+        return scores
+
+    def classify_batch(self, texts: List[str]) -> List[LocalClassification]:
+        started = time.perf_counter()
+        folded = [_fold(text) for text in texts]
+
+        source = "lexicon"
+        scores: Optional[List[float]] = None
+        if texts and self._load_onnx():
+            try:
+                scores = self._onnx_scores(texts)
+                source = "onnx"
+            except Exception as e:
+                logger.error(f"Local classifier ONNX inference failed, using lexicon: {e}")
+        if scores is None:
+            scores = [lexicon_score(text) for text in folded]
+
+        results = [
+            LocalClassification(
+                sentiment=_label(score),
+                sentiment_score=round(score, 3),
+                inferred_rating=_rating(score),
+                urgency=_urgency(text, score),
+                source=source
+            )
+            for text, score in zip(folded, scores)
+        ]
+        local_classifier_duration.labels(source=source).observe(time.perf_counter() - started)
+        return results
+
+    async def classify(self, text: str) -> LocalClassification:
+        """Classifica uma transcrição; a inferência ONNX roda fora do event loop"""
+        if self._session is None and (self._onnx_failed or not self.model_path):
+            return self.classify_batch([text])[0]
+        return (await asyncio.to_thread(self.classify_batch, [text]))[0]
+
+def needs_llm_analysis(plan: Optional[PlanType]) -> bool:
+    """
+    Planos só com BASIC_AI ficam com a análise local; ADVANCED_AI e
+    CUSTOM_AI recebem a análise completa do LLM depois do caminho rápido
+    """
+    if plan is None:
+        return True
+    features = PLAN_LIMITS[PlanType(plan)]["features"]
+    return FeatureType.ADVANCED_AI in features or FeatureType.CUSTOM_AI in features
+
+
+# Instância global do serviço
+local_classifier = LocalClassifier(
+    model_path=settings.LOCAL_CLASSIFIER_MODEL_PATH,
+    labels=settings.LOCAL_CLASSIFIER_LABELS,
+    threads=settings.LOCAL_CLASSIFIER_THREADS
+)
@@ -0,0 +1,179 @@
+"""
+Backend local de análise (llama.cpp)
+Modelo pequeno instruction-tuned em CPU, com saída JSON restrita por
+gramática ao schema da análise. Atende tenants com exigência de residência
+de dados e serve de fallback quando o provedor está indisponível.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Union
+
+from ..config import settings
+from ..models import PlanType
+from .analysis_schema import analysis_json_schema, complete_analysis, decode_analysis
+from .batching import MicroBatcher
+from .monitoring import local_llm_duration
+
+logger = logging.getLogger(__name__)
+
+Messages = List[Dict[str, str]]
+
+class LocalLLMError(Exception):
+    """Backend local desabilitado, sem modelo ou sem ``llama-cpp-python``"""
+
+class LocalLLMAnalyzer:
+    """
+    Pool de ``workers`` instâncias do modelo, cada uma com ``threads``
+    threads de CPU. Com ``workers=0`` o pool é dimensionado pelos núcleos
+    (núcleos / threads); com ``threads=0``, cada instância fica com
+    núcleos / workers.
+
+    Dependência opcional: sem ``llama-cpp-python`` instalado ou sem
+    LOCAL_LLM_MODEL_PATH o backend fica indisponível. Os modelos são
+    carregados na primeira chamada. Pedidos concorrentes passam por um
+    micro-batcher e são distribuídos entre as instâncias do pool.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        workers: int,
+        threads: int,
+        context_size: int,
+        max_tokens: int,
+        tenants: List[int],
+        plans: List[str],
+        enabled: bool = True
+    ):
+        self.model_path = model_path
+        cores = os.cpu_count() or 1
+        self.workers = workers or max(1, cores // (threads or 4))
+        self.threads = threads or max(1, cores // self.workers)
+        self.context_size = context_size
+        self.max_tokens = max_tokens
+        self.tenants = set(tenants)
+        self.plans = set(plans)
+        self.enabled = enabled
+        self._pool: Optional[asyncio.Queue] = None
+        self._grammar = None
+        self._load_lock = asyncio.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._batcher = MicroBatcher(
+            handler=self._run_batch,
+            max_batch=self.workers * 2,
+            max_wait=0.05,
+            name="local_llm"
+        )
+
+    @property
+    def cache_model(self) -> str:
+        return f"local:{os.path.basename(self.model_path)}"
+
+    @property
+    def available(self) -> bool:
+        if not self.enabled or not self.model_path:
+            return False
+        try:
+            import llama_cpp  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def serves(self, tenant_id: Optional[int], plan: Optional[PlanType]) -> bool:
+        """Tenants (ou planos) cuja análise nunca sai da nossa infraestrutura"""
+        if not self.enabled:
+            return False
+        if tenant_id is not None and tenant_id in self.tenants:
+            return True
+        return plan is not None and PlanType(plan).value in self.plans
+
+    async def _load(self) -> asyncio.Queue:
+        async with self._load_lock:
+            if self._pool is None:
+                if not self.available:
+                    raise LocalLLMError("Local LLM backend is disabled or llama-cpp-python is not installed")
+                from llama_cpp import Llama, LlamaGrammar
+
+                logger.info(
+                    f"Loading local LLM {self.model_path} "
+                    f"({self.workers} workers x {self.threads} threads)"
+                )
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="local-llm")
+                loop = asyncio.get_running_loop()
+                self._grammar = LlamaGrammar.from_json_schema(json.dumps(analysis_json_schema()))
+                pool: asyncio.Queue = asyncio.Queue()
+                for _ in range(self.workers):
+                    model = await loop.run_in_executor(
+                        self._executor,
+                        lambda: Llama(
+                            model_path=self.model_path,
+                            n_ctx=self.context_size,
+                            n_threads=self.threads,
+                            verbose=False
+                        )
+                    )
+                    pool.put_nowait(model)
+                self._pool = pool
+        return self._pool
+
+    def _generate(self, model, messages: Messages) -> str:
+        response = model.create_chat_completion(
+            messages=messages,
+            grammar=self._grammar,
+            temperature=0,
+            max_tokens=self.max_tokens
+        )
+        return response["choices"][0]["message"]["content"] or ""
+
+    async def _analyze_one(self, messages: Messages) -> Union[Dict[str, Any], Exception]:
+        try:
+            pool = self._pool or await self._load()
+            model = await pool.get()
+            started = time.perf_counter()
+            try:
+                content = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._generate, model, messages
+                )
+            finally:
+                pool.put_nowait(model)
+            local_llm_duration.observe(time.perf_counter() - started)
+
+            # A gramática garante a estrutura; só um corte em max_tokens exige reparo
+            analysis, valid = decode_analysis(content)
+            if analysis is None:
+                if not valid:
+                    raise ValueError(f"Unusable local analysis: {content[:200]!r}")
+                analysis = complete_analysis(valid)
+            return analysis.model_dump()
+        except Exception as e:
+            return e
+
+    async def _run_batch(self, batch: List[Messages]) -> List[Union[Dict[str, Any], Exception]]:
+        return list(await asyncio.gather(*(self._analyze_one(messages) for messages in batch)))
+
+    async def analyze(self, messages: Messages) -> Dict[str, Any]:
+        """Análise completa; levanta se o backend não estiver disponível"""
+        return await self._batcher.submit(messages)
+
+    async def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._pool = None
+
+
+# Instância global do serviço
+local_llm = LocalLLMAnalyzer(
+    model_path=settings.LOCAL_LLM_MODEL_PATH,
+    workers=settings.LOCAL_LLM_WORKERS,
+    threads=settings.LOCAL_LLM_THREADS,
+    context_size=settings.LOCAL_LLM_CONTEXT_SIZE,
+    max_tokens=settings.LOCAL_LLM_MAX_TOKENS,
+    tenants=settings.LOCAL_LLM_TENANTS,
+    plans=settings.LOCAL_LLM_PLANS,
+    enabled=settings.LOCAL_LLM_ENABLED
+)
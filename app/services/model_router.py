@@ -0,0 +1,99 @@
+"""
+Roteamento do modelo de análise
+Escolhe o modelo de cada feedback pelo tamanho da transcrição, pelo plano
+do tenant e pela carga do provedor, a partir de regras configuráveis
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from ..config import settings
+from ..models import PLAN_LIMITS, PlanType
+from .ai_guard import AIGuard, CircuitBreaker, openai_guard
+from .monitoring import analysis_routes
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class RoutingRule:
+    """
+    Uma rota: ``model`` atende os feedbacks que satisfazem todas as
+    condições informadas (condições omitidas não restringem)
+    """
+    name: str
+    model: str
+    plans: List[str] = field(default_factory=list)
+    features: List[str] = field(default_factory=list)
+    min_words: Optional[int] = None
+    max_words: Optional[int] = None
+    overloaded: Optional[bool] = None
+
+    def matches(self, words: int, plan: Optional[PlanType], overloaded: bool) -> bool:
+        if self.overloaded is not None and self.overloaded != overloaded:
+            return False
+        if self.min_words is not None and words < self.min_words:
+            return False
+        if self.max_words is not None and words > self.max_words:
+            return False
+        if self.plans and (plan is None or PlanType(plan).value not in self.plans):
+            return False
+        if self.features:
+            plan_features = PLAN_LIMITS[PlanType(plan)]["features"] if plan is not None else []
+            if not any(feature.value in self.features for feature in plan_features):
+                return False
+        return True
+
+@dataclass
+class Route:
+    name: str
+    model: str
+
+class ModelRouter:
+    """
+    Avalia as regras em ordem e fica com a primeira que casar; sem nenhuma,
+    usa ``default_model``. O provedor é considerado sobrecarregado quando
+    a concorrência de análise em uso passa de ``overload_ratio`` do seu
+    limite adaptativo ou o circuit breaker não está fechado.
+    """
+
+    def __init__(
+        self,
+        rules: List[Dict[str, Any]],
+        default_model: str,
+        guard: AIGuard = openai_guard,
+        overload_ratio: float = 0.8
+    ):
+        self.rules = [RoutingRule(**rule) for rule in rules]
+        self.default_model = default_model
+        self.guard = guard
+        self.overload_ratio = overload_ratio
+
+    def overloaded(self) -> bool:
+        limiter = self.guard.limiters["analysis"]
+        if self.guard.breaker.state != CircuitBreaker.CLOSED:
+            return True
+        return limiter.inflight >= limiter.limit * self.overload_ratio
+
+    def default_route(self) -> Route:
+        return Route("default", self.default_model)
+
+    def route(self, text: str, plan: Optional[PlanType] = None) -> Route:
+        words = len(text.split())
+        overloaded = self.overloaded()
+        for rule in self.rules:
+            if rule.matches(words, plan, overloaded):
+                route = Route(rule.name, rule.model)
+                break
+        else:
+            route = self.default_route()
+
+        analysis_routes.labels(route=route.name, model=route.model).inc()
+        return route
+
+
+# Instância global do serviço
+model_router = ModelRouter(
+    rules=settings.ANALYSIS_ROUTES,
+    default_model=settings.OPENAI_ANALYSIS_MODEL,
+    overload_ratio=settings.ANALYSIS_ROUTER_OVERLOAD_RATIO
+)
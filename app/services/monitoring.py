@@ -23,6 +23,21 @@ whatsapp_reconnect_count = Counter(
     'Número total de reconexões do WhatsApp'
 )
 
+whatsapp_listener_up = Gauge(
+    'whatsapp_listener_up',
+    'Processo do Baileys listener em execução (1=sim, 0=não)'
+)
+
+whatsapp_listener_restarts = Counter(
+    'whatsapp_listener_restarts_total',
+    'Número total de reinícios do processo do Baileys listener'
+)
+
+whatsapp_listener_last_start = Gauge(
+    'whatsapp_listener_last_start_timestamp',
+    'Timestamp do último início do processo do Baileys listener'
+)
+
 # Métricas de processamento
 audio_processing_total = Counter(
     'audio_processing_total',
@@ -42,6 +57,192 @@ transcription_errors = Counter(
     ['error_type']
 )
 
+audio_preprocess_total = Counter(
+    'audio_preprocess_total',
+    'Áudios pré-processados antes da transcrição',
+    ['result']  # success, no_speech, error
+)
+
+audio_preprocess_duration = Histogram(
+    'audio_preprocess_duration_seconds',
+    'Tempo de pré-processamento (decode, VAD e reencode)',
+    buckets=[0.05, 0.1, 0.25, 0.5, 1, 2, 5]
+)
+
+audio_preprocess_input_seconds = Counter(
+    'audio_preprocess_input_seconds_total',
+    'Segundos de áudio recebidos pelo pré-processamento'
+)
+
+audio_preprocess_seconds_saved = Counter(
+    'audio_preprocess_seconds_saved_total',
+    'Segundos de silêncio removidos antes da transcrição'
+)
+
+transcription_chunks = Histogram(
+    'transcription_chunks_per_audio',
+    'Trechos transcritos em paralelo por áudio',
+    buckets=[1, 2, 3, 4, 6, 8, 12]
+)
+
+backend_latency = Histogram(
+    'backend_request_latency_seconds',
+    'Latência das requisições bem-sucedidas por backend de IA',
+    ['backend'],
+    buckets=[0.5, 1, 2, 4, 8, 15, 30, 60]
+)
+
+hedge_requests = Counter(
+    'hedged_requests_total',
+    'Requisições em que o hedge foi considerado',
+    ['outcome']  # primary_won, hedge_won, both_failed, skipped_budget
+)
+
+ai_concurrency_limit = Gauge(
+    'ai_concurrency_limit',
+    'Limite adaptativo (AIMD) de chamadas simultâneas ao provedor de IA',
+    ['provider']
+)
+
+ai_inflight = Gauge(
+    'ai_inflight_requests',
+    'Chamadas em andamento ao provedor de IA',
+    ['provider']
+)
+
+ai_circuit_state = Gauge(
+    'ai_circuit_state',
+    'Estado do circuit breaker (0=fechado, 1=half-open, 2=aberto)',
+    ['provider']
+)
+
+ai_throttled = Counter(
+    'ai_throttled_total',
+    'Chamadas ao provedor de IA recusadas ou com falha de sobrecarga',
+    ['provider', 'reason']  # circuit_open, rate_limited, provider_error
+)
+
+batch_size = Histogram(
+    'batch_size',
+    'Itens por lote enviado pelos micro-batchers',
+    ['batcher'],
+    buckets=[1, 2, 4, 8, 16, 32]
+)
+
+result_cache_lookups = Counter(
+    'result_cache_lookups_total',
+    'Consultas ao cache de resultados de IA',
+    ['kind', 'result']  # result: hot, db, miss
+)
+
+analysis_decode = Counter(
+    'analysis_decode_total',
+    'Decodificação das respostas de análise do modelo',
+    ['result']  # ok, repaired, retried, filled, failed
+)
+
+ai_tokens = Counter(
+    'ai_tokens_total',
+    'Tokens consumidos nas chamadas de chat ao provedor de IA',
+    ['model', 'operation', 'kind']  # kind: input, cached, output
+)
+
+ai_cost = Counter(
+    'ai_cost_usd_total',
+    'Custo estimado das chamadas de chat em dólares',
+    ['route', 'model', 'operation']
+)
+
+ai_call_duration = Histogram(
+    'ai_call_duration_seconds',
+    'Latência das chamadas de chat ao provedor de IA',
+    ['route', 'model', 'operation'],
+    buckets=[0.5, 1, 2, 4, 8, 15, 30, 60]
+)
+
+analysis_routes = Counter(
+    'analysis_routes_total',
+    'Feedbacks por rota do roteador de modelos de análise',
+    ['route', 'model']
+)
+
+local_classifier_duration = Histogram(
+    'local_classifier_duration_seconds',
+    'Duração da classificação local de sentimento e urgência por lote',
+    ['source'],  # onnx, lexicon
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5]
+)
+
+local_llm_requests = Counter(
+    'local_llm_requests_total',
+    'Análises feitas pelo LLM local',
+    ['reason']  # residency, fallback
+)
+
+local_llm_duration = Histogram(
+    'local_llm_duration_seconds',
+    'Duração de uma geração do LLM local',
+    buckets=[0.5, 1, 2, 4, 8, 15, 30, 60, 120]
+)
+
+jobs_processed = Counter(
+    'jobs_processed_total',
+    'Jobs executados pelos workers da fila',
+    ['kind', 'outcome']  # done, failed
+)
+
+job_duration = Histogram(
+    'job_duration_seconds',
+    'Duração da execução de um job',
+    ['kind'],
+    buckets=[0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+)
+
+job_queue_depth = Gauge(
+    'job_queue_depth',
+    'Jobs elegíveis aguardando na fila, por tenant',
+    ['tenant']
+)
+
+job_wait = Histogram(
+    'job_wait_seconds',
+    'Espera de um job elegível até ser retirado por um worker, por tenant',
+    ['tenant'],
+    buckets=[0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800]
+)
+
+time_to_dashboard = Histogram(
+    'time_to_dashboard_seconds',
+    'Tempo do recebimento do áudio até a transcrição e o sentimento aparecerem no dashboard',
+    ['plan'],
+    buckets=[1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1800]
+)
+
+job_retries = Counter(
+    'job_retries_total',
+    'Jobs devolvidos à fila após falha transitória',
+    ['kind', 'cause']  # error, outage
+)
+
+dead_letters = Counter(
+    'dead_letters_total',
+    'Jobs movidos para a dead-letter',
+    ['kind', 'reason']  # fatal, exhausted
+)
+
+pipeline_stage_jobs = Gauge(
+    'pipeline_stage_jobs',
+    'Trabalhos em cada estágio do pipeline de áudio',
+    ['stage', 'state']  # waiting, active
+)
+
+pipeline_stage_duration = Histogram(
+    'pipeline_stage_duration_seconds',
+    'Tempo ocupando uma vaga de um estágio do pipeline de áudio',
+    ['stage'],
+    buckets=[0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120]
+)
+
 class MonitoringService:
     def __init__(self):
         self.health_file = Path("health_status.json")
@@ -1,11 +1,160 @@
 import openai
+from openai import AsyncOpenAI
 from ..config import settings
+from .result_cache import result_cache
+from .ai_guard import openai_guard, estimate_tokens, usage_total_tokens, ProviderUnavailableError
+from .batching import MicroBatcher
+from .analysis_schema import (
+    ANALYSIS_FIELDS, FeedbackAnalysis, analysis_json_schema, batch_json_schema,
+    complete_analysis, decode_analysis, repair_json, response_format, validate_fields
+)
+from .monitoring import analysis_decode, ai_call_duration, ai_cost, ai_tokens
+from .usage import usage_service
+from .model_router import Route, model_router
+from .local_llm import local_llm
+from .monitoring import local_llm_requests
+from ..models import PlanType
+from pydantic import ValidationError
+from typing import Any, Dict, List, Optional, Tuple, Union
+import asyncio
+import time
+import httpx
 import json
 import logging
 import hashlib
 
 logger = logging.getLogger(__name__)
 
+_async_client: Optional[AsyncOpenAI] = None
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    Cliente OpenAI assíncrono compartilhado pelo processo, sobre um único
+    pool httpx com keep-alive (evita um handshake TLS por áudio)
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            timeout=settings.OPENAI_TIMEOUT,
+            # Retentativas ficam com quem chama: o AIGuard precisa ver cada 429
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                timeout=settings.OPENAI_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE
+                )
+            )
+        )
+    return _async_client
+
+async def close_async_client():
+    """Fecha o pool HTTP do cliente compartilhado"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+class AnalysisPromptBuilder:
+    """
+    Monta as mensagens das chamadas de análise.
+
+    Tudo que é fixo (papel, schema compacto e regras) fica num prefixo
+    estático idêntico em todas as chamadas, inclusive lotes e retentativas;
+    a parte variável (a transcrição) vai sempre por último, na mensagem do
+    usuário.
+
+    Isso ainda não gera acertos no cache de prompt da OpenAI: o prefixo tem
+    cerca de 300 tokens e o cache só vale a partir de 1024, e o
+    ``response_format`` com json_schema, que entra no prefixo cacheado, é
+    diferente nas chamadas simples, em lote e de campos faltantes. O
+    layout só passa a render desconto quando o prefixo crescer além do
+    mínimo, e então apenas entre chamadas do mesmo tipo.
+    """
+
+    PREFIX = """Você é um especialista em análise de feedback de clientes, focado em extrair insights acionáveis para melhorar negócios.
+Analise feedbacks de clientes em português e responda apenas com JSON, com estes campos:
+sentiment: POSITIVO|NEGATIVO|NEUTRO
+sentiment_score: -1.0 (muito negativo) a 1.0 (muito positivo)
+inferred_rating: 1 (péssimo) a 5 (excelente)
+emotions: emoções expressas (ex: frustração, alegria, gratidão)
+key_phrases: 2-3 frases mais impactantes
+is_compliment, is_complaint: true|false
+action_items: 1-3 ações concretas baseadas no feedback
+topics: 1-3 tópicos principais
+intent: {primary: intenção principal, secondary: [intenções secundárias]}
+urgency: ALTA|MÉDIA|BAIXA, pela necessidade de ação imediata
+customer_satisfaction: {level: SATISFEITO|INSATISFEITO|NEUTRO, reasons: [razões]}
+product_mentions: produtos/serviços mencionados
+improvement_areas: áreas específicas de melhoria
+Campos de lista são arrays de strings."""
+
+    # Overhead aproximado de cada mensagem no formato de chat
+    MESSAGE_OVERHEAD_TOKENS = 4
+
+    def __init__(self):
+        self.prefix_tokens = estimate_tokens(self.PREFIX) + self.MESSAGE_OVERHEAD_TOKENS
+
+    def _messages(self, content: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": self.PREFIX},
+            {"role": "user", "content": content}
+        ]
+
+    def single(self, text: str) -> List[Dict[str, str]]:
+        return self._messages(f"Feedback: {text}")
+
+    def batch(self, texts: List[str]) -> List[Dict[str, str]]:
+        items = [{"id": str(index), "feedback": text} for index, text in enumerate(texts)]
+        return self._messages(
+            'Analise cada feedback separadamente. Responda com {"results": [{"id": "<id>", "analysis": {...}}]}, '
+            "exatamente um item por feedback.\n"
+            f"Feedbacks: {json.dumps(items, ensure_ascii=False)}"
+        )
+
+    def missing_fields(self, text: str, fields: List[str]) -> List[Dict[str, str]]:
+        return self._messages(f"Responda apenas com os campos {', '.join(fields)}.\nFeedback: {text}")
+
+    def estimate(self, messages: List[Dict[str, str]], max_tokens: int) -> int:
+        """Tokens reservados no TPM: prefixo (pré-calculado) + parte variável + saída máxima"""
+        variable = sum(
+            estimate_tokens(message["content"]) + self.MESSAGE_OVERHEAD_TOKENS
+            for message in messages if message["role"] != "system"
+        )
+        return self.prefix_tokens + variable + max_tokens
+
+prompt_builder = AnalysisPromptBuilder()
+
+ANALYSIS_MAX_TOKENS = 800
+# Por campo, na retentativa só dos campos que faltaram
+ANALYSIS_FIELD_MAX_TOKENS = 80
+
+def _analysis_format(name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """``response_format`` conforme ANALYSIS_RESPONSE_FORMAT"""
+    if settings.ANALYSIS_RESPONSE_FORMAT == "json_schema":
+        return response_format(name, schema)
+    return {"type": "json_object"}
+
+def default_analysis() -> Dict[str, Any]:
+    """Análise neutra usada quando a resposta do modelo é inutilizável"""
+    return {
+        "sentiment": "unknown",
+        "sentiment_score": 0.0,
+        "inferred_rating": None,
+        "emotions": [],
+        "key_phrases": [],
+        "is_compliment": False,
+        "is_complaint": False,
+        "action_items": [],
+        "topics": [],
+        "intent": {"primary": None, "secondary": []},
+        "urgency": "BAIXA",
+        "customer_satisfaction": {"level": "NEUTRO", "reasons": []},
+        "product_mentions": [],
+        "improvement_areas": []
+    }
+
 class OpenAIService:
     def __init__(self):
         openai.api_key = settings.OPENAI_API_KEY
@@ -18,76 +167,284 @@ class OpenAIService:
         unique_string = f"{client_identifier}:{business_id}"
         return hashlib.sha256(unique_string.encode()).hexdigest()[:12]
     
-    async def analyze_feedback(self, text: str) -> dict:
+    async def analyze_feedback(
+        self,
+        text: str,
+        tenant_id: Optional[int] = None,
+        plan: Optional[PlanType] = None
+    ) -> dict:
         """
-        Análise detalhada do feedback usando GPT-4
-        """
-        prompt = f"""
-        Analise este feedback de cliente em português e forneça uma análise detalhada no seguinte formato JSON:
-        {{
-            "sentiment": "POSITIVO/NEGATIVO/NEUTRO",
-            "sentiment_score": float entre -1.0 e 1.0,
-            "inferred_rating": int entre 1 e 5 estrelas,
-            "emotions": ["emoção1", "emoção2"],
-            "key_phrases": ["frase impactante 1", "frase impactante 2"],
-            "is_compliment": true/false,
-            "is_complaint": true/false,
-            "action_items": ["sugestão de ação 1", "sugestão de ação 2"],
-            "topics": ["tópico 1", "tópico 2"],
-            "intent": {{"primary": "principal intenção", "secondary": ["intenção secundária 1", "intenção secundária 2"]}},
-            "urgency": "ALTA/MÉDIA/BAIXA",
-            "customer_satisfaction": {{"level": "SATISFEITO/INSATISFEITO/NEUTRO", "reasons": ["razão 1", "razão 2"]}},
-            "product_mentions": ["produto/serviço mencionado 1", "produto/serviço mencionado 2"],
-            "improvement_areas": ["área de melhoria 1", "área de melhoria 2"]
-        }}
-
-        Regras:
-        1. sentiment_score: -1.0 (muito negativo) até 1.0 (muito positivo)
-        2. inferred_rating: 1 (péssimo) até 5 (excelente)
-        3. emotions: identifique emoções expressas (ex: frustração, alegria, gratidão)
-        4. key_phrases: extraia 2-3 frases mais impactantes e relevantes
-        5. action_items: sugira 1-3 ações concretas baseadas no feedback
-        6. topics: identifique 1-3 tópicos principais mencionados
-        7. intent: identifique a principal intenção e intenções secundárias
-        8. urgency: classifique com base na necessidade de ação imediata
-        9. improvement_areas: sugira áreas específicas para melhoria
-
-        Feedback: {text}
+        Análise detalhada do feedback
+
+        O modelo é escolhido pelo ``model_router`` (tamanho do texto, plano
+        do tenant e carga do provedor); tenants com residência de dados
+        (LOCAL_LLM_TENANTS/PLANS) são analisados só pelo LLM local.
+        Transcrições idênticas reaproveitam a análise do cache; o fallback
+        de erro nunca é cacheado. Com o provedor degradado (429, timeouts,
+        circuit breaker aberto) usa o LLM local, se disponível, ou levanta
+        ProviderUnavailableError para que o trabalho seja adiado em vez de
+        gravar uma análise vazia. Chamadas concorrentes da mesma rota são
+        agrupadas em lotes. Os tokens consumidos são contabilizados para
+        ``tenant_id``.
         """
+        if local_llm.serves(tenant_id, plan):
+            return await self._analyze_locally(text, reason="residency")
+        
+        route = model_router.route(text, plan)
+        text_hash = result_cache.content_hash(text)
+        cached = await result_cache.get(
+            "analysis", route.model, settings.ANALYSIS_PROMPT_VERSION, text_hash
+        )
+        if cached is not None:
+            return cached
         
         try:
-            response = await openai.ChatCompletion.acreate(
-                model=settings.OPENAI_ANALYSIS_MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Você é um especialista em análise de feedback de clientes, focado em extrair insights acionáveis para melhorar negócios."
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0,
-                max_tokens=800
-            )
+            if settings.ANALYSIS_BATCH_ENABLED:
+                result = await analysis_batcher(route).submit((text, tenant_id))
+            else:
+                result = await self.analyze_single(text, tenant_id, route)
             
-            # Parse the JSON response
-            result = json.loads(response.choices[0].message.content)
+            await result_cache.set(
+                "analysis", route.model, settings.ANALYSIS_PROMPT_VERSION,
+                text_hash, result
+            )
             return result
             
+        except ProviderUnavailableError:
+            if settings.LOCAL_LLM_FALLBACK and local_llm.available:
+                logger.warning("OpenAI unavailable, analyzing with the local LLM")
+                return await self._analyze_locally(text, reason="fallback")
+            raise
         except Exception as e:
             logger.error(f"Error in feedback analysis: {e}")
-            return {
-                "sentiment": "unknown",
-                "sentiment_score": 0.0,
-                "inferred_rating": None,
-                "emotions": [],
-                "key_phrases": [],
-                "is_compliment": False,
-                "is_complaint": False,
-                "action_items": [],
-                "topics": [],
-                "intent": {"primary": None, "secondary": []},
-                "urgency": "BAIXA",
-                "customer_satisfaction": {"level": "NEUTRO", "reasons": []},
-                "product_mentions": [],
-                "improvement_areas": []
-            } 
\ No newline at end of file
+            return default_analysis()
+    
+    async def _analyze_locally(self, text: str, reason: str) -> dict:
+        """
+        Análise pelo LLM local (mesmo prompt, saída restrita pela gramática).
+        Erros do backend local se propagam: para tenants com residência de
+        dados não há fallback para a OpenAI.
+        """
+        local_llm_requests.labels(reason=reason).inc()
+        text_hash = result_cache.content_hash(text)
+        cached = await result_cache.get(
+            "analysis", local_llm.cache_model, settings.ANALYSIS_PROMPT_VERSION, text_hash
+        )
+        if cached is not None:
+            return cached
+        
+        result = await local_llm.analyze(prompt_builder.single(text))
+        await result_cache.set(
+            "analysis", local_llm.cache_model, settings.ANALYSIS_PROMPT_VERSION, text_hash, result
+        )
+        return result
+    
+    async def analyze_single(
+        self,
+        text: str,
+        tenant_id: Optional[int] = None,
+        route: Optional[Route] = None
+    ) -> dict:
+        """Uma chamada ao modelo para um único feedback"""
+        route = route or model_router.default_route()
+        content = await self._complete(
+            route,
+            prompt_builder.single(text),
+            ANALYSIS_MAX_TOKENS,
+            _analysis_format("feedback_analysis", analysis_json_schema()),
+            operation="analysis",
+            tenants=[(tenant_id, 1)]
+        )
+        return (await self._decode(text, content, tenant_id, route)).model_dump()
+    
+    async def _decode(self, text: str, content: str, tenant_id: Optional[int], route: Route) -> FeedbackAnalysis:
+        """
+        Valida a resposta; se veio truncada ou com campos inválidos, pede de
+        novo só os campos que faltaram em vez de repetir a análise inteira
+        """
+        analysis, valid = decode_analysis(content)
+        if analysis is not None:
+            analysis_decode.labels(result="repaired" if valid else "ok").inc()
+            return analysis
+        
+        if not valid:
+            analysis_decode.labels(result="failed").inc()
+            raise ValueError(f"Unusable analysis response: {content[:200]!r}")
+        
+        missing = [name for name in ANALYSIS_FIELDS if name not in valid]
+        logger.info(f"Analysis response incomplete, requesting {len(missing)} missing fields: {missing}")
+        content = await self._complete(
+            route,
+            prompt_builder.missing_fields(text, missing),
+            ANALYSIS_FIELD_MAX_TOKENS * len(missing),
+            _analysis_format("feedback_analysis_fields", analysis_json_schema(missing)),
+            operation="analysis_fields",
+            tenants=[(tenant_id, 1)]
+        )
+        valid.update(validate_fields(repair_json(content) or {}))
+        
+        if len(valid) == len(ANALYSIS_FIELDS):
+            analysis_decode.labels(result="retried").inc()
+            return FeedbackAnalysis(**valid)
+        analysis_decode.labels(result="filled").inc()
+        return complete_analysis(valid)
+    
+    async def analyze_batch(
+        self,
+        items: List[Tuple[str, Optional[int]]],
+        route: Optional[Route] = None
+    ) -> List[Union[dict, Exception]]:
+        """
+        Analisa vários feedbacks ``(texto, tenant_id)`` numa única chamada.
+
+        O modelo devolve ``{"results": [{"id", "analysis"}]}``; itens ausentes
+        ou malformados (e o lote inteiro, se o JSON não for válido) caem para
+        chamadas individuais. Falhas do provedor se propagam para todos.
+        """
+        route = route or model_router.default_route()
+        if len(items) == 1:
+            return [await self._single_or_error(*items[0], route)]
+        
+        texts = [text for text, _ in items]
+        analyses: Dict[str, Any] = {}
+        try:
+            content = await self._complete(
+                route,
+                prompt_builder.batch(texts),
+                min(ANALYSIS_MAX_TOKENS * len(items), settings.ANALYSIS_BATCH_MAX_TOKENS),
+                _analysis_format("feedback_analysis_batch", batch_json_schema()),
+                operation="analysis_batch",
+                # Consumo do lote rateado pelo tamanho de cada feedback
+                tenants=[(tenant_id, len(text) + 1) for text, tenant_id in items]
+            )
+            # Um lote truncado ainda aproveita os itens completos
+            for entry in (repair_json(content, max_open=2) or {}).get("results", []):
+                if not isinstance(entry, dict):
+                    continue
+                try:
+                    analysis = FeedbackAnalysis.model_validate(entry.get("analysis"))
+                except ValidationError:
+                    continue
+                analyses[str(entry.get("id"))] = analysis.model_dump()
+        except ProviderUnavailableError:
+            raise
+        except Exception as e:
+            logger.warning(f"Batched analysis of {len(items)} feedbacks failed, falling back to single calls: {e}")
+        
+        ids = [str(index) for index in range(len(items))]
+        missing = [index for index, item_id in enumerate(ids) if item_id not in analyses]
+        if missing:
+            logger.info(f"Batched analysis missing {len(missing)}/{len(items)} items, retrying individually")
+            fallbacks = await asyncio.gather(*(self._single_or_error(*items[index], route) for index in missing))
+            analyses.update({ids[index]: result for index, result in zip(missing, fallbacks)})
+        
+        return [analyses[item_id] for item_id in ids]
+    
+    async def _single_or_error(
+        self,
+        text: str,
+        tenant_id: Optional[int] = None,
+        route: Optional[Route] = None
+    ) -> Union[dict, Exception]:
+        try:
+            return await self.analyze_single(text, tenant_id, route)
+        except Exception as e:
+            return e
+    
+    async def _complete(
+        self,
+        route: Route,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        output_format: Optional[Dict[str, Any]] = None,
+        operation: str = "analysis",
+        tenants: Optional[List[Tuple[Optional[int], float]]] = None
+    ) -> str:
+        """
+        Chamada de chat protegida pelo AIGuard; retorna o conteúdo da resposta.
+
+        O consumo real (entrada, entrada em cache e saída) é registrado por
+        tenant, rateado pelos pesos de ``tenants``.
+        """
+        model = route.model
+        extra = {"response_format": output_format} if output_format else {}
+        started = time.perf_counter()
+        response = await openai_guard.call(
+            lambda: get_async_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0,
+                max_tokens=max_tokens,
+                **extra
+            ),
+            operation="analysis",
+            estimated_tokens=prompt_builder.estimate(messages, max_tokens),
+            used_tokens=usage_total_tokens
+        )
+        ai_call_duration.labels(route=route.name, model=model, operation=operation).observe(
+            time.perf_counter() - started
+        )
+        record_token_usage(route, operation, response.usage, tenants or [])
+        
+        choice = response.choices[0]
+        if choice.finish_reason == "length":
+            logger.warning(f"Analysis response truncated at {max_tokens} tokens")
+        return choice.message.content or ""
+
+def record_token_usage(
+    route: Route,
+    operation: str,
+    usage,
+    tenants: List[Tuple[Optional[int], float]]
+) -> None:
+    """Exporta tokens e custo estimado da chamada e credita o consumo a cada tenant"""
+    if usage is None:
+        return
+    
+    model = route.model
+    input_tokens = usage.prompt_tokens or 0
+    output_tokens = usage.completion_tokens or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = (getattr(details, "cached_tokens", None) or 0) if details else 0
+    
+    ai_tokens.labels(model=model, operation=operation, kind="input").inc(input_tokens)
+    ai_tokens.labels(model=model, operation=operation, kind="cached").inc(cached_tokens)
+    ai_tokens.labels(model=model, operation=operation, kind="output").inc(output_tokens)
+    
+    prices = settings.OPENAI_TOKEN_PRICES.get(model)
+    if prices:
+        cost = (
+            (input_tokens - cached_tokens) * prices.get("input", 0)
+            + cached_tokens * prices.get("cached", prices.get("input", 0))
+            + output_tokens * prices.get("output", 0)
+        ) / 1_000_000
+        ai_cost.labels(route=route.name, model=model, operation=operation).inc(cost)
+    
+    total_weight = sum(weight for _, weight in tenants)
+    for tenant_id, weight in tenants:
+        if tenant_id is None or not total_weight:
+            continue
+        share = weight / total_weight
+        usage_service.record_ai_tokens(
+            tenant_id,
+            input_tokens=round(input_tokens * share),
+            cached_tokens=round(cached_tokens * share),
+            output_tokens=round(output_tokens * share)
+        )
+
+
+# Um micro-batcher por rota: cada lote vai para um único modelo
+_analysis_batchers: Dict[str, MicroBatcher] = {}
+
+def analysis_batcher(route: Route) -> MicroBatcher:
+    """Agrupa análises concorrentes da mesma rota numa única chamada ao modelo"""
+    batcher = _analysis_batchers.get(route.name)
+    if batcher is None:
+        batcher = MicroBatcher(
+            handler=lambda items: OpenAIService().analyze_batch(items, route),
+            max_batch=settings.ANALYSIS_BATCH_MAX_SIZE,
+            max_wait=settings.ANALYSIS_BATCH_MAX_WAIT_MS / 1000,
+            name=f"analysis:{route.name}"
+        )
+        _analysis_batchers[route.name] = batcher
+    return batcher
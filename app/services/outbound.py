@@ -0,0 +1,262 @@
+"""
+Fila de envio de mensagens WhatsApp
+Fan-out de pedidos de feedback em massa com rate limit por número remetente,
+fairness entre tenants e deduplicação de destinatários recentes. Tudo fica no
+Postgres: o pedido e seu progresso em ``OutboundCampaign``, as reservas de
+dedupe em ``OutboundRecipient`` e os envios como jobs da fila durável, então
+um restart não perde envios pendentes e qualquer instância responde pelo
+progresso.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select
+
+from ..config import settings
+from ..database import async_session_maker
+from ..models import OutboundCampaign, OutboundRecipient
+from ..repositories import normalize_phone
+from .jobs import JobQueue, JobWorker, job_queue
+from .rate_limit import TokenBucket
+from .whatsapp import WhatsAppService, whatsapp_service
+
+logger = logging.getLogger(__name__)
+
+SEND_JOB_KIND = "send_feedback_request"
+
+def campaign_progress(campaign: OutboundCampaign) -> Dict[str, Any]:
+    """Progresso de um pedido em massa, no formato da API"""
+    done = campaign.sent + campaign.failed
+    pending = campaign.total - done
+    if pending <= 0:
+        status = "completed"
+    elif done:
+        status = "running"
+    else:
+        status = "queued"
+    return {
+        "job_id": campaign.id,
+        "status": status,
+        "total": campaign.total,
+        "sent": campaign.sent,
+        "failed": campaign.failed,
+        "pending": max(0, pending),
+        "skipped_duplicates": campaign.skipped_duplicates,
+        "invalid": campaign.invalid,
+        "progress": round(done / campaign.total * 100, 1) if campaign.total else 100.0,
+        "created_at": campaign.created_at.isoformat(),
+        "finished_at": campaign.finished_at.isoformat() if campaign.finished_at else None
+    }
+
+class OutboundQueue:
+    """
+    Fila durável de mensagens de saída.
+
+    Os destinatários de um pedido viram jobs ``send_feedback_request`` de
+    até ``batch_size`` números cada, enfileirados com o tenant e o peso do
+    plano: a fila justa (WFQ) intercala os lotes dos tenants, então uma
+    campanha grande não atrasa os pedidos dos demais. O envio respeita um
+    token bucket por número remetente (por processo, como a conexão do
+    Baileys) e destinatários que já receberam pedido do mesmo tenant na
+    janela de dedupe são ignorados.
+
+    Os jobs só são consumidos por processos com o listener do WhatsApp (o
+    web); um worker que morra no meio de um lote faz o lote ser reenviado
+    quando o lease expirar.
+    """
+
+    def __init__(
+        self,
+        whatsapp: WhatsAppService,
+        rate_per_second: float,
+        burst: int,
+        batch_size: int,
+        dedupe_ttl_seconds: float,
+        sender: str = "default",
+        queue: JobQueue = job_queue,
+        session_maker=async_session_maker
+    ):
+        self.whatsapp = whatsapp
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        # Um lote nunca pede mais tokens do que o bucket comporta
+        self.batch_size = max(1, min(batch_size, burst))
+        self.dedupe_ttl_seconds = dedupe_ttl_seconds
+        self.sender = sender
+        self.queue = queue
+        self.session_maker = session_maker
+
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._worker: Optional[JobWorker] = None
+
+    # ==============================================
+    # API PÚBLICA
+    # ==============================================
+
+    async def submit(
+        self,
+        tenant_id: int,
+        phones: Iterable[str],
+        message: str,
+        weight: float = 1.0
+    ) -> Dict[str, Any]:
+        """
+        Registra o pedido, reserva os destinatários e enfileira os envios
+        numa única transação; retorna o progresso inicial
+        """
+        campaign = OutboundCampaign(id=str(uuid.uuid4()), tenant_id=tenant_id)
+        unique: List[str] = []
+        seen = set()
+        for raw_phone in phones:
+            phone = normalize_phone(str(raw_phone))
+            if not 10 <= len(phone) <= 15:
+                campaign.invalid += 1
+            elif phone in seen:
+                campaign.skipped_duplicates += 1
+            else:
+                seen.add(phone)
+                unique.append(phone)
+
+        async with self.session_maker() as db:
+            db.add(campaign)
+            await db.flush()
+
+            reserved = await self._reserve(db, tenant_id, campaign.id, unique)
+            campaign.skipped_duplicates += len(unique) - len(reserved)
+            campaign.total = len(reserved)
+            if not reserved:
+                campaign.finished_at = datetime.utcnow()
+
+            await self.queue.enqueue_many(
+                SEND_JOB_KIND,
+                [
+                    {"campaign_id": campaign.id, "phones": reserved[start:start + self.batch_size], "message": message}
+                    for start in range(0, len(reserved), self.batch_size)
+                ],
+                tenant_id=tenant_id,
+                weight=weight,
+                db=db
+            )
+            await db.commit()
+
+        logger.info(
+            f"Queued bulk feedback job {campaign.id} for tenant {tenant_id}: "
+            f"{campaign.total} recipients, {campaign.skipped_duplicates} duplicates, {campaign.invalid} invalid"
+        )
+        return campaign_progress(campaign)
+
+    async def get_job(self, job_id: str, tenant_id: int) -> Optional[Dict[str, Any]]:
+        async with self.session_maker() as db:
+            campaign = (await db.execute(
+                select(OutboundCampaign).where(
+                    OutboundCampaign.id == job_id,
+                    OutboundCampaign.tenant_id == tenant_id
+                )
+            )).scalar_one_or_none()
+        return campaign_progress(campaign) if campaign else None
+
+    def start(self):
+        """Inicia o consumidor dos envios no event loop atual"""
+        if self._worker is None:
+            # Um envio por vez: o bucket do remetente já dita o ritmo
+            self._worker = JobWorker(
+                self.queue,
+                kinds=[SEND_JOB_KIND],
+                concurrency=1,
+                poll_interval=settings.JOB_POLL_INTERVAL
+            )
+        self._worker.start()
+
+    async def stop(self):
+        if self._worker:
+            await self._worker.stop()
+
+    # ==============================================
+    # WORKER
+    # ==============================================
+
+    async def send_batch(self, payload: Dict[str, Any], _blob: Optional[bytes] = None) -> None:
+        """Handler dos jobs ``send_feedback_request``: envia o lote e soma o resultado ao pedido"""
+        campaign_id = payload["campaign_id"]
+        phones: List[str] = payload["phones"]
+        try:
+            await self._bucket(self.sender).acquire(len(phones))
+            results = await self.whatsapp.send_many([(phone, payload["message"]) for phone in phones])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending outbound batch: {e}")
+            results = [False] * len(phones)
+
+        failed = [phone for phone, delivered in zip(phones, results) if not delivered]
+        async with self.session_maker() as db:
+            if failed:
+                # Libera os destinatários para uma nova tentativa futura
+                await db.execute(
+                    delete(OutboundRecipient).where(
+                        OutboundRecipient.campaign_id == campaign_id,
+                        OutboundRecipient.phone.in_(failed)
+                    )
+                )
+            row = (await db.execute(
+                update(OutboundCampaign)
+                .where(OutboundCampaign.id == campaign_id)
+                .values(
+                    sent=OutboundCampaign.sent + len(phones) - len(failed),
+                    failed=OutboundCampaign.failed + len(failed)
+                )
+                .returning(OutboundCampaign.total, OutboundCampaign.sent, OutboundCampaign.failed)
+            )).one_or_none()
+            if row and row.sent + row.failed >= row.total:
+                await db.execute(
+                    update(OutboundCampaign)
+                    .where(OutboundCampaign.id == campaign_id, OutboundCampaign.finished_at.is_(None))
+                    .values(finished_at=datetime.utcnow())
+                )
+                logger.info(f"Bulk feedback job {campaign_id} finished: {row.sent} sent, {row.failed} failed")
+            await db.commit()
+
+    async def _reserve(self, db, tenant_id: int, campaign_id: str, phones: List[str]) -> List[str]:
+        """
+        Reserva os destinatários sem pedido do tenant na janela de dedupe e
+        retorna os reservados. Um único upsert: a reserva vencida é
+        renovada, a vigente fica intacta, e campanhas concorrentes (em
+        qualquer instância) nunca reservam o mesmo número
+        """
+        if not phones:
+            return []
+        now = datetime.utcnow()
+        statement = insert(OutboundRecipient).values([
+            {"tenant_id": tenant_id, "phone": phone, "campaign_id": campaign_id, "reserved_at": now}
+            for phone in phones
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=["tenant_id", "phone"],
+            set_={"campaign_id": statement.excluded.campaign_id, "reserved_at": statement.excluded.reserved_at},
+            where=OutboundRecipient.reserved_at < now - timedelta(seconds=self.dedupe_ttl_seconds)
+        ).returning(OutboundRecipient.phone)
+        reserved = set((await db.execute(statement)).scalars().all())
+        return [phone for phone in phones if phone in reserved]
+
+    def _bucket(self, sender: str) -> TokenBucket:
+        bucket = self._buckets.get(sender)
+        if bucket is None:
+            bucket = TokenBucket(self.rate_per_second, self.burst)
+            self._buckets[sender] = bucket
+        return bucket
+
+
+# Instância global do serviço
+outbound_queue = OutboundQueue(
+    whatsapp_service,
+    rate_per_second=settings.WHATSAPP_SEND_RATE_PER_SECOND,
+    burst=settings.WHATSAPP_SEND_BURST,
+    batch_size=settings.WHATSAPP_SEND_BATCH_SIZE,
+    dedupe_ttl_seconds=settings.FEEDBACK_REQUEST_DEDUPE_HOURS * 3600
+)
+job_queue.register(SEND_JOB_KIND, outbound_queue.send_batch)
@@ -1,9 +1,10 @@
 from datetime import datetime
 from typing import Optional, Dict, Any
-from sqlmodel import Session, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
 
-from ..models import User, Subscription, PlanType, SubscriptionStatus
+from ..models import User, PlanType, SubscriptionStatus
+from ..repositories import SubscriptionRepository, UserRepository
 from ..services.stripe import StripeService
 from ..database import get_db
 
@@ -15,18 +16,14 @@ class PaymentService:
         self,
         user: User,
         plan_type: PlanType,
-        db: Session
+        db: AsyncSession
     ) -> Dict[str, Any]:
         """
         Cria uma nova assinatura para o usuário
         """
         # Verifica se já tem assinatura ativa
         if user.stripe_customer_id:
-            stmt = select(Subscription).where(
-                Subscription.user_id == user.id,
-                Subscription.status == SubscriptionStatus.ACTIVE
-            )
-            active_sub = db.exec(stmt).first()
+            active_sub = await SubscriptionRepository(db).active_for_user(user.id)
             if active_sub:
                 raise HTTPException(
                     status_code=400,
@@ -42,8 +39,7 @@ class PaymentService:
                     detail="Erro ao criar customer no Stripe"
                 )
             user.stripe_customer_id = customer_id
-            db.add(user)
-            db.commit()
+            await UserRepository(db).save(user)
         
         # Cria checkout session
         checkout = await self.stripe.create_checkout_session(
@@ -67,15 +63,13 @@ class PaymentService:
         subscription_id: str,
         status: SubscriptionStatus,
         current_period_end: datetime,
-        db: Session
+        db: AsyncSession
     ) -> None:
         """
         Atualiza status da assinatura quando recebe webhook do Stripe
         """
-        stmt = select(Subscription).where(
-            Subscription.stripe_subscription_id == subscription_id
-        )
-        subscription = db.exec(stmt).first()
+        subscriptions = SubscriptionRepository(db)
+        subscription = await subscriptions.by_stripe_id(subscription_id)
         
         if not subscription:
             return
@@ -93,23 +87,18 @@ class PaymentService:
             if subscription.user.plan_type != PlanType.FREE:
                 subscription.user.plan_type = PlanType.FREE
         
-        db.add(subscription)
-        db.add(subscription.user)
-        db.commit()
+        await subscriptions.save(subscription, subscription.user)
     
     async def cancel_subscription(
         self,
         user: User,
-        db: Session
+        db: AsyncSession
     ) -> bool:
         """
         Cancela assinatura do usuário
         """
-        stmt = select(Subscription).where(
-            Subscription.user_id == user.id,
-            Subscription.status == SubscriptionStatus.ACTIVE
-        )
-        subscription = db.exec(stmt).first()
+        subscriptions = SubscriptionRepository(db)
+        subscription = await subscriptions.active_for_user(user.id)
         
         if not subscription:
             raise HTTPException(
@@ -135,25 +124,19 @@ class PaymentService:
         if user.plan_type != PlanType.FREE:
             user.plan_type = PlanType.FREE
         
-        db.add(subscription)
-        db.add(user)
-        db.commit()
+        await subscriptions.save(subscription, user)
         
         return True
     
     async def get_subscription_status(
         self,
         user: User,
-        db: Session
+        db: AsyncSession
     ) -> Dict[str, Any]:
         """
         Retorna status da assinatura do usuário
         """
-        stmt = select(Subscription).where(
-            Subscription.user_id == user.id,
-            Subscription.status == SubscriptionStatus.ACTIVE
-        )
-        subscription = db.exec(stmt).first()
+        subscription = await SubscriptionRepository(db).active_for_user(user.id)
         
         if not subscription:
             return {
@@ -0,0 +1,115 @@
+"""
+Estágios do pipeline de áudio
+Cada estágio (decode, transcribe, analyze, persist) tem o próprio pool
+limitado de vagas, para que um provedor de análise lento acumule fila só
+no estágio de análise, sem ocupar as vagas de decodificação e transcrição.
+Feedbacks urgentes têm uma faixa própria: passam à frente na espera por vaga.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict
+
+from ..config import settings
+from .monitoring import pipeline_stage_duration, pipeline_stage_jobs
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("decode", "transcribe", "analyze", "persist")
+
+def default_stage_limits() -> Dict[str, int]:
+    """
+    Limites a partir da configuração; zero dimensiona pelos núcleos:
+    decode é CPU (ffmpeg), os demais esperam I/O e comportam mais vagas
+    """
+    cores = os.cpu_count() or 1
+    return {
+        "decode": settings.WORKER_DECODE_CONCURRENCY or cores,
+        "transcribe": settings.WORKER_TRANSCRIBE_CONCURRENCY or 4 * cores,
+        "analyze": settings.WORKER_ANALYZE_CONCURRENCY or 4 * cores,
+        "persist": settings.WORKER_PERSIST_CONCURRENCY or 2 * cores
+    }
+
+class PrioritySlots:
+    """Semáforo de ``limit`` vagas em que os pedidos urgentes são atendidos primeiro"""
+
+    def __init__(self, limit: int):
+        self._free = limit
+        self._lanes: Dict[bool, Deque[asyncio.Future]] = {True: deque(), False: deque()}
+
+    async def acquire(self, urgent: bool = False):
+        if self._free > 0 and not (self._lanes[True] or self._lanes[False]):
+            self._free -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        lane = self._lanes[urgent]
+        lane.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # A vaga chegou junto com o cancelamento: repassa
+                self.release()
+            else:
+                lane.remove(waiter)
+            raise
+
+    def release(self):
+        for urgent in (True, False):
+            lane = self._lanes[urgent]
+            while lane:
+                waiter = lane.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self._free += 1
+
+class PipelineStages:
+    """Um semáforo por estágio, com contagem de quem espera e de quem executa"""
+
+    def __init__(self, limits: Dict[str, int]):
+        self.configure(limits)
+
+    def configure(self, limits: Dict[str, int]):
+        """Redefine os limites; chamar antes de haver trabalho em andamento"""
+        self.limits = {stage: max(1, int(limits[stage])) for stage in STAGES}
+        self._slots = {stage: PrioritySlots(limit) for stage, limit in self.limits.items()}
+        self._waiting = dict.fromkeys(STAGES, 0)
+        self._active = dict.fromkeys(STAGES, 0)
+
+    def pending(self, *stages: str) -> int:
+        """Trabalhos esperando ou executando nos estágios indicados"""
+        return sum(self._waiting[stage] + self._active[stage] for stage in stages or STAGES)
+
+    def _publish(self, stage: str):
+        pipeline_stage_jobs.labels(stage=stage, state="waiting").set(self._waiting[stage])
+        pipeline_stage_jobs.labels(stage=stage, state="active").set(self._active[stage])
+
+    @asynccontextmanager
+    async def slot(self, stage: str, urgent: bool = False) -> AsyncIterator[None]:
+        """Ocupa uma vaga de ``stage`` durante o bloco (``urgent``: faixa prioritária)"""
+        slots = self._slots[stage]
+        self._waiting[stage] += 1
+        self._publish(stage)
+        try:
+            await slots.acquire(urgent)
+        finally:
+            self._waiting[stage] -= 1
+
+        self._active[stage] += 1
+        self._publish(stage)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            slots.release()
+            self._active[stage] -= 1
+            self._publish(stage)
+            pipeline_stage_duration.labels(stage=stage).observe(time.perf_counter() - started)
+
+
+# Instância global do serviço
+pipeline_stages = PipelineStages(default_stage_limits())
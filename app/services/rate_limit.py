@@ -0,0 +1,34 @@
+"""
+Primitivas de rate limiting compartilhadas pelos serviços
+"""
+import asyncio
+import time
+
+class TokenBucket:
+    """Token bucket assíncrono: ``rate`` tokens por segundo, até ``burst`` acumulados"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, amount: int = 1):
+        """Aguarda até haver ``amount`` tokens e os consome"""
+        amount = min(amount, self.burst)
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def refund(self, amount: float):
+        """Devolve tokens reservados a mais (ex.: estimativa acima do uso real)"""
+        self._refill()
+        self.tokens = max(-self.burst, min(self.burst, self.tokens + amount))
@@ -0,0 +1,118 @@
+"""
+Cache de resultados de IA endereçado por conteúdo
+Áudios encaminhados e reenvios de teste são idênticos byte a byte; o
+resultado é reaproveitado pelo SHA-256 da entrada + modelo + versão do prompt
+"""
+import copy
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Union
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from ..config import settings
+from ..database import async_session_maker
+from ..models import ResultCacheEntry
+from .monitoring import result_cache_lookups
+
+logger = logging.getLogger(__name__)
+
+class ResultCache:
+    """
+    Cache em dois níveis: LRU em memória (quente) e tabela ``ResultCacheEntry``.
+
+    A chave inclui modelo e versão do prompt, então trocar qualquer um dos
+    dois invalida as entradas antigas sem precisar apagá-las. Falhas do banco
+    nunca quebram o pipeline: são tratadas como miss.
+    """
+
+    def __init__(self, hot_size: int, enabled: bool = True, session_maker=async_session_maker):
+        self.hot_size = hot_size
+        self.enabled = enabled
+        self.session_maker = session_maker
+        self._hot: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    @staticmethod
+    def content_hash(content: Union[bytes, str]) -> str:
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        return hashlib.sha256(content).hexdigest()
+
+    @staticmethod
+    def make_key(kind: str, model: str, version: str, content_hash: str) -> str:
+        return hashlib.sha256(f"{kind}:{model}:{version}:{content_hash}".encode()).hexdigest()
+
+    async def get(self, kind: str, model: str, version: str, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Retorna uma cópia do resultado em cache ou None"""
+        if not self.enabled:
+            return None
+
+        key = self.make_key(kind, model, version, content_hash)
+
+        payload = self._hot.get(key)
+        if payload is not None:
+            self._hot.move_to_end(key)
+            result_cache_lookups.labels(kind=kind, result="hot").inc()
+            return copy.deepcopy(payload)
+
+        try:
+            async with self.session_maker() as db:
+                entry = await db.get(ResultCacheEntry, key)
+                if entry is not None:
+                    await db.execute(
+                        update(ResultCacheEntry)
+                        .where(ResultCacheEntry.key == key)
+                        .values(hits=ResultCacheEntry.hits + 1, last_hit_at=datetime.utcnow())
+                    )
+                    await db.commit()
+        except Exception as e:
+            logger.warning(f"Result cache lookup failed, treating as miss: {e}")
+            entry = None
+
+        if entry is None:
+            result_cache_lookups.labels(kind=kind, result="miss").inc()
+            return None
+
+        result_cache_lookups.labels(kind=kind, result="db").inc()
+        self._remember(key, entry.payload)
+        return copy.deepcopy(entry.payload)
+
+    async def set(self, kind: str, model: str, version: str, content_hash: str, payload: Dict[str, Any]):
+        """Grava o resultado nos dois níveis"""
+        if not self.enabled:
+            return
+
+        key = self.make_key(kind, model, version, content_hash)
+        self._remember(key, copy.deepcopy(payload))
+
+        try:
+            async with self.session_maker() as db:
+                db.add(ResultCacheEntry(
+                    key=key,
+                    kind=kind,
+                    model=model,
+                    version=version,
+                    payload=payload
+                ))
+                await db.commit()
+        except IntegrityError:
+            # Outro worker gravou o mesmo resultado primeiro
+            pass
+        except Exception as e:
+            logger.warning(f"Result cache write failed: {e}")
+
+    def _remember(self, key: str, payload: Dict[str, Any]):
+        self._hot[key] = payload
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_size:
+            self._hot.popitem(last=False)
+
+
+# Instância global do serviço
+result_cache = ResultCache(
+    hot_size=settings.RESULT_CACHE_HOT_SIZE,
+    enabled=settings.RESULT_CACHE_ENABLED
+)
@@ -0,0 +1,57 @@
+"""
+Classificação de erros e backoff dos reprocessamentos
+Erros transitórios (provedor degradado, rede, banco indisponível) voltam à
+fila com backoff exponencial e jitter; os demais são fatais e vão direto
+para a dead-letter
+"""
+import random
+from typing import Optional
+
+import httpx
+import openai
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from ..config import settings
+from .ai_guard import RETRYABLE_ERRORS, ProviderUnavailableError
+
+_TRANSIENT_ERRORS = RETRYABLE_ERRORS + (
+    ProviderUnavailableError,
+    OperationalError,
+    ConnectionError,
+    TimeoutError,
+)
+
+# Status HTTP de provedores (transcrição, webhooks) que valem nova tentativa
+_RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+def is_retryable(error: BaseException) -> bool:
+    """True para falhas transitórias; erros de entrada ou de código são fatais"""
+    if isinstance(error, _TRANSIENT_ERRORS):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in _RETRYABLE_STATUS
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in _RETRYABLE_STATUS
+    if isinstance(error, DBAPIError):
+        return bool(error.connection_invalidated)
+    cause = error.__cause__
+    return cause is not None and cause is not error and is_retryable(cause)
+
+def is_outage(error: BaseException) -> bool:
+    """
+    Provedor fora do ar (circuit breaker aberto, 429/5xx em série): adiar
+    sem gastar o limite de tentativas, para a fila drenar sozinha quando
+    ele voltar
+    """
+    return isinstance(error, ProviderUnavailableError)
+
+def backoff_delay(attempt: int, base: Optional[float] = None, cap: Optional[float] = None) -> float:
+    """
+    Atraso antes da tentativa seguinte a ``attempt`` (a partir de 1):
+    exponencial limitado a ``cap``, com jitter sobre a metade superior
+    para espalhar as retentativas de um mesmo incidente
+    """
+    base = settings.JOB_RETRY_BASE_SECONDS if base is None else base
+    cap = settings.JOB_RETRY_MAX_SECONDS if cap is None else cap
+    delay = min(cap, base * 2 ** max(0, attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
@@ -1,44 +1,149 @@
-import openai
 from ..config import settings
+from .audio_preprocessing import audio_preprocessor
+from .transcription_backends import TranscriptionBackend, transcription_backends
+from .result_cache import result_cache
+from .monitoring import transcription_chunks
+from .hedging import Hedger
+from .pipeline import pipeline_stages
+import asyncio
 import logging
-import tempfile
-import os
+import re
+from typing import List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+def _normalize_words(text: str) -> List[str]:
+    return [word.lower() for word in _WORD_RE.findall(text)]
+
+def stitch_transcripts(parts: List[str], max_overlap_words: int = 20, min_overlap_words: int = 2) -> str:
+    """
+    Join chunk transcripts, dropping the words each chunk repeats from the
+    end of the previous one (the audio overlap is transcribed twice).
+
+    The overlap is the longest run of up to ``max_overlap_words`` words
+    that ends the previous part and starts the next one, compared without
+    case or punctuation.
+    """
+    stitched: List[str] = []
+    previous_words: List[str] = []
+
+    for part in parts:
+        part = part.strip()
+        if not part:
+            continue
+
+        tokens = part.split()
+        words = _normalize_words(part)
+        overlap = 0
+        for size in range(min(max_overlap_words, len(previous_words), len(words)), min_overlap_words - 1, -1):
+            if previous_words[-size:] == words[:size]:
+                overlap = size
+                break
+
+        if overlap:
+            # Descarta tokens até consumir ``overlap`` palavras normalizadas
+            consumed = 0
+            while tokens and consumed < overlap:
+                consumed += len(_normalize_words(tokens.pop(0)))
+            part = " ".join(tokens)
+
+        if part:
+            stitched.append(part)
+        previous_words = (previous_words + words)[-max_overlap_words:]
+
+    return " ".join(stitched)
+
+# Limite global de uploads de trechos simultâneos, compartilhado entre áudios
+_chunk_semaphore = asyncio.Semaphore(settings.TRANSCRIPTION_MAX_PARALLEL_CHUNKS)
+
+hedger = Hedger(
+    percentile=settings.TRANSCRIPTION_HEDGE_PERCENTILE,
+    budget_ratio=settings.TRANSCRIPTION_HEDGE_BUDGET,
+    default_delay=settings.TRANSCRIPTION_HEDGE_DEFAULT_DELAY
+)
+
 class TranscriptionService:
-    def __init__(self):
-        openai.api_key = settings.OPENAI_API_KEY
-    
-    async def transcribe_audio(self, audio_bytes: bytes) -> str:
+    async def transcribe_audio(self, audio_bytes: bytes, backend: Optional[TranscriptionBackend] = None) -> str:
         """
-        Transcribe audio using OpenAI Whisper API
+        Transcribe audio with the given backend (the configured default
+        when omitted; see transcription_backends.select)
+
+        The audio is first trimmed and re-encoded by the pre-processing
+        stage (raises NoSpeechError for silent audio, before any API call),
+        then streamed straight from memory to the backend. Long audio is split at silences into overlapping
+        chunks transcribed concurrently and stitched back together. Each
+        request is hedged against TRANSCRIPTION_HEDGE_BACKEND when the
+        primary is slower than its learned latency percentile.
+        Byte-identical audio is served from the result cache, keyed by the
+        backend that actually produced the text (a hedge win is cached under
+        the alternate backend; mixed chunked results are not cached).
+        Pre-processing and transcription hold slots of the "decode" and
+        "transcribe" pipeline stages respectively.
         """
-        try:
-            # Create temporary file to save audio
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.ogg') as temp_file:
-                temp_file.write(audio_bytes)
-                temp_file_path = temp_file.name
-            
-            try:
-                # Use OpenAI Whisper API for transcription
-                with open(temp_file_path, 'rb') as audio_file:
-                    response = await openai.Audio.atranscribe(
-                        model="whisper-1",
-                        file=audio_file,
-                        language="pt"  # Portuguese
+        backend = backend or transcription_backends.select()
+        audio_hash = result_cache.content_hash(audio_bytes)
+        cached = await result_cache.get(
+            "transcription", backend.cache_model, settings.TRANSCRIPTION_PROMPT_VERSION, audio_hash
+        )
+        if cached is not None:
+            return cached["text"]
+
+        async with pipeline_stages.slot("decode"):
+            prepared = await audio_preprocessor.process(
+                audio_bytes,
+                chunk_seconds=settings.TRANSCRIPTION_CHUNK_SECONDS,
+                min_chunked_seconds=settings.TRANSCRIPTION_CHUNK_MIN_SECONDS,
+                overlap_seconds=settings.TRANSCRIPTION_CHUNK_OVERLAP_SECONDS
             )
-            
-                return response.text
-                
-            finally:
-                # Clean up temporary file
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
-                    
+
+        try:
+            async with pipeline_stages.slot("transcribe"):
+                if prepared.chunks:
+                    transcription_chunks.observe(len(prepared.chunks))
+                    results = await asyncio.gather(*(
+                        self._transcribe_chunk(backend, chunk) for chunk in prepared.chunks
+                    ))
+                    text = stitch_transcripts([part for _, part in results])
+                    producers = {winner.cache_model for winner, _ in results}
+                else:
+                    transcription_chunks.observe(1)
+                    winner, text = await self._hedged(backend, prepared.audio)
+                    producers = {winner.cache_model}
+
+            if len(producers) == 1:
+                await result_cache.set(
+                    "transcription", producers.pop(), settings.TRANSCRIPTION_PROMPT_VERSION,
+                    audio_hash, {"text": text}
+                )
+            return text
+
         except Exception as e:
-            logger.error(f"Error transcribing audio: {e}")
+            logger.error(f"Error transcribing audio with {backend.name}: {e}")
             raise
 
+    async def _transcribe_chunk(
+        self, backend: TranscriptionBackend, chunk: bytes
+    ) -> Tuple[TranscriptionBackend, str]:
+        async with _chunk_semaphore:
+            return await self._hedged(backend, chunk)
+
+    async def _hedged(
+        self, backend: TranscriptionBackend, audio: bytes
+    ) -> Tuple[TranscriptionBackend, str]:
+        """Transcreve com hedge; devolve também o backend que produziu o texto"""
+        alternate = transcription_backends.hedge_for(backend)
+        return await hedger.run(
+            backend.name,
+            lambda: self._produced_by(backend, audio),
+            alternate.name if alternate else None,
+            (lambda: self._produced_by(alternate, audio)) if alternate else None
+        )
+
+    @staticmethod
+    async def _produced_by(backend: TranscriptionBackend, audio: bytes) -> Tuple[TranscriptionBackend, str]:
+        return backend, await backend.transcribe(audio)
+
 # Backward compatibility alias
-DeepgramService = TranscriptionService 
\ No newline at end of file
+DeepgramService = TranscriptionService
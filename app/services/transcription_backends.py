@@ -0,0 +1,271 @@
+"""
+Backends de transcrição
+OpenAI (Whisper/gpt-4o-transcribe), Deepgram e um motor local em CPU
+(faster-whisper int8), selecionáveis por plano ou por tenant
+"""
+import asyncio
+import io
+from abc import ABC, abstractmethod
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from ..config import settings
+from ..models import PlanType
+from .ai_guard import openai_guard
+from .openai import get_async_client
+
+logger = logging.getLogger(__name__)
+
+# Assinaturas dos containers que recebemos (nota de voz do WhatsApp é Ogg/Opus)
+_AUDIO_SIGNATURES = (
+    (b"OggS", "audio.ogg", "audio/ogg"),
+    (b"RIFF", "audio.wav", "audio/wav"),
+    (b"ID3", "audio.mp3", "audio/mpeg"),
+    (b"\xff\xfb", "audio.mp3", "audio/mpeg"),
+    (b"\x1a\x45\xdf\xa3", "audio.webm", "audio/webm"),
+    (b"fLaC", "audio.flac", "audio/flac"),
+)
+
+def audio_file_meta(audio_bytes: bytes) -> Tuple[str, str]:
+    """
+    Filename and MIME type for an audio payload, sniffed from its header
+    """
+    for signature, filename, mime_type in _AUDIO_SIGNATURES:
+        if audio_bytes.startswith(signature):
+            return filename, mime_type
+    if audio_bytes[4:8] == b"ftyp":
+        return "audio.m4a", "audio/mp4"
+    return "audio.ogg", "audio/ogg"
+
+class TranscriptionBackendError(Exception):
+    """Backend indisponível ou mal configurado"""
+
+class TranscriptionBackend(ABC):
+    """Interface comum: bytes de áudio -> texto"""
+
+    name: str = ""
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @property
+    def cache_model(self) -> str:
+        """Identifica backend + modelo na chave do cache de resultados"""
+        return f"{self.name}:{self.model}"
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    @abstractmethod
+    async def transcribe(self, audio: bytes) -> str:
+        """Texto transcrito de ``audio``"""
+
+    async def close(self):
+        pass
+
+class OpenAITranscriptionBackend(TranscriptionBackend):
+    """API de transcrição da OpenAI sobre o cliente compartilhado"""
+
+    name = "openai"
+
+    @property
+    def available(self) -> bool:
+        return bool(settings.OPENAI_API_KEY)
+
+    async def transcribe(self, audio: bytes) -> str:
+        filename, mime_type = audio_file_meta(audio)
+        response = await openai_guard.call(
+            lambda: get_async_client().audio.transcriptions.create(
+                model=self.model,
+                file=(filename, audio, mime_type),
+                language="pt"  # Portuguese
+            ),
+            operation="transcription"
+        )
+        return response.text
+
+class DeepgramTranscriptionBackend(TranscriptionBackend):
+    """API pré-gravada da Deepgram (corpo binário, sem multipart)"""
+
+    name = "deepgram"
+    url = "https://api.deepgram.com/v1/listen"
+
+    def __init__(self, model: str, language: str, api_key: str):
+        super().__init__(model)
+        self.language = language
+        self.api_key = api_key
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=settings.DEEPGRAM_TIMEOUT_SECONDS,
+                limits=httpx.Limits(
+                    max_connections=settings.DEEPGRAM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.DEEPGRAM_MAX_KEEPALIVE
+                )
+            )
+        return self._client
+
+    async def transcribe(self, audio: bytes) -> str:
+        if not self.api_key:
+            raise TranscriptionBackendError("DEEPGRAM_API_KEY is not configured")
+
+        _, mime_type = audio_file_meta(audio)
+        response = await self._http().post(
+            self.url,
+            params={"model": self.model, "language": self.language, "smart_format": "true"},
+            headers={"Authorization": f"Token {self.api_key}", "Content-Type": mime_type},
+            content=audio
+        )
+        response.raise_for_status()
+        channels = response.json()["results"]["channels"]
+        return channels[0]["alternatives"][0]["transcript"] if channels else ""
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """
+    faster-whisper (CTranslate2) em CPU com quantização int8.
+
+    Dependência opcional: sem o pacote ``faster-whisper`` instalado o backend
+    fica indisponível. O modelo é carregado uma vez, na primeira chamada, e
+    a inferência roda em threads para não bloquear o event loop.
+    """
+
+    name = "local"
+
+    def __init__(self, model: str, compute_type: str, cpu_threads: int, workers: int):
+        super().__init__(model)
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.workers = workers
+        self._model = None
+        self._load_lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(workers)
+
+    @property
+    def cache_model(self) -> str:
+        return f"{self.name}:{self.model}:{self.compute_type}"
+
+    @property
+    def available(self) -> bool:
+        try:
+            import faster_whisper  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    async def _load(self):
+        async with self._load_lock:
+            if self._model is None:
+                try:
+                    from faster_whisper import WhisperModel
+                except ImportError as e:
+                    raise TranscriptionBackendError("faster-whisper is not installed") from e
+
+                logger.info(f"Loading local Whisper model {self.model} ({self.compute_type})")
+                self._model = await asyncio.to_thread(
+                    WhisperModel,
+                    self.model,
+                    device="cpu",
+                    compute_type=self.compute_type,
+                    cpu_threads=self.cpu_threads,
+                    num_workers=self.workers
+                )
+        return self._model
+
+    def _run(self, model, audio: bytes) -> str:
+        segments, _ = model.transcribe(io.BytesIO(audio), language="pt", vad_filter=False, beam_size=1)
+        return " ".join(segment.text.strip() for segment in segments)
+
+    async def transcribe(self, audio: bytes) -> str:
+        model = self._model or await self._load()
+        async with self._semaphore:
+            return await asyncio.to_thread(self._run, model, audio)
+
+class TranscriptionBackendRegistry:
+    """
+    Resolve o backend de cada transcrição: override do tenant, depois o
+    do plano, depois o padrão. Backends indisponíveis caem no padrão.
+    """
+
+    def __init__(
+        self,
+        backends: List[TranscriptionBackend],
+        default: str,
+        by_plan: Dict[str, str],
+        by_tenant: Dict[int, str],
+        hedge_backend: str = ""
+    ):
+        self.backends = {backend.name: backend for backend in backends}
+        self.default = default
+        self.by_plan = by_plan
+        self.by_tenant = by_tenant
+        self.hedge_backend = hedge_backend
+
+    def get(self, name: str) -> TranscriptionBackend:
+        try:
+            return self.backends[name]
+        except KeyError:
+            raise TranscriptionBackendError(f"Unknown transcription backend: {name}")
+
+    def select(self, tenant_id: Optional[int] = None, plan: Optional[PlanType] = None) -> TranscriptionBackend:
+        name = self.by_tenant.get(tenant_id) if tenant_id is not None else None
+        if name is None and plan is not None:
+            name = self.by_plan.get(PlanType(plan).value)
+
+        backend = self.backends.get(name or self.default)
+        if backend is None or not backend.available:
+            if name:
+                logger.warning(f"Transcription backend {name} unavailable, using {self.default}")
+            backend = self.get(self.default)
+        return backend
+
+    def hedge_for(self, backend: TranscriptionBackend) -> Optional[TranscriptionBackend]:
+        """Backend alternativo para hedge, se configurado e diferente do primário"""
+        alternate = self.backends.get(self.hedge_backend)
+        if alternate is None or alternate is backend or not alternate.available:
+            return None
+        return alternate
+
+    def status(self) -> Dict[str, bool]:
+        return {name: backend.available for name, backend in self.backends.items()}
+
+    async def close(self):
+        for backend in self.backends.values():
+            await backend.close()
+
+
+# Instância global do serviço
+transcription_backends = TranscriptionBackendRegistry(
+    backends=[
+        OpenAITranscriptionBackend(model=settings.OPENAI_MODEL),
+        DeepgramTranscriptionBackend(
+            model=settings.DEEPGRAM_MODEL,
+            language=settings.DEEPGRAM_LANGUAGE,
+            api_key=settings.DEEPGRAM_API_KEY
+        ),
+        LocalWhisperBackend(
+            model=settings.LOCAL_WHISPER_MODEL,
+            compute_type=settings.LOCAL_WHISPER_COMPUTE_TYPE,
+            cpu_threads=settings.LOCAL_WHISPER_CPU_THREADS or os.cpu_count() or 1,
+            workers=settings.LOCAL_WHISPER_WORKERS
+        )
+    ],
+    default=settings.TRANSCRIPTION_BACKEND,
+    by_plan=settings.TRANSCRIPTION_BACKEND_BY_PLAN,
+    by_tenant=settings.TRANSCRIPTION_BACKEND_BY_TENANT,
+    hedge_backend=settings.TRANSCRIPTION_HEDGE_BACKEND
+)
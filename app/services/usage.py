@@ -4,13 +4,45 @@ Sistema para enforçar limites por plano e rastrear uso
 """
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
-from sqlmodel import Session, select, func
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 from fastapi import HTTPException, status
+from ..config import settings
+from ..database import async_session_maker
 from ..models import User, UsageTracking, PlanType, FeatureType, PLAN_LIMITS
+from ..repositories import UsageTrackingRepository, UserRepository
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+def usage_increment(user_id: int, when: datetime, **increments: int):
+    """
+    Soma ``increments`` aos contadores da linha de ``UsageTracking`` do mês
+    de ``when``, criando-a se preciso, num único ``INSERT ... ON CONFLICT DO
+    UPDATE`` (sem a corrida do ler-e-depois-inserir entre instâncias)
+    """
+    statement = insert(UsageTracking).values(
+        user_id=user_id,
+        year=when.year,
+        month=when.month,
+        created_at=when,
+        updated_at=when,
+        **increments
+    )
+    return statement.on_conflict_do_update(
+        constraint="uq_usagetracking_user_month",
+        set_={
+            **{
+                name: getattr(UsageTracking, name) + getattr(statement.excluded, name)
+                for name in increments
+            },
+            "updated_at": statement.excluded.updated_at
+        }
+    )
+
 class UsageError(HTTPException):
     """Exceção personalizada para erros de uso"""
     pass
@@ -18,14 +50,18 @@ class UsageError(HTTPException):
 class UsageService:
     """Serviço para gerenciar uso e guardrails"""
     
-    def __init__(self):
+    def __init__(self, session_maker=async_session_maker):
         self.plan_limits = PLAN_LIMITS
+        self.session_maker = session_maker
+        # user_id -> [entrada, entrada em cache, saída] ainda não gravados
+        self._pending_tokens: Dict[int, List[int]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
     
     # ==============================================
     # VERIFICAÇÃO DE LIMITES
     # ==============================================
     
-    async def check_audio_limit(self, user: User, db: Session) -> bool:
+    async def check_audio_limit(self, user: User, db: AsyncSession) -> bool:
         """Verifica se o usuário pode processar mais áudios este mês"""
         
         # Atualiza contador se necessário
@@ -64,26 +100,32 @@ class UsageService:
     # TRACKING DE USO
     # ==============================================
     
-    async def increment_audio_usage(self, user: User, db: Session) -> None:
+    async def increment_audio_usage(self, user: User, db: AsyncSession) -> None:
         """Incrementa o uso de áudios do usuário"""
         
         # Verifica limite primeiro
         await self.check_audio_limit(user, db)
         
-        # Incrementa contador
-        user.current_month_audios += 1
-        user.updated_at = datetime.utcnow()
+        # Incrementa contador no banco: ingestões simultâneas do mesmo
+        # tenant não perdem incrementos
+        now = datetime.utcnow()
+        result = await db.execute(
+            update(User)
+            .where(User.id == user.id)
+            .values(current_month_audios=User.current_month_audios + 1, updated_at=now)
+            .returning(User.current_month_audios)
+            .execution_options(synchronize_session=False)
+        )
+        # Reflete no objeto sem marcá-lo como alterado (o flush não regrava)
+        set_committed_value(user, "current_month_audios", result.scalar_one())
+        set_committed_value(user, "updated_at", now)
         
-        # Atualiza tracking detalhado
+        # Atualiza tracking detalhado (faz o commit dos dois incrementos)
         await self._update_usage_tracking(user, db, "audios_processed", 1)
         
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-        
         logger.info(f"Uso de áudio incrementado para usuário {user.email}: {user.current_month_audios}/{self.plan_limits[user.plan_type]['monthly_audios']}")
     
-    async def increment_ai_usage(self, user: User, db: Session, ai_type: FeatureType) -> None:
+    async def increment_ai_usage(self, user: User, db: AsyncSession, ai_type: FeatureType) -> None:
         """Incrementa o uso de IA do usuário"""
         
         # Verifica acesso à feature
@@ -102,7 +144,7 @@ class UsageService:
         
         logger.info(f"Uso de IA {ai_type.value} incrementado para usuário {user.email}")
     
-    async def increment_feature_usage(self, user: User, db: Session, feature: FeatureType) -> None:
+    async def increment_feature_usage(self, user: User, db: AsyncSession, feature: FeatureType) -> None:
         """Incrementa o uso de uma feature específica"""
         
         # Verifica acesso à feature
@@ -120,11 +162,73 @@ class UsageService:
         
         logger.info(f"Uso de feature {feature.value} incrementado para usuário {user.email}")
     
+    # ==============================================
+    # TOKENS DE IA
+    # ==============================================
+    
+    def record_ai_tokens(self, user_id: int, input_tokens: int, cached_tokens: int, output_tokens: int) -> None:
+        """
+        Acumula em memória os tokens consumidos pelo tenant; o total é
+        gravado em ``UsageTracking`` a cada AI_USAGE_FLUSH_SECONDS
+        """
+        pending = self._pending_tokens.setdefault(user_id, [0, 0, 0])
+        pending[0] += input_tokens
+        pending[1] += cached_tokens
+        pending[2] += output_tokens
+    
+    async def flush_ai_tokens(self) -> None:
+        """
+        Grava os tokens acumulados com um upsert incremental por tenant
+        (``INSERT ... ON CONFLICT DO UPDATE`` na linha do mês, sem corrida
+        com a criação da linha por outra instância)
+        """
+        if not self._pending_tokens:
+            return
+        
+        pending, self._pending_tokens = self._pending_tokens, {}
+        current_date = datetime.utcnow()
+        try:
+            async with self.session_maker() as db:
+                for user_id, (input_tokens, cached_tokens, output_tokens) in pending.items():
+                    await db.execute(usage_increment(
+                        user_id,
+                        current_date,
+                        ai_input_tokens=input_tokens,
+                        ai_cached_tokens=cached_tokens,
+                        ai_output_tokens=output_tokens
+                    ))
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Erro ao gravar uso de tokens de {len(pending)} tenants: {e}")
+            # Devolve ao buffer para a próxima tentativa
+            for user_id, values in pending.items():
+                self.record_ai_tokens(user_id, *values)
+    
+    def start_token_flush(self):
+        """Inicia a gravação periódica dos tokens no event loop atual"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def stop_token_flush(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush_ai_tokens()
+    
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(settings.AI_USAGE_FLUSH_SECONDS)
+            await self.flush_ai_tokens()
+    
     # ==============================================
     # RELATÓRIOS DE USO
     # ==============================================
     
-    async def get_usage_summary(self, user: User, db: Session) -> Dict[str, Any]:
+    async def get_usage_summary(self, user: User, db: AsyncSession) -> Dict[str, Any]:
         """Retorna resumo do uso atual do usuário"""
         
         # Garante reset mensal
@@ -135,12 +239,7 @@ class UsageService:
         
         # Tracking detalhado do mês atual
         current_month = datetime.utcnow()
-        stmt = select(UsageTracking).where(
-            UsageTracking.user_id == user.id,
-            UsageTracking.year == current_month.year,
-            UsageTracking.month == current_month.month
-        )
-        tracking = db.exec(stmt).first()
+        tracking = await UsageTrackingRepository(db).for_month(user.id, current_month.year, current_month.month)
         
         return {
             "plan_type": user.plan_type.value,
@@ -160,13 +259,16 @@ class UsageService:
                 "advanced_ai_calls": tracking.advanced_ai_calls if tracking else 0,
                 "custom_ai_calls": tracking.custom_ai_calls if tracking else 0,
                 "reports_generated": tracking.reports_generated if tracking else 0,
-                "api_calls": tracking.api_calls if tracking else 0
+                "api_calls": tracking.api_calls if tracking else 0,
+                "ai_input_tokens": tracking.ai_input_tokens if tracking else 0,
+                "ai_cached_tokens": tracking.ai_cached_tokens if tracking else 0,
+                "ai_output_tokens": tracking.ai_output_tokens if tracking else 0
             } if tracking else {},
             "month_start": user.current_month_start.isoformat(),
             "next_reset": (user.current_month_start + timedelta(days=32)).replace(day=1).isoformat()
         }
     
-    async def get_upgrade_recommendations(self, user: User, db: Session) -> List[Dict[str, Any]]:
+    async def get_upgrade_recommendations(self, user: User, db: AsyncSession) -> List[Dict[str, Any]]:
         """Retorna recomendações de upgrade baseadas no uso"""
         
         usage_summary = await self.get_usage_summary(user, db)
@@ -201,7 +303,7 @@ class UsageService:
     # UTILITÁRIOS INTERNOS
     # ==============================================
     
-    async def _ensure_monthly_reset(self, user: User, db: Session) -> None:
+    async def _ensure_monthly_reset(self, user: User, db: AsyncSession) -> None:
         """
         Garante que APENAS OS CONTADORES DE USO sejam resetados mensalmente
         IMPORTANTE: A elegibilidade para free tier (has_used_free_tier) é VITALÍCIA
@@ -223,41 +325,15 @@ class UsageService:
             # - user.free_tier_started_at (data histórica)
             # - user.cnpj (dados da empresa)
             
-            db.add(user)
-            db.commit()
-            db.refresh(user)
+            await UserRepository(db).save(user, refresh=True)
             
             logger.info(f"Contadores mensais resetados para usuário {user.email}")
             logger.info(f"CNPJ {user.cnpj} mantém restrição VITALÍCIA de free tier")
     
-    async def _update_usage_tracking(self, user: User, db: Session, field_name: str, increment: int = 1) -> None:
-        """Atualiza o tracking detalhado de uso"""
-        
-        current_date = datetime.utcnow()
-        
-        # Busca ou cria entrada de tracking do mês atual
-        stmt = select(UsageTracking).where(
-            UsageTracking.user_id == user.id,
-            UsageTracking.year == current_date.year,
-            UsageTracking.month == current_date.month
-        )
-        tracking = db.exec(stmt).first()
-        
-        if not tracking:
-            tracking = UsageTracking(
-                user_id=user.id,
-                year=current_date.year,
-                month=current_date.month
-            )
-            db.add(tracking)
-        
-        # Incrementa o campo específico
-        current_value = getattr(tracking, field_name, 0)
-        setattr(tracking, field_name, current_value + increment)
-        tracking.updated_at = current_date
-        
-        db.commit()
-        db.refresh(tracking)
+    async def _update_usage_tracking(self, user: User, db: AsyncSession, field_name: str, increment: int = 1) -> None:
+        """Atualiza o tracking detalhado de uso (upsert atômico na linha do mês)"""
+        await db.execute(usage_increment(user.id, datetime.utcnow(), **{field_name: increment}))
+        await db.commit()
     
     # ==============================================
     # DECORATORS / MIDDLEWARES
@@ -274,7 +350,7 @@ class UsageService:
     
     def require_audio_limit(self, func):
         """Decorator para verificar limite de áudios"""
-        async def wrapper(user: User, db: Session, *args, **kwargs):
+        async def wrapper(user: User, db: AsyncSession, *args, **kwargs):
             await self.check_audio_limit(user, db)
             return await func(user, db, *args, **kwargs)
         return wrapper
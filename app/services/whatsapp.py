@@ -1,86 +1,708 @@
 import asyncio
 import json
 import logging
-from typing import Optional
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 import os
+import random
+import re
+import struct
+import time
+import zlib
 from pathlib import Path
-import subprocess
 from ..config import settings
+from .monitoring import (
+    whatsapp_listener_up,
+    whatsapp_listener_restarts,
+    whatsapp_listener_last_start
+)
 
 logger = logging.getLogger(__name__)
+baileys_logger = logging.getLogger("baileys")
+
+# Formato dos registros gravados por whatsapp/spool.js
+SPOOL_RECORD_MAGIC = 0x4F50534C  # "OPSL"
+_SPOOL_RECORD_PREFIX = struct.Struct(">IIII")  # magic, header_len, payload_len, crc32
+_SPOOL_SEGMENT_PATTERN = re.compile(r"^segment-(\d+)\.log$")
+
+SpoolHandler = Callable[[Dict[str, Any], bytes], Awaitable[None]]
+
+class SpoolCorruptionError(Exception):
+    """Registro do spool com magic ou checksum inválido"""
+    pass
+
+@dataclass
+class SpoolRecord:
+    segment: int
+    offset: int
+    next_offset: int
+    header: Dict[str, Any]
+    payload: bytes
+
+class SpoolConsumer:
+    """
+    Drena o spool em disco escrito pelo Baileys listener (whatsapp/spool.js).
+
+    A posição consumida fica em ``index.json`` e só avança depois que o
+    handler processa o registro (ou que ele foi estacionado), garantindo
+    entrega at-least-once mesmo se a API reiniciar no meio do processamento.
+    Segmentos lidos por completo são removidos, o que mantém o uso de disco
+    limitado.
+
+    Um registro que falha não segura os que vêm atrás: é copiado para
+    ``retry/`` com sua própria contagem de tentativas e o índice segue em
+    frente. Estacionados são retentados com backoff exponencial a partir de
+    ``retry_backoff`` segundos e, após ``max_attempts`` falhas, movidos para
+    ``dead/``.
+    """
+    
+    def __init__(
+        self,
+        spool_dir: str,
+        handler: SpoolHandler,
+        poll_interval: float = 0.5,
+        max_attempts: int = 5,
+        retry_backoff: float = 5.0
+    ):
+        self.spool_dir = Path(spool_dir)
+        self.index_path = self.spool_dir / "index.json"
+        self.retry_path = self.spool_dir / "retry"
+        self.dead_letter_path = self.spool_dir / "dead"
+        self.handler = handler
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """
+        Inicia o loop de consumo no event loop atual
+
+        O diretório é criado aqui, e não no import, para que um spool sem
+        permissão de escrita não impeça a API de subir; nesse caso o
+        consumidor fica parado e o erro é registrado.
+        """
+        if self._task is None or self._task.done():
+            try:
+                self.spool_dir.mkdir(parents=True, exist_ok=True)
+            except OSError as e:
+                logger.error(f"Audio spool consumer not started, cannot create {self.spool_dir}: {e}")
+                return
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Started audio spool consumer on {self.spool_dir}")
+    
+    async def stop(self):
+        """Interrompe o loop de consumo"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.drain()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error draining audio spool: {e}")
+                processed = 0
+            
+            if not processed:
+                await asyncio.sleep(self.poll_interval)
+    
+    async def drain(self) -> int:
+        """
+        Processa os estacionados vencidos e todos os registros disponíveis;
+        retorna quantos foram entregues
+        """
+        processed = await self._drain_parked()
+        segment, offset = self._load_index()
+        segments = self._list_segments()
+        
+        for position, seq in enumerate(segments):
+            if seq < segment:
+                # Sobra de um segmento já consumido (ex.: crash antes do unlink)
+                self._remove_segment(seq)
+                continue
+            if seq > segment:
+                segment, offset = seq, 0
+            
+            # Só o último segmento ainda recebe escritas do listener
+            sealed = position < len(segments) - 1
+            
+            while True:
+                try:
+                    record = await asyncio.to_thread(self._read_record, seq, offset)
+                except SpoolCorruptionError as e:
+                    if not sealed:
+                        # Escrita em andamento; tenta novamente no próximo ciclo
+                        return processed
+                    logger.error(f"Skipping corrupted tail of spool segment {seq} at offset {offset}: {e}")
+                    break
+                
+                if record is None:
+                    if not sealed:
+                        return processed
+                    if offset < self._segment_path(seq).stat().st_size:
+                        logger.error(f"Skipping truncated record in spool segment {seq} at offset {offset}")
+                    break
+                
+                if await self._deliver(record):
+                    processed += 1
+                
+                offset = record.next_offset
+                self._save_index(seq, offset)
+            
+            # Segmento selado e consumido por completo
+            self._save_index(seq + 1, 0)
+            self._remove_segment(seq)
+        
+        return processed
+    
+    async def _deliver(self, record: SpoolRecord) -> bool:
+        """
+        Entrega um registro ao handler; se falhar, estaciona-o (ou, com
+        ``max_attempts`` esgotado, move para ``dead/``) e retorna False
+        """
+        try:
+            await self.handler(record.header, record.payload)
+            return True
+        except Exception as e:
+            name = self._record_name(record.header, record.segment, record.offset)
+            await asyncio.to_thread(self._fail, name, record.header, record.payload, 1, str(e))
+            return False
+    
+    async def _drain_parked(self) -> int:
+        """Retenta os registros de ``retry/`` cujo backoff já venceu"""
+        if not self.retry_path.exists():
+            return 0
+        
+        processed = 0
+        now = time.time()
+        for meta_path in sorted(self.retry_path.glob("*.json")):
+            try:
+                meta = json.loads(meta_path.read_text())
+                payload = meta_path.with_suffix(".ogg").read_bytes()
+            except (OSError, ValueError) as e:
+                logger.error(f"Unreadable parked spool record {meta_path.name}: {e}")
+                continue
+            if meta["retry_at"] > now:
+                continue
+            
+            header, attempts = meta["header"], meta["attempts"]
+            try:
+                await self.handler(header, payload)
+            except Exception as e:
+                await asyncio.to_thread(self._fail, meta_path.stem, header, payload, attempts + 1, str(e))
+                continue
+            
+            meta_path.unlink()
+            meta_path.with_suffix(".ogg").unlink(missing_ok=True)
+            processed += 1
+        return processed
+    
+    def _fail(self, name: str, header: Dict[str, Any], payload: bytes, attempts: int, error: str):
+        """Registra a falha número ``attempts``: estaciona para retentar ou move para ``dead/``"""
+        message_id = header.get("message_id")
+        if attempts >= self.max_attempts:
+            logger.error(f"Moving spooled audio {message_id} to dead-letter after {attempts} attempts: {error}")
+            self._dead_letter(name, header, payload, error)
+            self._unpark(name)
+            return
+        
+        delay = self.retry_backoff * 2 ** (attempts - 1)
+        logger.warning(
+            f"Spooled audio {message_id} failed (attempt {attempts}/{self.max_attempts}), "
+            f"retrying in {delay:.1f}s: {error}"
+        )
+        self.retry_path.mkdir(exist_ok=True)
+        payload_path = self.retry_path / f"{name}.ogg"
+        if not payload_path.exists():
+            payload_path.write_bytes(payload)
+        # O .json é gravado por último e de forma atômica: só ele torna o
+        # registro visível para _drain_parked
+        meta_path = self.retry_path / f"{name}.json"
+        tmp_path = meta_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({
+            "header": header,
+            "attempts": attempts,
+            "retry_at": time.time() + delay,
+            "error": error
+        }))
+        os.replace(tmp_path, meta_path)
+    
+    def _unpark(self, name: str):
+        (self.retry_path / f"{name}.json").unlink(missing_ok=True)
+        (self.retry_path / f"{name}.ogg").unlink(missing_ok=True)
+    
+    @staticmethod
+    def _record_name(header: Dict[str, Any], segment: int, offset: int) -> str:
+        return header.get("message_id") or f"{segment}-{offset}"
+    
+    def _dead_letter(self, name: str, header: Dict[str, Any], payload: bytes, error: str):
+        self.dead_letter_path.mkdir(exist_ok=True)
+        (self.dead_letter_path / f"{name}.ogg").write_bytes(payload)
+        (self.dead_letter_path / f"{name}.json").write_text(
+            json.dumps({**header, "error": error})
+        )
+    
+    def _segment_path(self, seq: int) -> Path:
+        return self.spool_dir / f"segment-{seq:012d}.log"
+    
+    def _list_segments(self) -> List[int]:
+        segments = []
+        for entry in self.spool_dir.iterdir():
+            match = _SPOOL_SEGMENT_PATTERN.match(entry.name)
+            if match:
+                segments.append(int(match.group(1)))
+        return sorted(segments)
+    
+    def _remove_segment(self, seq: int):
+        try:
+            self._segment_path(seq).unlink()
+        except FileNotFoundError:
+            pass
+    
+    def _load_index(self) -> Tuple[int, int]:
+        try:
+            data = json.loads(self.index_path.read_text())
+            return int(data["segment"]), int(data["offset"])
+        except FileNotFoundError:
+            return 0, 0
+        except Exception as e:
+            logger.error(f"Invalid spool index, restarting from the oldest segment: {e}")
+            return 0, 0
+    
+    def _save_index(self, segment: int, offset: int):
+        # Escrita atômica: um crash nunca deixa o índice pela metade
+        tmp_path = self.index_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"segment": segment, "offset": offset}))
+        os.replace(tmp_path, self.index_path)
+    
+    def _read_record(self, seq: int, offset: int) -> Optional[SpoolRecord]:
+        """Lê o registro na posição; retorna None se ainda não estiver completo"""
+        with open(self._segment_path(seq), "rb") as f:
+            f.seek(offset)
+            prefix = f.read(_SPOOL_RECORD_PREFIX.size)
+            if len(prefix) < _SPOOL_RECORD_PREFIX.size:
+                return None
+            
+            magic, header_len, payload_len, crc = _SPOOL_RECORD_PREFIX.unpack(prefix)
+            if magic != SPOOL_RECORD_MAGIC:
+                raise SpoolCorruptionError(f"bad magic {magic:#x}")
+            
+            header_bytes = f.read(header_len)
+            payload = f.read(payload_len)
+            if len(header_bytes) < header_len or len(payload) < payload_len:
+                return None
+        
+        if zlib.crc32(payload, zlib.crc32(header_bytes)) != crc:
+            raise SpoolCorruptionError("checksum mismatch")
+        
+        return SpoolRecord(
+            segment=seq,
+            offset=offset,
+            next_offset=offset + _SPOOL_RECORD_PREFIX.size + header_len + payload_len,
+            header=json.loads(header_bytes),
+            payload=payload
+        )
+
+_IPC_FRAME_PREFIX = struct.Struct(">I")
+_IPC_MAX_FRAME_BYTES = 16 * 1024 * 1024
+
+class IPCError(Exception):
+    """Falha de comunicação com o Baileys listener"""
+    pass
+
+class BaileysIPCClient:
+    """
+    Cliente do protocolo IPC do Baileys listener (whatsapp/ipc.js).
+
+    Frames com tamanho prefixado sobre socket Unix. Cada requisição recebe um
+    id e um future; várias requisições podem estar em voo na mesma conexão e
+    as respostas são casadas pelo id, então envios em massa são pipelined em
+    vez de serializados.
+    """
+    
+    def __init__(self, socket_path: str, request_timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.request_timeout = request_timeout
+        
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._connect_lock: Optional[asyncio.Lock] = None
+    
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+    
+    async def _ensure_connected(self):
+        if self.connected:
+            return
+        
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        
+        async with self._connect_lock:
+            if self.connected:
+                return
+            try:
+                self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+            except OSError as e:
+                raise IPCError(f"Cannot connect to Baileys IPC socket {self.socket_path}: {e}") from e
+            self._read_task = asyncio.create_task(self._read_loop(self._reader))
+    
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                prefix = await reader.readexactly(_IPC_FRAME_PREFIX.size)
+                (length,) = _IPC_FRAME_PREFIX.unpack(prefix)
+                if length > _IPC_MAX_FRAME_BYTES:
+                    raise IPCError(f"IPC frame too large: {length} bytes")
+                
+                reply = json.loads(await reader.readexactly(length))
+                future = self._pending.pop(reply.get("id"), None)
+                if future and not future.done():
+                    future.set_result(reply)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Baileys IPC connection lost: {e}")
+        finally:
+            self._close_connection(IPCError("Baileys IPC connection lost"))
+    
+    def _close_connection(self, error: Exception):
+        if self._writer:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+        
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+    
+    async def request(self, payload: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Envia uma requisição e aguarda a resposta (ack) correspondente"""
+        await self._ensure_connected()
+        
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        
+        body = json.dumps({**payload, "id": request_id}).encode("utf-8")
+        try:
+            self._writer.write(_IPC_FRAME_PREFIX.pack(len(body)) + body)
+            await self._writer.drain()
+            return await asyncio.wait_for(future, timeout or self.request_timeout)
+        except asyncio.TimeoutError as e:
+            raise IPCError(f"Timed out waiting for Baileys ack of request {request_id}") from e
+        except OSError as e:
+            raise IPCError(f"Failed to write to Baileys IPC socket: {e}") from e
+        finally:
+            self._pending.pop(request_id, None)
+    
+    async def close(self):
+        if self._read_task:
+            self._read_task.cancel()
+            try:
+                await self._read_task
+            except asyncio.CancelledError:
+                pass
+            self._read_task = None
+        self._close_connection(IPCError("Baileys IPC client closed"))
+
+# Níveis do pino -> níveis do logging
+_PINO_LEVELS = {
+    10: logging.DEBUG,
+    20: logging.DEBUG,
+    30: logging.INFO,
+    40: logging.WARNING,
+    50: logging.ERROR,
+    60: logging.CRITICAL
+}
+
+class BaileysSupervisor:
+    """
+    Supervisiona o processo Node.js do Baileys listener.
+
+    stdout/stderr são drenados continuamente, então o processo nunca bloqueia
+    ao escrever logs, e cada linha JSON do pino é repassada ao logging da API.
+    Quando o processo morre ele é reiniciado com backoff exponencial com
+    jitter; o contador de tentativas zera depois de ``stable_after`` segundos
+    de execução estável.
+    """
+    
+    _LOG_LINE_LIMIT = 1024 * 1024
+    
+    def __init__(
+        self,
+        command: List[str],
+        env: Optional[Dict[str, str]] = None,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        stable_after: float = 60.0
+    ):
+        self.command = command
+        self.env = env
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.restart_count = 0
+        self.started_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+    
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+    
+    def start(self):
+        """Inicia a supervisão no event loop atual"""
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self, timeout: float = 5.0):
+        """Encerra o processo (SIGTERM, depois SIGKILL) e a supervisão"""
+        self._stopping = True
+        
+        if self.alive:
+            self.process.terminate()
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout)
+            except asyncio.TimeoutError:
+                self.process.kill()
+        
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def next_backoff(self, attempt: int) -> float:
+        """Backoff exponencial limitado com jitter (metade fixa, metade aleatória)"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+    
+    async def _run(self):
+        attempt = 0
+        
+        while not self._stopping:
+            started = time.monotonic()
+            try:
+                await self._run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to start Baileys process: {e}")
+            
+            if self._stopping:
+                break
+            
+            if time.monotonic() - started >= self.stable_after:
+                attempt = 0
+            
+            delay = self.next_backoff(attempt)
+            attempt += 1
+            self.restart_count += 1
+            whatsapp_listener_restarts.inc()
+            
+            logger.error(f"Baileys process exited, restarting in {delay:.1f}s (restart #{self.restart_count})")
+            await asyncio.sleep(delay)
+    
+    async def _run_once(self):
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=self.env,
+            limit=self._LOG_LINE_LIMIT
+        )
+        self.started_at = time.time()
+        whatsapp_listener_up.set(1)
+        whatsapp_listener_last_start.set(self.started_at)
+        logger.info(f"Started Baileys WhatsApp listener (pid {self.process.pid})")
+        
+        try:
+            await asyncio.gather(
+                self._drain(self.process.stdout, logging.INFO),
+                self._drain(self.process.stderr, logging.WARNING),
+                self.process.wait()
+            )
+        finally:
+            whatsapp_listener_up.set(0)
+        
+        logger.warning(f"Baileys process {self.process.pid} exited with code {self.process.returncode}")
+    
+    async def _drain(self, stream: asyncio.StreamReader, default_level: int):
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                # Linha maior que o limite: descarta o restante e segue drenando
+                await stream.read(self._LOG_LINE_LIMIT)
+                continue
+            
+            if not line:
+                return
+            self._forward_log(line, default_level)
+    
+    def _forward_log(self, line: bytes, default_level: int):
+        text = line.decode("utf-8", errors="replace").rstrip()
+        if not text:
+            return
+        
+        try:
+            record = json.loads(text)
+        except ValueError:
+            baileys_logger.log(default_level, text)
+            return
+        
+        if not isinstance(record, dict):
+            baileys_logger.log(default_level, text)
+            return
+        
+        level = _PINO_LEVELS.get(record.pop("level", None), default_level)
+        message = record.pop("msg", "")
+        for key in ("time", "pid", "hostname"):
+            record.pop(key, None)
+        
+        baileys_logger.log(
+            level,
+            f"{message} {json.dumps(record, default=str)}" if record else message,
+            extra={"baileys": record}
+        )
 
 class WhatsAppService:
     def __init__(self):
         """Initialize WhatsApp service with Baileys"""
-        self.process = None
         self.connected = False
         self.auth_path = Path("./auth")
         self.media_path = Path("./audios")
         
+        self.ipc = BaileysIPCClient(settings.WHATSAPP_IPC_SOCKET, settings.WHATSAPP_IPC_TIMEOUT)
+        self.supervisor = BaileysSupervisor(
+            ["node", "whatsapp/baileys-listener.js"],
+            env={
+                **os.environ,
+                "WHATSAPP_SPOOL_DIR": str(Path(settings.WHATSAPP_SPOOL_DIR).resolve()),
+                "WHATSAPP_SPOOL_MAX_BYTES": str(settings.WHATSAPP_SPOOL_MAX_BYTES),
+                "WHATSAPP_IPC_SOCKET": settings.WHATSAPP_IPC_SOCKET
+            },
+            backoff_base=settings.WHATSAPP_RESTART_BACKOFF_BASE,
+            backoff_max=settings.WHATSAPP_RESTART_BACKOFF_MAX
+        )
+        
         # Create directories if they don't exist
         self.auth_path.mkdir(exist_ok=True)
         self.media_path.mkdir(exist_ok=True)
-        
-        # Initialize Node.js process
-        self._start_baileys()
     
-    def _start_baileys(self):
-        """Start Baileys Node.js process"""
-        try:
-            # Start Node.js process
-            self.process = subprocess.Popen(
-                ["node", "whatsapp/baileys-listener.js"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            logger.info("Started Baileys WhatsApp listener")
-        except Exception as e:
-            logger.error(f"Failed to start Baileys process: {e}")
-            self.process = None
+    async def start(self):
+        """Start the supervised Baileys Node.js process"""
+        self.supervisor.start()
+    
+    async def stop(self):
+        """Stop the Baileys process and close the IPC connection"""
+        await self.ipc.close()
+        await self.supervisor.stop()
     
     async def check_connection(self) -> bool:
-        """Check if WhatsApp is connected"""
-        if not self.process:
-            return False
-            
-        # Check if process is still running
-        if self.process.poll() is not None:
-            logger.error("Baileys process died, restarting...")
-            self._start_baileys()
-            return False
-            
-        return True
+        """Check if the Baileys process is running"""
+        return self.supervisor.alive
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Liveness do processo Baileys para health checks"""
+        return {
+            "alive": self.supervisor.alive,
+            "pid": self.supervisor.process.pid if self.supervisor.alive else None,
+            "restart_count": self.supervisor.restart_count,
+            "started_at": self.supervisor.started_at,
+            "ipc_connected": self.ipc.connected
+        }
+    
+    @staticmethod
+    def _to_jid(to_number: str) -> str:
+        """Normaliza o número para o JID do WhatsApp"""
+        if not to_number.startswith("+"):
+            to_number = f"+{to_number}"
+        return to_number.replace("+", "").replace("-", "").replace(" ", "") + "@s.whatsapp.net"
     
     async def send_text(self, to_number: str, message: str) -> bool:
-        """Send text message via Baileys"""
+        """Send text message via Baileys and wait for the delivery ack"""
         if not await self.check_connection():
             logger.warning("Cannot send text - Baileys not connected")
             return False
-            
-        # Normalize phone number
-        if not to_number.startswith("+"):
-            to_number = f"+{to_number}"
-        to_number = to_number.replace("+", "").replace("-", "").replace(" ", "") + "@s.whatsapp.net"
         
         try:
-            # Send message through Node.js IPC
-            message_data = {
+            ack = await self.ipc.request({
                 "type": "send_message",
-                "to": to_number,
+                "to": self._to_jid(to_number),
                 "message": message
-            }
-            self.process.stdin.write(json.dumps(message_data) + "\n")
-            self.process.stdin.flush()
-            return True
-        except Exception as e:
+            })
+        except IPCError as e:
             logger.error(f"Error sending text message: {e}")
             return False
+        
+        if not ack.get("ok"):
+            logger.error(f"WhatsApp rejected message to {to_number}: {ack.get('error')}")
+            return False
+        return True
+    
+    async def send_many(self, messages: List[Tuple[str, str]]) -> List[bool]:
+        """
+        Envia um lote de mensagens ``(número, texto)`` em um único frame IPC.
+
+        Retorna o status de entrega de cada mensagem, na mesma ordem.
+        """
+        if not messages:
+            return []
+        if not await self.check_connection():
+            logger.warning("Cannot send batch - Baileys not connected")
+            return [False] * len(messages)
+        
+        try:
+            ack = await self.ipc.request(
+                {
+                    "type": "send_batch",
+                    "items": [
+                        {"to": self._to_jid(number), "message": text}
+                        for number, text in messages
+                    ]
+                },
+                timeout=self.ipc.request_timeout * max(1, len(messages) // 10)
+            )
+        except IPCError as e:
+            logger.error(f"Error sending message batch: {e}")
+            return [False] * len(messages)
+        
+        if not ack.get("ok"):
+            logger.error(f"WhatsApp rejected message batch: {ack.get('error')}")
+            return [False] * len(messages)
+        return [bool(result.get("ok")) for result in ack["results"]]
+    
+    @staticmethod
+    def feedback_request_message(tenant_name: str) -> str:
+        """Texto do pedido de feedback enviado aos clientes do tenant"""
+        return f"Olá! A {tenant_name} gostaria de saber sua opinião. Por favor, envie um áudio com seu feedback."
     
     async def send_template(self, to_number: str, tenant_name: str) -> bool:
         """Send feedback request message"""
-        message = f"Olá! A {tenant_name} gostaria de saber sua opinião. Por favor, envie um áudio com seu feedback."
-        return await self.send_text(to_number, message)
+        return await self.send_text(to_number, self.feedback_request_message(tenant_name))
     
     async def download_media(self, media_id: str) -> Optional[bytes]:
         """Get media file from filesystem saved by Baileys"""
@@ -99,12 +721,6 @@ class WhatsAppService:
         except Exception as e:
             logger.error(f"Error reading media file: {e}")
             return None
-            
-    def __del__(self):
-        """Cleanup when service is destroyed"""
-        if self.process:
-            self.process.terminate()
-            try:
-                self.process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                self.process.kill() 
\ No newline at end of file
+
+# Instância global do serviço
+whatsapp_service = WhatsAppService()
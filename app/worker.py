@@ -0,0 +1,95 @@
+"""
+Worker dedicado do pipeline de áudio
+
+Uso: ``python -m app.worker [--decode N] [--transcribe N] [--analyze N] [--persist N]``
+
+Consome os jobs ``process_audio`` (os ``ClientResponse`` pendentes
+enfileirados pelos webhooks) fora do processo web. Cada estágio tem o
+próprio pool limitado (ver services/pipeline.py); os limites padrão vêm
+dos núcleos da máquina, então basta escalar réplicas por CPU. Com workers
+dedicados, desligue JOB_WORKER_EMBEDDED no serviço web.
+"""
+import argparse
+import asyncio
+import logging
+import signal
+from typing import Dict, List, Optional
+
+from prometheus_client import start_http_server
+
+from .config import settings
+from .services import business  # noqa: F401  (registra o handler process_audio)
+from .services.jobs import JobWorker, job_queue
+from .services.local_llm import local_llm
+from .services.openai import close_async_client
+from .services.pipeline import STAGES, default_stage_limits, pipeline_stages
+from .services.transcription_backends import transcription_backends
+from .services.usage import usage_service
+
+logger = logging.getLogger("app.worker")
+
+def build_worker(limits: Dict[str, int], max_inflight: int = 0) -> JobWorker:
+    """
+    Configura os estágios e o consumidor da fila. Só entram jobs novos
+    enquanto decode e transcribe tiverem vagas para eles; os jobs que já
+    passaram da transcrição ficam fora dessa conta, de modo que uma fila
+    parada na análise não impede a transcrição dos próximos áudios
+    """
+    pipeline_stages.configure(limits)
+    intake = pipeline_stages.limits["decode"] + pipeline_stages.limits["transcribe"]
+    worker: Optional[JobWorker] = None
+
+    def admit() -> int:
+        upstream = worker.running - pipeline_stages.pending("analyze", "persist")
+        return intake - max(0, upstream)
+
+    worker = JobWorker(
+        job_queue,
+        kinds=["process_audio"],
+        concurrency=max_inflight or 2 * sum(pipeline_stages.limits.values()),
+        poll_interval=settings.JOB_POLL_INTERVAL,
+        admit=admit
+    )
+    return worker
+
+async def run(limits: Dict[str, int], max_inflight: int = 0):
+    worker = build_worker(limits, max_inflight)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+
+    usage_service.start_token_flush()
+    worker.start()
+    logger.info(
+        f"Audio worker {worker.owner} started: "
+        + ", ".join(f"{stage}={limit}" for stage, limit in pipeline_stages.limits.items())
+        + f", max in flight {worker.concurrency}"
+    )
+
+    await stopping.wait()
+    logger.info("Stopping audio worker, releasing jobs in flight")
+    await worker.stop()
+    await transcription_backends.close()
+    await close_async_client()
+    await local_llm.close()
+    await usage_service.stop_token_flush()
+    logger.info("Audio worker stopped")
+
+def main(argv: Optional[List[str]] = None):
+    limits = default_stage_limits()
+    parser = argparse.ArgumentParser(prog="python -m app.worker", description="Audio pipeline worker")
+    for stage in STAGES:
+        parser.add_argument(f"--{stage}", type=int, default=limits[stage], help=f"{stage} slots (default {limits[stage]})")
+    parser.add_argument("--max-inflight", type=int, default=settings.WORKER_MAX_INFLIGHT, help="jobs held at once (0: twice the stage slots)")
+    parser.add_argument("--metrics-port", type=int, default=settings.WORKER_METRICS_PORT, help="Prometheus port (0 disables)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    if args.metrics_port and settings.PROMETHEUS_METRICS_ENABLED:
+        start_http_server(args.metrics_port)
+
+    asyncio.run(run({stage: getattr(args, stage) for stage in STAGES}, args.max_inflight))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""Per-tenant AI token counters on usagetracking
+
+Revision ID: ai_token_usage
+Revises: analysis_columns
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'ai_token_usage'
+down_revision = 'analysis_columns'
+branch_labels = None
+depends_on = None
+
+_COLUMNS = ['ai_input_tokens', 'ai_cached_tokens', 'ai_output_tokens']
+
+def upgrade():
+    for name in _COLUMNS:
+        op.add_column('usagetracking', sa.Column(name, sa.Integer(), nullable=False, server_default='0'))
+
+def downgrade():
+    for name in reversed(_COLUMNS):
+        op.drop_column('usagetracking', name)
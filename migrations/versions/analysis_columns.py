@@ -0,0 +1,42 @@
+"""Flattened feedback analysis columns on clientresponse
+
+Revision ID: analysis_columns
+Revises: result_cache
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'analysis_columns'
+down_revision = 'result_cache'
+branch_labels = None
+depends_on = None
+
+_COLUMNS = [
+    ('sentiment_score', sa.Float()),
+    ('inferred_rating', sa.Integer()),
+    ('emotions', sa.JSON()),
+    ('key_phrases', sa.JSON()),
+    ('is_compliment', sa.Boolean()),
+    ('is_complaint', sa.Boolean()),
+    ('action_items', sa.JSON()),
+    ('topics', sa.JSON()),
+    ('intent_primary', sa.String()),
+    ('intent_secondary', sa.JSON()),
+    ('urgency', sa.String()),
+    ('satisfaction_level', sa.String()),
+    ('satisfaction_reasons', sa.JSON()),
+    ('product_mentions', sa.JSON()),
+    ('improvement_areas', sa.JSON()),
+    ('processing_error', sa.String()),
+]
+
+def upgrade():
+    for name, type_ in _COLUMNS:
+        op.add_column('clientresponse', sa.Column(name, type_, nullable=True))
+
+def downgrade():
+    for name, _ in reversed(_COLUMNS):
+        op.drop_column('clientresponse', name)
@@ -0,0 +1,41 @@
+"""Dead-letter table for failed jobs
+
+Revision ID: dead_letter
+Revises: response_stages
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'dead_letter'
+down_revision = 'response_stages'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'deadletter',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.Integer(), nullable=True),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=True),
+        sa.Column('reason', sa.String(), nullable=False),
+        sa.Column('error_type', sa.String(), nullable=False),
+        sa.Column('last_error', sa.String(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('requeued_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['job_id'], ['job.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_deadletter_job_id', 'deadletter', ['job_id'])
+    op.create_index('ix_deadletter_kind', 'deadletter', ['kind'])
+    op.create_index('ix_deadletter_requeued_at', 'deadletter', ['requeued_at'])
+
+def downgrade():
+    op.drop_index('ix_deadletter_requeued_at', table_name='deadletter')
+    op.drop_index('ix_deadletter_kind', table_name='deadletter')
+    op.drop_index('ix_deadletter_job_id', table_name='deadletter')
+    op.drop_table('deadletter')
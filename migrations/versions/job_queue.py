@@ -0,0 +1,46 @@
+"""Durable job queue table
+
+Revision ID: job_queue
+Revises: ai_token_usage
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'job_queue'
+down_revision = 'ai_token_usage'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('priority', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('payload', sa.JSON(), nullable=True),
+        sa.Column('blob', sa.LargeBinary(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='5'),
+        sa.Column('run_at', sa.DateTime(), nullable=False),
+        sa.Column('locked_by', sa.String(), nullable=True),
+        sa.Column('lease_expires_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_job_kind', 'job', ['kind'])
+    op.create_index('ix_job_status', 'job', ['status'])
+    # Ordem de retirada dos jobs elegíveis
+    op.create_index('ix_job_dequeue', 'job', ['status', sa.text('priority DESC'), 'run_at'])
+
+def downgrade():
+    op.drop_index('ix_job_dequeue', table_name='job')
+    op.drop_index('ix_job_status', table_name='job')
+    op.drop_index('ix_job_kind', table_name='job')
+    op.drop_table('job')
@@ -0,0 +1,49 @@
+"""Bulk feedback requests persisted in Postgres
+
+Revision ID: outbound_campaigns
+Revises: usage_tracking_unique_month
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'outbound_campaigns'
+down_revision = 'usage_tracking_unique_month'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'outboundcampaign',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('skipped_duplicates', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('invalid', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('sent', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('failed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outboundcampaign_tenant_id', 'outboundcampaign', ['tenant_id'])
+
+    # Reservas de dedupe: uma linha por (tenant, destinatário), renovada a cada janela
+    op.create_table(
+        'outboundrecipient',
+        sa.Column('tenant_id', sa.Integer(), nullable=False),
+        sa.Column('phone', sa.String(), nullable=False),
+        sa.Column('campaign_id', sa.String(), nullable=False),
+        sa.Column('reserved_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('tenant_id', 'phone')
+    )
+    op.create_index('ix_outboundrecipient_campaign_id', 'outboundrecipient', ['campaign_id'])
+
+def downgrade():
+    op.drop_index('ix_outboundrecipient_campaign_id', table_name='outboundrecipient')
+    op.drop_table('outboundrecipient')
+    op.drop_index('ix_outboundcampaign_tenant_id', table_name='outboundcampaign')
+    op.drop_table('outboundcampaign')
@@ -0,0 +1,47 @@
+"""Per-stage processing state on clientresponse
+
+Revision ID: response_stages
+Revises: job_queue
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'response_stages'
+down_revision = 'job_queue'
+branch_labels = None
+depends_on = None
+
+_COUNTERS = ['transcribe_attempts', 'analyze_attempts', 'deliver_attempts']
+_TIMESTAMPS = ['transcribed_at', 'analyzed_at', 'delivered_at']
+
+def upgrade():
+    op.add_column('clientresponse', sa.Column('stage', sa.String(), nullable=False, server_default='received'))
+    op.add_column('clientresponse', sa.Column('status', sa.String(), nullable=False, server_default='pending'))
+    op.add_column('clientresponse', sa.Column('error', sa.String(), nullable=True))
+    op.add_column('clientresponse', sa.Column('failed_stage', sa.String(), nullable=True))
+    op.add_column('clientresponse', sa.Column('analysis', sa.JSON(), nullable=True))
+    for name in _COUNTERS:
+        op.add_column('clientresponse', sa.Column(name, sa.Integer(), nullable=False, server_default='0'))
+    for name in _TIMESTAMPS:
+        op.add_column('clientresponse', sa.Column(name, sa.DateTime(), nullable=True))
+    op.create_index('ix_clientresponse_stage', 'clientresponse', ['stage'])
+    op.create_index('ix_clientresponse_status', 'clientresponse', ['status'])
+
+    # Respostas já processadas não devem ser retomadas
+    op.execute(
+        "UPDATE clientresponse SET stage = 'delivered', status = 'completed', delivered_at = updated_at "
+        "WHERE processed"
+    )
+
+def downgrade():
+    op.drop_index('ix_clientresponse_status', table_name='clientresponse')
+    op.drop_index('ix_clientresponse_stage', table_name='clientresponse')
+    for name in reversed(_TIMESTAMPS):
+        op.drop_column('clientresponse', name)
+    for name in reversed(_COUNTERS):
+        op.drop_column('clientresponse', name)
+    for name in ['analysis', 'failed_stage', 'error', 'status', 'stage']:
+        op.drop_column('clientresponse', name)
@@ -0,0 +1,34 @@
+"""Content-addressed cache of transcription and analysis results
+
+Revision ID: result_cache
+Revises: whatsapp_message_id
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'result_cache'
+down_revision = 'whatsapp_message_id'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'resultcacheentry',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('model', sa.String(), nullable=False),
+        sa.Column('version', sa.String(), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=True),
+        sa.Column('hits', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.Column('last_hit_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index('ix_resultcacheentry_kind', 'resultcacheentry', ['kind'])
+
+def downgrade():
+    op.drop_index('ix_resultcacheentry_kind', table_name='resultcacheentry')
+    op.drop_table('resultcacheentry')
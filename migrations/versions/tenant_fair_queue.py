@@ -0,0 +1,41 @@
+"""Weighted fair queuing of jobs across tenants
+
+Revision ID: tenant_fair_queue
+Revises: dead_letter
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'tenant_fair_queue'
+down_revision = 'dead_letter'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('job', sa.Column('tenant_id', sa.Integer(), nullable=True))
+    op.add_column('job', sa.Column('virtual_time', sa.Float(), nullable=False, server_default='0'))
+    op.create_index('ix_job_tenant_id', 'job', ['tenant_id'])
+    # Ordem de retirada: faixa de urgência e depois etiqueta virtual
+    op.drop_index('ix_job_dequeue', table_name='job')
+    op.create_index('ix_job_dequeue', 'job', ['status', sa.text('priority DESC'), 'virtual_time', 'run_at'])
+    # A prioridade por plano deu lugar aos pesos do WFQ; 1 passa a ser a faixa urgente
+    op.execute("UPDATE job SET priority = 0 WHERE status = 'queued'")
+
+    op.create_table(
+        'tenantqueuestate',
+        sa.Column('tenant_id', sa.Integer(), nullable=False),
+        sa.Column('last_finish', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('tenant_id')
+    )
+
+def downgrade():
+    op.drop_table('tenantqueuestate')
+    op.drop_index('ix_job_dequeue', table_name='job')
+    op.create_index('ix_job_dequeue', 'job', ['status', sa.text('priority DESC'), 'run_at'])
+    op.drop_index('ix_job_tenant_id', table_name='job')
+    op.drop_column('job', 'virtual_time')
+    op.drop_column('job', 'tenant_id')
@@ -0,0 +1,50 @@
+"""One usagetracking row per user and month
+
+Revision ID: usage_tracking_unique_month
+Revises: user_phone
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'usage_tracking_unique_month'
+down_revision = 'user_phone'
+branch_labels = None
+depends_on = None
+
+_COUNTERS = [
+    'audios_processed', 'basic_ai_calls', 'advanced_ai_calls', 'custom_ai_calls',
+    'api_calls', 'reports_generated', 'client_links_created',
+    'ai_input_tokens', 'ai_cached_tokens', 'ai_output_tokens', 'support_tickets'
+]
+
+def upgrade():
+    # Inserções concorrentes podem ter criado linhas repetidas do mesmo mês:
+    # soma os contadores na linha mais antiga e remove as demais
+    sums = ', '.join(f'{name} = merged.{name}' for name in _COUNTERS)
+    totals = ', '.join(f'SUM({name}) AS {name}' for name in _COUNTERS)
+    op.execute(f"""
+        UPDATE usagetracking SET {sums}, updated_at = merged.updated_at
+        FROM (
+            SELECT MIN(id) AS id, {totals}, MAX(updated_at) AS updated_at
+            FROM usagetracking
+            GROUP BY user_id, year, month
+            HAVING COUNT(*) > 1
+        ) AS merged
+        WHERE usagetracking.id = merged.id
+    """)
+    op.execute("""
+        DELETE FROM usagetracking AS duplicate
+        USING usagetracking AS kept
+        WHERE duplicate.user_id = kept.user_id
+          AND duplicate.year = kept.year
+          AND duplicate.month = kept.month
+          AND duplicate.id > kept.id
+    """)
+    op.create_unique_constraint(
+        'uq_usagetracking_user_month', 'usagetracking', ['user_id', 'year', 'month']
+    )
+
+def downgrade():
+    op.drop_constraint('uq_usagetracking_user_month', 'usagetracking', type_='unique')
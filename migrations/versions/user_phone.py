@@ -0,0 +1,24 @@
+"""WhatsApp number of the tenant on user
+
+Revision ID: user_phone
+Revises: tenant_fair_queue
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'user_phone'
+down_revision = 'tenant_fair_queue'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Só dígitos com DDI: os áudios recebidos são atribuídos ao tenant por este número
+    op.add_column('user', sa.Column('phone', sa.String(), nullable=True))
+    op.create_index('ix_user_phone', 'user', ['phone'], unique=True)
+
+def downgrade():
+    op.drop_index('ix_user_phone', table_name='user')
+    op.drop_column('user', 'phone')
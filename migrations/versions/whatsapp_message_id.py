@@ -0,0 +1,24 @@
+"""Unique WhatsApp message id on client responses
+
+Revision ID: whatsapp_message_id
+Revises: payment_system
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'whatsapp_message_id'
+down_revision = 'payment_system'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Chave de idempotência da ingestão de áudios
+    op.add_column('clientresponse', sa.Column('whatsapp_message_id', sa.String(), nullable=True))
+    op.create_index('ix_clientresponse_whatsapp_message_id', 'clientresponse', ['whatsapp_message_id'], unique=True)
+
+def downgrade():
+    op.drop_index('ix_clientresponse_whatsapp_message_id', table_name='clientresponse')
+    op.drop_column('clientresponse', 'whatsapp_message_id')
@@ -6,6 +6,9 @@ import axios from 'axios';
 import baileys from '@whiskeysockets/baileys';
 import qrcode from 'qrcode-terminal';
 import fs from 'fs';
+import os from 'os';
+import { Spool, SpoolFullError } from './spool.js';
+import { startIpcServer } from './ipc.js';
 
 const { default: makeWASocket, useMultiFileAuthState, fetchLatestBaileysVersion, DisconnectReason, makeCacheableSignalKeyStore } = baileys;
 
@@ -13,14 +16,18 @@ const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
 
 // Configure structured logging
+// Sob o supervisor Python (stdout não é TTY) os logs saem como JSON por
+// linha, que é repassado para o logging da API; no terminal usa pino-pretty.
 const logger = P({
     level: 'info',
-    transport: {
-        target: 'pino-pretty',
-        options: {
-            colorize: true
+    ...(process.stdout.isTTY && {
+        transport: {
+            target: 'pino-pretty',
+            options: {
+                colorize: true
+            }
         }
-    }
+    })
 });
 
 // Create auth directory if it doesn't exist
@@ -54,18 +61,18 @@ function cleanupAuthFiles() {
         // Delete old pre-keys
         for (const key of keysToDelete) {
             fs.unlinkSync(path.join(AUTH_DIR, key));
-            logger.info('auth_file_cleaned', { file: key });
+            logger.info({ file: key }, 'auth_file_cleaned');
         }
         
-        logger.info('auth_cleanup_completed', {
+        logger.info({
             files_removed: keysToDelete.length,
             files_kept: sortedPreKeys.length - keysToDelete.length + otherFiles.length
-        });
+        }, 'auth_cleanup_completed');
     } catch (error) {
-        logger.error('auth_cleanup_failed', {
+        logger.error({
             error: error.message,
             error_type: error.name
-        });
+        }, 'auth_cleanup_failed');
     }
 }
 
@@ -77,6 +84,31 @@ cleanupAuthFiles();
 
 const FASTAPI_URL = process.env.FASTAPI_URL || 'http://localhost:8000';
 
+// Spool durável: os áudios são gravados em disco e drenados pela API Python,
+// sobrevivendo a restarts da API e absorvendo rajadas de reconexão.
+const spool = new Spool({
+    dir: process.env.WHATSAPP_SPOOL_DIR || path.join(os.tmpdir(), 'opina-spool'),
+    maxBytes: parseInt(process.env.WHATSAPP_SPOOL_MAX_BYTES || String(512 * 1024 * 1024), 10),
+    segmentBytes: parseInt(process.env.WHATSAPP_SPOOL_SEGMENT_BYTES || String(8 * 1024 * 1024), 10),
+    fsyncIntervalMs: parseInt(process.env.WHATSAPP_SPOOL_FSYNC_INTERVAL_MS || '50', 10),
+    fsyncBatchSize: parseInt(process.env.WHATSAPP_SPOOL_FSYNC_BATCH || '32', 10),
+    logger
+});
+
+// Envia o áudio direto para a API quando o spool está cheio
+async function postAudioDirect(context, buffer) {
+    // Envia o áudio como corpo binário (sem base64) com metadados nos headers
+    await axios.post(`${FASTAPI_URL}/webhooks/audio`, buffer, {
+        headers: {
+            'Content-Type': 'application/octet-stream',
+            'X-WhatsApp-From': context.from,
+            'X-WhatsApp-Message-Id': context.message_id
+        },
+        maxBodyLength: Infinity,
+        maxContentLength: Infinity
+    });
+}
+
 let sock = null;
 let reconnectCount = 0;
 const MAX_RECONNECTS = 5;
@@ -90,11 +122,11 @@ async function updateMonitoringStatus(status, extraInfo = {}) {
             ...extraInfo
         });
     } catch (error) {
-        logger.error('monitoring_update_failed', {
+        logger.error({
             error: error.message,
             status,
             extra_info: extraInfo
-        });
+        }, 'monitoring_update_failed');
     }
 }
 
@@ -118,12 +150,12 @@ async function startSock() {
     sock.ev.on('connection.update', async ({ connection, lastDisconnect, qr }) => {
         const statusCode = (lastDisconnect?.error instanceof Boom)?.output?.statusCode;
 
-        logger.info('connection_update', {
+        logger.info({
             status: connection,
             disconnect_reason: statusCode ? DisconnectReason[statusCode] : null,
             reconnect_count: reconnectCount,
             qr_received: !!qr
-        });
+        }, 'connection_update');
 
         // Handle QR code
         if (qr) {
@@ -133,9 +165,9 @@ async function startSock() {
             // Update monitoring with QR
             await updateMonitoringStatus('qr_code', { qr });
             
-            logger.info('qr_code_generated', {
+            logger.info({
                 timestamp: new Date().toISOString()
-            });
+            }, 'qr_code_generated');
         }
 
         if (connection === 'close') {
@@ -148,19 +180,19 @@ async function startSock() {
             
             if (shouldReconnect && reconnectCount < MAX_RECONNECTS) {
                 reconnectCount++;
-                logger.info('reconnecting', {
+                logger.info({
                     attempt: reconnectCount,
                     max_attempts: MAX_RECONNECTS,
                     next_attempt_ms: RECONNECT_INTERVAL
-                });
+                }, 'reconnecting');
                 
                 setTimeout(startSock, RECONNECT_INTERVAL);
             } else if (reconnectCount >= MAX_RECONNECTS) {
-                logger.error('max_reconnects_reached', {
+                logger.error({
                     max_attempts: MAX_RECONNECTS,
                     final_status: connection,
                     final_error: statusCode ? DisconnectReason[statusCode] : null
-                });
+                }, 'max_reconnects_reached');
                 process.exit(1);
             }
         } else if (connection === 'open') {
@@ -170,10 +202,10 @@ async function startSock() {
                 version
             });
             
-            logger.info('connection_established', {
+            logger.info({
                 version: version,
                 phone: sock.user?.id
-            });
+            }, 'connection_established');
         }
     });
 
@@ -200,27 +232,31 @@ async function startSock() {
             const startTime = Date.now();
 
             try {
-                logger.info('processing_audio', context);
+                logger.info(context, 'processing_audio');
                 
                 const buffer = await sock.downloadMediaMessage(msg);
                 
-                await axios.post(`${FASTAPI_URL}/webhooks/process-audio`, {
-                    from: context.from,
-                    message_id: context.message_id,
-                    audio: buffer.toString('base64')
-                }, {
-                    headers: {
-                        'Content-Type': 'application/json'
-                    }
-                });
+                let delivery = 'spooled';
+                try {
+                    await spool.append(context, buffer);
+                } catch (error) {
+                    if (!(error instanceof SpoolFullError)) throw error;
+                    logger.error({
+                        ...context,
+                        error: error.message
+                    }, 'spool_full');
+                    delivery = 'direct';
+                    await postAudioDirect(context, buffer);
+                }
                 
                 const duration = (Date.now() - startTime) / 1000;
                 
-                logger.info('audio_processed', {
+                logger.info({
                     ...context,
                     status: 'success',
+                    delivery,
                     duration
-                });
+                }, 'audio_processed');
                 
                 // Atualizar métricas de processamento
                 await axios.post(`${FASTAPI_URL}/monitoring/audio/processed`, {
@@ -231,13 +267,13 @@ async function startSock() {
             } catch (error) {
                 const duration = (Date.now() - startTime) / 1000;
                 
-                logger.error('audio_processing_failed', {
+                logger.error({
                     ...context,
                     error: error.message,
                     error_type: error.name,
                     status: 'failed',
                     duration
-                });
+                }, 'audio_processing_failed');
                 
                 // Atualizar métricas de erro
                 await axios.post(`${FASTAPI_URL}/monitoring/audio/processed`, {
@@ -258,30 +294,58 @@ async function startSock() {
 // Iniciar conexão
 startSock();
 
-// Processar comandos da entrada padrão
-process.stdin.on('data', async (data) => {
-    try {
-        const command = JSON.parse(data.toString());
+// Envia uma mensagem de texto e resolve com o id atribuído pelo WhatsApp
+async function sendText(to, message) {
+    if (!sock) {
+        throw new Error('whatsapp not connected');
+    }
+    
+    logger.info({
+        to,
+        type: 'text'
+    }, 'sending_message');
+    
+    const sent = await sock.sendMessage(to, { text: message });
+    
+    logger.info({
+        to,
+        type: 'text',
+        status: 'success'
+    }, 'message_sent');
+    
+    return { message_id: sent?.key?.id ?? null };
+}
+
+// Comandos da API Python via socket Unix com frames de tamanho prefixado
+const ipcServer = startIpcServer({
+    socketPath: process.env.WHATSAPP_IPC_SOCKET || path.join(os.tmpdir(), 'opina-baileys.sock'),
+    logger,
+    handlers: {
+        send_message: (command) => sendText(command.to, command.message),
         
-        if (command.type === 'send_message' && sock) {
-            logger.info('sending_message', {
-                to: command.to,
-                type: 'text'
-            });
-            
-            await sock.sendMessage(command.to, { text: command.message });
-            
-            logger.info('message_sent', {
-                to: command.to,
-                type: 'text',
-                status: 'success'
-            });
+        // Lote de mensagens: cada item recebe seu próprio status de entrega
+        send_batch: async (command) => {
+            const results = await Promise.all(command.items.map((item) =>
+                sendText(item.to, item.message)
+                    .then((result) => ({ ok: true, ...result }))
+                    .catch((error) => {
+                        logger.error({
+                            to: item.to,
+                            error: error.message
+                        }, 'message_send_failed');
+                        return { ok: false, error: error.message };
+                    })
+            ));
+            return { results };
         }
-    } catch (error) {
-        logger.error('command_processing_failed', {
-            error: error.message,
-            error_type: error.name,
-            raw_command: data.toString()
-        });
     }
-}); 
\ No newline at end of file
+});
+
+// Garante o fsync dos registros pendentes antes de encerrar
+for (const signal of ['SIGTERM', 'SIGINT']) {
+    process.on(signal, () => {
+        ipcServer.close();
+        spool.close();
+        process.exit(0);
+    });
+}
@@ -0,0 +1,96 @@
+import fs from 'fs';
+import net from 'net';
+
+// Protocolo IPC com a API Python (app/services/whatsapp.py::BaileysIPCClient).
+//
+// Cada frame é um inteiro u32 big-endian com o tamanho do corpo seguido de um
+// JSON UTF-8. Requisições carregam `id` e `type`; toda resposta repete o `id`
+// com `ok: true` (mais o resultado do handler) ou `ok: false` e `error`.
+
+const FRAME_PREFIX_BYTES = 4;
+export const MAX_FRAME_BYTES = 16 * 1024 * 1024;
+
+export function encodeFrame(message) {
+    const body = Buffer.from(JSON.stringify(message), 'utf8');
+    const prefix = Buffer.alloc(FRAME_PREFIX_BYTES);
+    prefix.writeUInt32BE(body.length, 0);
+    return Buffer.concat([prefix, body]);
+}
+
+// Acumula chunks do socket e devolve somente frames completos, então
+// escritas coalescidas ou fragmentadas pelo kernel não quebram o parse.
+export class FrameDecoder {
+    constructor() {
+        this.buffer = Buffer.alloc(0);
+    }
+
+    push(chunk) {
+        this.buffer = this.buffer.length ? Buffer.concat([this.buffer, chunk]) : chunk;
+        const frames = [];
+
+        while (this.buffer.length >= FRAME_PREFIX_BYTES) {
+            const length = this.buffer.readUInt32BE(0);
+            if (length > MAX_FRAME_BYTES) {
+                throw new Error(`frame too large: ${length} bytes`);
+            }
+            if (this.buffer.length < FRAME_PREFIX_BYTES + length) break;
+
+            const body = this.buffer.subarray(FRAME_PREFIX_BYTES, FRAME_PREFIX_BYTES + length);
+            frames.push(JSON.parse(body.toString('utf8')));
+            this.buffer = this.buffer.subarray(FRAME_PREFIX_BYTES + length);
+        }
+
+        return frames;
+    }
+}
+
+export function startIpcServer({ socketPath, handlers, logger }) {
+    if (fs.existsSync(socketPath)) {
+        fs.unlinkSync(socketPath);
+    }
+
+    const server = net.createServer((conn) => {
+        const decoder = new FrameDecoder();
+        logger.info({ socket: socketPath }, 'ipc_client_connected');
+
+        const reply = (message) => {
+            if (!conn.destroyed) conn.write(encodeFrame(message));
+        };
+
+        conn.on('data', (chunk) => {
+            let frames;
+            try {
+                frames = decoder.push(chunk);
+            } catch (error) {
+                logger.error({ error: error.message }, 'ipc_protocol_error');
+                conn.destroy();
+                return;
+            }
+
+            // Requisições são processadas concorrentemente; as respostas
+            // saem na ordem em que terminam e são casadas pelo `id`.
+            for (const request of frames) {
+                const handler = handlers[request.type];
+                if (!handler) {
+                    reply({ id: request.id, ok: false, error: `unknown request type: ${request.type}` });
+                    continue;
+                }
+
+                Promise.resolve()
+                    .then(() => handler(request))
+                    .then((result) => reply({ id: request.id, ok: true, ...result }))
+                    .catch((error) => reply({ id: request.id, ok: false, error: error.message }));
+            }
+        });
+
+        conn.on('error', (error) => {
+            logger.error({ error: error.message }, 'ipc_connection_error');
+        });
+    });
+
+    server.listen(socketPath, () => {
+        logger.info({ socket: socketPath }, 'ipc_server_listening');
+    });
+
+    return server;
+}
@@ -0,0 +1,170 @@
+import fs from 'fs';
+import path from 'path';
+import zlib from 'zlib';
+
+// Spool local append-only para áudios recebidos.
+//
+// Formato de cada registro (big-endian):
+//   magic (u32) | header_len (u32) | payload_len (u32) | crc32 (u32) | header JSON | payload
+//
+// Os registros são gravados em segmentos `segment-<seq>.log`. O consumidor
+// Python (app/services/whatsapp.py::SpoolConsumer) mantém o `index.json` com
+// a posição já processada e remove os segmentos lidos por completo.
+
+export const RECORD_MAGIC = 0x4f50534c; // "OPSL"
+const RECORD_HEADER_BYTES = 16;
+const SEGMENT_PATTERN = /^segment-(\d+)\.log$/;
+
+// zlib.crc32 só existe a partir do Node 20.15/22.2; nas versões anteriores
+// (o setup aceita Node 18) usa a CRC-32 IEEE por tabela, com o mesmo resultado
+const CRC32_TABLE = (() => {
+    const table = new Uint32Array(256);
+    for (let n = 0; n < 256; n++) {
+        let c = n;
+        for (let k = 0; k < 8; k++) {
+            c = c & 1 ? 0xedb88320 ^ (c >>> 1) : c >>> 1;
+        }
+        table[n] = c >>> 0;
+    }
+    return table;
+})();
+
+function crc32Table(data, value = 0) {
+    let crc = (value ^ 0xffffffff) >>> 0;
+    for (let i = 0; i < data.length; i++) {
+        crc = CRC32_TABLE[(crc ^ data[i]) & 0xff] ^ (crc >>> 8);
+    }
+    return (crc ^ 0xffffffff) >>> 0;
+}
+
+export const crc32 = typeof zlib.crc32 === 'function' ? zlib.crc32 : crc32Table;
+
+export class SpoolFullError extends Error {
+    constructor(usedBytes, maxBytes) {
+        super(`spool full: ${usedBytes}/${maxBytes} bytes`);
+        this.name = 'SpoolFullError';
+    }
+}
+
+export class Spool {
+    constructor({ dir, maxBytes, segmentBytes, fsyncIntervalMs, fsyncBatchSize, logger }) {
+        this.dir = dir;
+        this.maxBytes = maxBytes;
+        this.segmentBytes = segmentBytes;
+        this.fsyncIntervalMs = fsyncIntervalMs;
+        this.fsyncBatchSize = fsyncBatchSize;
+        this.logger = logger;
+
+        this.fd = null;
+        this.segmentSeq = 0;
+        this.segmentSize = 0;
+        this.pending = [];
+        this.fsyncTimer = null;
+
+        fs.mkdirSync(this.dir, { recursive: true });
+        this._openNextSegment();
+    }
+
+    _segmentPath(seq) {
+        return path.join(this.dir, `segment-${String(seq).padStart(12, '0')}.log`);
+    }
+
+    _listSegments() {
+        return fs.readdirSync(this.dir)
+            .map((name) => SEGMENT_PATTERN.exec(name))
+            .filter(Boolean)
+            .map((match) => ({ seq: parseInt(match[1], 10), name: match[0] }));
+    }
+
+    usedBytes() {
+        let total = 0;
+        for (const { name } of this._listSegments()) {
+            try {
+                total += fs.statSync(path.join(this.dir, name)).size;
+            } catch {
+                // Segmento removido pelo consumidor enquanto listávamos
+            }
+        }
+        return total;
+    }
+
+    _openNextSegment() {
+        // Nunca reabre um segmento antigo: após um restart, a cauda pode
+        // conter um registro parcial que o consumidor já sabe descartar.
+        const existing = this._listSegments().map(({ seq }) => seq);
+        const lastSeq = Math.max(this.segmentSeq, ...existing, 0);
+
+        if (this.fd !== null) {
+            fs.fsyncSync(this.fd);
+            fs.closeSync(this.fd);
+        }
+
+        this.segmentSeq = lastSeq + 1;
+        this.segmentSize = 0;
+        this.fd = fs.openSync(this._segmentPath(this.segmentSeq), 'a');
+
+        this.logger.info({ segment: this.segmentSeq }, 'spool_segment_opened');
+    }
+
+    // Grava o registro e resolve quando ele estiver persistido em disco.
+    append(header, payload) {
+        const used = this.usedBytes();
+        if (used + payload.length > this.maxBytes) {
+            return Promise.reject(new SpoolFullError(used, this.maxBytes));
+        }
+
+        if (this.segmentSize > 0 && this.segmentSize + payload.length > this.segmentBytes) {
+            this._flush();
+            this._openNextSegment();
+        }
+
+        const headerBytes = Buffer.from(JSON.stringify(header), 'utf8');
+        const prefix = Buffer.alloc(RECORD_HEADER_BYTES);
+        const crc = crc32(payload, crc32(headerBytes));
+
+        prefix.writeUInt32BE(RECORD_MAGIC, 0);
+        prefix.writeUInt32BE(headerBytes.length, 4);
+        prefix.writeUInt32BE(payload.length, 8);
+        prefix.writeUInt32BE(crc >>> 0, 12);
+
+        const record = Buffer.concat([prefix, headerBytes, payload]);
+        fs.writeSync(this.fd, record);
+        this.segmentSize += record.length;
+
+        return new Promise((resolve, reject) => {
+            this.pending.push({ resolve, reject });
+            if (this.pending.length >= this.fsyncBatchSize) {
+                this._flush();
+            } else if (!this.fsyncTimer) {
+                this.fsyncTimer = setTimeout(() => this._flush(), this.fsyncIntervalMs);
+            }
+        });
+    }
+
+    // Um único fsync confirma todos os registros gravados desde o último.
+    _flush() {
+        if (this.fsyncTimer) {
+            clearTimeout(this.fsyncTimer);
+            this.fsyncTimer = null;
+        }
+        if (!this.pending.length) return;
+
+        const waiting = this.pending;
+        this.pending = [];
+
+        try {
+            fs.fsyncSync(this.fd);
+            waiting.forEach(({ resolve }) => resolve());
+        } catch (error) {
+            waiting.forEach(({ reject }) => reject(error));
+        }
+    }
+
+    close() {
+        this._flush();
+        if (this.fd !== null) {
+            fs.closeSync(this.fd);
+            this.fd = null;
+        }
+    }
+}